@@ -0,0 +1,299 @@
+"""
+Mixed create/update/delete batches for companies.
+
+Operations are grouped by type and applied with one statement per group
+(chunked for very large batches): a multi-row ``INSERT ... RETURNING``, an
+``UPDATE ... FROM (VALUES ...)`` and a ``DELETE ... WHERE id = ANY(...)``,
+all inside one transaction. In best-effort mode each group runs in a
+savepoint and falls back to per-operation savepoints if the group fails.
+"""
+import logging
+import os
+from collections import Counter
+from typing import List, Optional, Tuple
+
+from pydantic import ValidationError
+from sqlalchemy import Boolean, Float, Integer, String, any_, bindparam, case, cast, column, delete, func, insert, or_, update, values
+from sqlalchemy.dialects.postgresql import ARRAY
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
+from starlette.concurrency import run_in_threadpool
+
+from app import models, schemas
+from app.geocoding import geocode_missing
+from app.spatial import make_point
+
+logger = logging.getLogger(__name__)
+
+# Operations applied per SQL statement
+BATCH_STATEMENT_SIZE = int(os.getenv("BATCH_STATEMENT_SIZE", "1000"))
+
+Op = schemas.BatchOperationType
+Status = schemas.BatchOperationStatus
+
+Point = Tuple[float, float]
+
+companies = models.Company.__table__
+
+
+class _PendingOperation:
+    """
+    An operation that passed validation and is waiting to be applied.
+    """
+
+    def __init__(self, index: int, op: Op, company_id: Optional[int] = None, payload=None):
+        self.index = index
+        self.op = op
+        self.id = company_id
+        self.payload = payload
+
+
+def _result(pending: _PendingOperation, status: Status, **kwargs) -> schemas.BatchOperationResult:
+    return schemas.BatchOperationResult(index=pending.index, op=pending.op, status=status, **kwargs)
+
+
+def _format_errors(exc: ValidationError) -> str:
+    return "; ".join(
+        f"{' -> '.join(str(loc) for loc in error['loc'])}: {error['msg']}"
+        for error in exc.errors()
+    )
+
+
+def _validate(operations: List[schemas.BatchOperation], results: list) -> List[_PendingOperation]:
+    """
+    Validate operations, recording failures in ``results`` and returning the rest.
+    """
+    id_counts = Counter(operation.id for operation in operations if operation.op != Op.create)
+    pending = []
+    for index, operation in enumerate(operations):
+        item = _PendingOperation(index, operation.op, operation.id)
+        error = None
+        try:
+            if operation.op == Op.create:
+                if not operation.data:
+                    error = "data is required for create"
+                else:
+                    item.payload = schemas.CompanyCreate(**operation.data)
+                    error = geocode_missing([item.payload])[0]
+            elif operation.id is None or operation.id <= 0:
+                error = "Company ID must be a positive integer"
+            elif id_counts[operation.id] > 1:
+                error = "Company ID appears in more than one update or delete operation"
+            elif operation.op == Op.update:
+                item.payload = schemas.CompanyUpdate(**(operation.data or {})).dict(exclude_unset=True)
+                if not item.payload:
+                    error = "No valid fields provided for update"
+        except ValidationError as e:
+            error = _format_errors(e)
+
+        if error is not None:
+            results[index] = _result(item, Status.error, id=operation.id, error=error)
+        else:
+            pending.append(item)
+    return pending
+
+
+async def _run_creates(db: AsyncSession, items: List[_PendingOperation], results: list, points: List[Point]):
+    stmt = insert(companies).values([
+        {
+            "name": item.payload.name,
+            "industry": item.payload.industry,
+            "address": item.payload.address,
+            "latitude": item.payload.latitude,
+            "longitude": item.payload.longitude,
+            "location": make_point(item.payload.longitude, item.payload.latitude),
+        }
+        for item in items
+    ]).returning(*models.COMPANY_OUT_COLUMNS)
+
+    # PostgreSQL returns the rows of a multi-row VALUES insert in input order
+    rows = (await db.execute(stmt)).all()
+    for item, row in zip(items, rows):
+        company = schemas.CompanyOut(**row._asdict())
+        results[item.index] = _result(item, Status.ok, id=company.id, company=company)
+        points.append((company.longitude, company.latitude))
+
+
+async def _run_updates(db: AsyncSession, items: List[_PendingOperation], results: list, points: List[Point]):
+    changes = values(
+        column("id", Integer),
+        column("name", String),
+        column("industry", String),
+        column("address", String),
+        column("set_address", Boolean),
+        column("latitude", Float),
+        column("longitude", Float),
+        name="changes"
+    ).data([
+        (
+            item.id,
+            item.payload.get("name"),
+            item.payload.get("industry"),
+            item.payload.get("address"),
+            "address" in item.payload,
+            item.payload.get("latitude"),
+            item.payload.get("longitude"),
+        )
+        for item in items
+    ])
+    old = companies.alias("old")
+
+    # VALUES columns that are NULL in every row are typed text, hence the casts
+    latitude = func.coalesce(cast(changes.c.latitude, Float), companies.c.latitude)
+    longitude = func.coalesce(cast(changes.c.longitude, Float), companies.c.longitude)
+    stmt = (
+        update(companies)
+        .where(companies.c.id == changes.c.id)
+        .where(old.c.id == changes.c.id)
+        .values(
+            name=func.coalesce(cast(changes.c.name, String), companies.c.name),
+            industry=func.coalesce(cast(changes.c.industry, String), companies.c.industry),
+            address=case(
+                (cast(changes.c.set_address, Boolean), cast(changes.c.address, String)),
+                else_=companies.c.address
+            ),
+            latitude=latitude,
+            longitude=longitude,
+            location=case(
+                (or_(changes.c.latitude.isnot(None), changes.c.longitude.isnot(None)), make_point(longitude, latitude)),
+                else_=companies.c.location
+            ),
+        )
+        .returning(
+            *models.COMPANY_OUT_COLUMNS,
+            old.c.latitude.label("old_latitude"),
+            old.c.longitude.label("old_longitude"),
+        )
+    )
+
+    updated = {row.id: row for row in await db.execute(stmt)}
+    for item in items:
+        row = updated.get(item.id)
+        if row is None:
+            results[item.index] = _result(item, Status.not_found, id=item.id, error=f"Company with ID {item.id} not found")
+            continue
+        company = schemas.CompanyOut(**{key: getattr(row, key) for key in schemas.CompanyOut.__fields__})
+        results[item.index] = _result(item, Status.ok, id=item.id, company=company)
+        points.append((row.old_longitude, row.old_latitude))
+        points.append((row.longitude, row.latitude))
+
+
+async def _run_deletes(db: AsyncSession, items: List[_PendingOperation], results: list, points: List[Point]):
+    ids = [item.id for item in items]
+    stmt = (
+        delete(companies)
+        .where(companies.c.id == any_(bindparam("ids", ids, type_=ARRAY(Integer))))
+        .returning(companies.c.id, companies.c.latitude, companies.c.longitude)
+    )
+
+    deleted = {row.id: row for row in await db.execute(stmt)}
+    for item in items:
+        row = deleted.get(item.id)
+        if row is None:
+            results[item.index] = _result(item, Status.not_found, id=item.id, error=f"Company with ID {item.id} not found")
+            continue
+        results[item.index] = _result(item, Status.ok, id=item.id)
+        points.append((row.longitude, row.latitude))
+
+
+_RUNNERS = (
+    (Op.create, _run_creates),
+    (Op.update, _run_updates),
+    (Op.delete, _run_deletes),
+)
+
+
+def _error_message(exc: Exception) -> str:
+    if isinstance(exc, IntegrityError):
+        return "Invalid data provided for this operation"
+    return "Database error while applying this operation"
+
+
+async def execute_batch(db: AsyncSession, request: schemas.BatchRequest) -> Tuple[schemas.BatchResponse, List[Point]]:
+    """
+    Apply a batch of operations and commit according to the batch mode.
+
+    Args:
+        db (Session): Database session; the batch commits or rolls it back
+        request (BatchRequest): Operations and batch mode
+
+    Returns:
+        Tuple[BatchResponse, List[Point]]: Per-operation results and the
+        (longitude, latitude) points touched by committed operations
+    """
+    atomic = request.mode == schemas.BatchMode.atomic
+    results: List[Optional[schemas.BatchOperationResult]] = [None] * len(request.operations)
+    points: List[Point] = []
+
+    # Validation geocodes address-only creates, which must not block the event loop
+    pending = await run_in_threadpool(_validate, request.operations, results)
+    failed = len(request.operations) - len(pending)
+
+    if not (atomic and failed):
+        for op, runner in _RUNNERS:
+            items = [item for item in pending if item.op == op]
+            for start in range(0, len(items), BATCH_STATEMENT_SIZE):
+                chunk = items[start:start + BATCH_STATEMENT_SIZE]
+                if atomic:
+                    try:
+                        await runner(db, chunk, results, points)
+                    except Exception as e:
+                        logger.error("Batch %s statement failed: %s", op.value, e)
+                        for item in chunk:
+                            results[item.index] = _result(item, Status.error, id=item.id, error=_error_message(e))
+                        break
+                    continue
+
+                try:
+                    async with db.begin_nested():
+                        await runner(db, chunk, results, points)
+                except Exception as e:
+                    logger.warning("Batch %s statement failed, retrying operations one by one: %s", op.value, e)
+                    for item in chunk:
+                        item_points: List[Point] = []
+                        try:
+                            async with db.begin_nested():
+                                await runner(db, [item], results, item_points)
+                        except Exception as item_error:
+                            results[item.index] = _result(item, Status.error, id=item.id, error=_error_message(item_error))
+                        else:
+                            points.extend(item_points)
+            if atomic and any(result is not None and result.status != Status.ok for result in results):
+                break
+
+    failed = sum(1 for result in results if result is None or result.status != Status.ok)
+    if atomic and failed:
+        await db.rollback()
+        points = []
+        results = [
+            result.copy(update={"status": Status.rolled_back, "company": None})
+            if result is not None and result.status == Status.ok else result
+            for result in results
+        ]
+        # Operations never reached because an earlier group failed
+        results = [
+            result if result is not None else schemas.BatchOperationResult(
+                index=index,
+                op=request.operations[index].op,
+                status=Status.rolled_back,
+                id=request.operations[index].id
+            )
+            for index, result in enumerate(results)
+        ]
+        succeeded = 0
+        failed = sum(1 for result in results if result.status in (Status.error, Status.not_found))
+    else:
+        succeeded = len(results) - failed
+        if succeeded:
+            await db.commit()
+        else:
+            await db.rollback()
+
+    logger.info("Applied batch of %s operations in %s mode: %s succeeded, %s failed", len(results), request.mode.value, succeeded, failed)
+    return schemas.BatchResponse(
+        mode=request.mode,
+        committed=succeeded > 0,
+        succeeded=succeeded,
+        failed=failed,
+        results=results
+    ), points
@@ -0,0 +1,227 @@
+"""
+Bulk loading of companies from CSV or NDJSON files.
+
+Rows are validated in chunks with the ``CompanyCreate`` rules, valid rows
+are streamed into a temporary staging table with ``COPY`` and moved into
+``companies`` with a single ``INSERT ... SELECT`` that builds ``location``
+in SQL. The whole load runs in one transaction.
+
+Usage:
+    python -m app.bulk_import companies.csv [--format csv|ndjson] [--chunk-size N]
+"""
+import argparse
+import csv
+import io
+import json
+import logging
+import os
+import sys
+from typing import IO, Iterable, Iterator, List, Optional, Tuple
+
+from pydantic import ValidationError
+
+from app import schemas
+from app.geocoding import geocode_missing
+
+logger = logging.getLogger(__name__)
+
+# Rows validated and copied per batch
+IMPORT_CHUNK_SIZE = int(os.getenv("IMPORT_CHUNK_SIZE", "5000"))
+
+# Maximum number of row errors listed in an import report
+IMPORT_MAX_ERRORS = int(os.getenv("IMPORT_MAX_ERRORS", "1000"))
+
+IMPORT_FORMATS = ("csv", "ndjson")
+
+IMPORT_COLUMNS = ("name", "industry", "address", "latitude", "longitude")
+
+STAGING_TABLE_SQL = """
+    CREATE TEMPORARY TABLE companies_import (
+        name text NOT NULL,
+        industry text NOT NULL,
+        address text,
+        latitude double precision NOT NULL,
+        longitude double precision NOT NULL
+    ) ON COMMIT DROP
+"""
+
+COPY_SQL = "COPY companies_import ({}) FROM STDIN WITH (FORMAT csv)".format(", ".join(IMPORT_COLUMNS))
+
+MERGE_SQL = """
+    INSERT INTO companies (name, industry, address, latitude, longitude, location)
+    SELECT name, industry, address, latitude, longitude,
+           ST_SetSRID(ST_MakePoint(longitude, latitude), 4326)
+    FROM companies_import
+"""
+
+# A row is (row number, parsed record or None, parse error or None)
+Record = Tuple[int, Optional[dict], Optional[str]]
+
+
+def detect_format(filename: Optional[str], content_type: Optional[str]) -> Optional[str]:
+    """
+    Guess the import format from an upload's file name or content type.
+    """
+    name = (filename or "").lower()
+    if name.endswith(".csv") or content_type == "text/csv":
+        return "csv"
+    if name.endswith((".ndjson", ".jsonl")) or content_type in ("application/x-ndjson", "application/jsonl"):
+        return "ndjson"
+    return None
+
+
+def read_records(stream: IO[bytes], fmt: str) -> Iterator[Record]:
+    """
+    Lazily parse a binary CSV (with header) or NDJSON stream into records.
+    """
+    text_stream = io.TextIOWrapper(stream, encoding="utf-8-sig", newline="")
+    if fmt == "csv":
+        for row_number, row in enumerate(csv.DictReader(text_stream), start=1):
+            yield row_number, row, None
+        return
+
+    for row_number, line in enumerate(text_stream, start=1):
+        if not line.strip():
+            continue
+        try:
+            record = json.loads(line)
+        except ValueError as e:
+            yield row_number, None, f"invalid JSON: {str(e)}"
+            continue
+        if not isinstance(record, dict):
+            yield row_number, None, "each line must be a JSON object"
+            continue
+        yield row_number, record, None
+
+
+def _chunks(records: Iterable[Record], size: int) -> Iterator[List[Record]]:
+    chunk = []
+    for record in records:
+        chunk.append(record)
+        if len(chunk) >= size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def _format_errors(exc: ValidationError) -> List[str]:
+    return [
+        f"{' -> '.join(str(loc) for loc in error['loc'])}: {error['msg']}"
+        for error in exc.errors()
+    ]
+
+
+def validate_chunk(chunk: List[Record]) -> Tuple[List[schemas.CompanyCreate], List[schemas.ImportRowError]]:
+    """
+    Validate a chunk of records with the ``CompanyCreate`` rules, geocoding
+    rows that have an address but no coordinates.
+    """
+    valid = []
+    valid_rows = []
+    errors = []
+    for row_number, record, parse_error in chunk:
+        if parse_error is not None:
+            errors.append(schemas.ImportRowError(row=row_number, errors=[parse_error]))
+            continue
+        try:
+            valid.append(schemas.CompanyCreate(**{
+                key: value for key, value in record.items() if key in IMPORT_COLUMNS and value != ""
+            }))
+            valid_rows.append(row_number)
+        except ValidationError as e:
+            errors.append(schemas.ImportRowError(row=row_number, errors=_format_errors(e)))
+
+    geocode_errors = geocode_missing(valid)
+    if any(geocode_errors):
+        geocoded = []
+        for row_number, company, error in zip(valid_rows, valid, geocode_errors):
+            if error is None:
+                geocoded.append(company)
+            else:
+                errors.append(schemas.ImportRowError(row=row_number, errors=[error]))
+        errors.sort(key=lambda error: error.row)
+        valid = geocoded
+    return valid, errors
+
+
+def _to_csv(companies: List[schemas.CompanyCreate]) -> io.StringIO:
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    for company in companies:
+        # None is written as an unquoted empty field, which COPY reads as NULL
+        writer.writerow([company.name, company.industry, company.address, company.latitude, company.longitude])
+    buffer.seek(0)
+    return buffer
+
+
+def import_companies(engine, records: Iterable[Record], fmt: str, chunk_size: int = IMPORT_CHUNK_SIZE) -> schemas.ImportReport:
+    """
+    Load records into ``companies`` in a single transaction.
+
+    Args:
+        engine: SQLAlchemy engine backed by psycopg2
+        records: Parsed records from ``read_records``
+        fmt (str): Source format, reported back to the caller
+        chunk_size (int): Rows validated and copied per batch
+
+    Returns:
+        ImportReport: Counts and per-row validation errors
+    """
+    total_rows = 0
+    failed = 0
+    errors: List[schemas.ImportRowError] = []
+
+    connection = engine.raw_connection()
+    try:
+        cursor = connection.cursor()
+        cursor.execute(STAGING_TABLE_SQL)
+        for chunk in _chunks(records, chunk_size):
+            total_rows += len(chunk)
+            valid, chunk_errors = validate_chunk(chunk)
+            failed += len(chunk_errors)
+            errors.extend(chunk_errors[:max(IMPORT_MAX_ERRORS - len(errors), 0)])
+            if valid:
+                cursor.copy_expert(COPY_SQL, _to_csv(valid))
+        cursor.execute(MERGE_SQL)
+        imported = cursor.rowcount
+        connection.commit()
+    except Exception:
+        connection.rollback()
+        raise
+    finally:
+        connection.close()
+
+    logger.info("Imported %s of %s companies (%s rejected)", imported, total_rows, failed)
+    return schemas.ImportReport(
+        format=fmt,
+        total_rows=total_rows,
+        imported=imported,
+        failed=failed,
+        errors=errors,
+        errors_truncated=failed > len(errors)
+    )
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Bulk import companies from a CSV or NDJSON file.")
+    parser.add_argument("path", help="File to import")
+    parser.add_argument("--format", choices=IMPORT_FORMATS, help="File format (default: from the file extension)")
+    parser.add_argument("--chunk-size", type=int, default=IMPORT_CHUNK_SIZE, help="Rows per validation/COPY batch")
+    args = parser.parse_args(argv)
+
+    fmt = args.format or detect_format(args.path, None)
+    if fmt is None:
+        parser.error("cannot detect the file format, pass --format")
+
+    from app.database import engine
+
+    with open(args.path, "rb") as f:
+        report = import_companies(engine, read_records(f, fmt), fmt, args.chunk_size)
+    print(report.json(indent=2))
+    return 0 if report.failed == 0 else 1
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    sys.exit(main())
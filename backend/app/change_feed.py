@@ -0,0 +1,319 @@
+"""
+Change feed for companies: a trigger-written change log, delta reads and a
+LISTEN/NOTIFY-driven broadcaster for Server-Sent Events.
+
+Every statement on ``companies`` appends one ``company_changes`` row per
+affected company, tagged with the writing transaction ID, and sends a
+payload-less ``NOTIFY`` that PostgreSQL delivers once per committed
+transaction. Because triggers (created by the Alembic migrations) write the
+log, imports, batches and manual SQL show up in the feed too.
+
+Feed versions are transaction ID watermarks: ``read_changes(since)``
+returns the companies changed by transactions with ``since <= txid < W``,
+where ``W`` is the oldest transaction still running. Everything below
+``W`` has finished, so a change can never appear behind a cursor a client
+already holds, even when transactions commit out of order. A long-running
+transaction only delays delivery. Changes are returned as the current row
+(``upsert``) or ``delete``, so replaying a window is idempotent.
+
+Each worker runs one ``ChangeFeed`` listener. On notification it reads the
+new window once, invalidates the tiles and cached responses of that process
+(keeping caches coherent across workers) and fans the changes out to its
+SSE subscribers.
+"""
+import asyncio
+import logging
+import os
+import time
+from typing import Callable, List, NamedTuple, Optional, Set, Tuple
+
+from sqlalchemy import select, text
+from sqlalchemy.engine import make_url
+
+from app import database, models
+from app.response_cache import dataset_version
+from app.tile_cache import tile_cache
+
+logger = logging.getLogger(__name__)
+
+CHANGE_FEED_CHANNEL = "company_changes"
+
+# Run the LISTEN/NOTIFY listener in this process
+CHANGE_FEED_ENABLED = os.getenv("CHANGE_FEED_ENABLED", "true").lower() in ("1", "true", "yes")
+
+# Windows with more changes than this tell clients to reload the full list instead
+CHANGES_MAX = int(os.getenv("CHANGES_MAX", "10000"))
+
+# The listener also polls this often, for changes held back by long transactions
+CHANGE_FEED_POLL_SECONDS = float(os.getenv("CHANGE_FEED_POLL_SECONDS", "5"))
+
+# Change log entries older than this are pruned; older cursors get a reset
+CHANGE_LOG_RETENTION_HOURS = float(os.getenv("CHANGE_LOG_RETENTION_HOURS", "168"))
+
+PRUNE_INTERVAL_SECONDS = 3600
+
+# Events buffered per SSE subscriber before it is sent a reset instead
+SUBSCRIBER_QUEUE_SIZE = 100
+
+# Oldest transaction still running; every transaction below it has finished
+WATERMARK_SQL = text("SELECT pg_snapshot_xmin(pg_current_snapshot())::text::bigint")
+
+PRUNE_SQL = text("""
+    WITH pruned AS (
+        DELETE FROM company_changes
+        WHERE changed_at < now() - make_interval(secs => :retention)
+        RETURNING txid
+    )
+    UPDATE change_feed_state
+    SET pruned_before = greatest(pruned_before, (SELECT max(txid) + 1 FROM pruned))
+    WHERE id = 1 AND EXISTS (SELECT 1 FROM pruned)
+""")
+
+Point = Tuple[float, float]
+
+
+class ChangeSet(NamedTuple):
+    """
+    Changes between two feed versions.
+
+    ``reset`` means the window cannot be expressed as deltas (too many
+    changes, pruned history or a TRUNCATE) and the client must reload.
+    """
+    version: int
+    reset: bool
+    changes: List[dict]
+    points: List[Point]
+
+
+async def current_version(db) -> int:
+    """
+    The feed version a client should start from before loading the full list.
+    """
+    return await db.scalar(WATERMARK_SQL)
+
+
+async def read_changes(db, since: int) -> ChangeSet:
+    """
+    Read the companies changed since feed version ``since``.
+
+    Args:
+        db: ``AsyncSession`` or ``ThreadedSession``
+        since (int): Version returned by a previous call or by ``current_version``
+
+    Returns:
+        ChangeSet: The new version and one upsert (current row) or delete per
+        changed company, or a reset
+    """
+    watermark = await db.scalar(WATERMARK_SQL)
+    version = max(since, watermark)
+    pruned_before = await db.scalar(select(models.ChangeFeedState.pruned_before).filter(models.ChangeFeedState.id == 1))
+    if pruned_before is not None and since < pruned_before:
+        return ChangeSet(version, True, [], [])
+
+    log = models.CompanyChange
+    rows = (await db.execute(
+        select(log.company_id, log.longitude, log.latitude, log.old_longitude, log.old_latitude)
+        .filter(log.txid >= since, log.txid < watermark)
+        .order_by(log.id)
+        .limit(CHANGES_MAX + 1)
+    )).all()
+    if len(rows) > CHANGES_MAX or any(row.company_id is None for row in rows):
+        return ChangeSet(version, True, [], [])
+
+    points: List[Point] = []
+    for row in rows:
+        points.append((row.longitude, row.latitude))
+        if row.old_longitude is not None:
+            points.append((row.old_longitude, row.old_latitude))
+
+    ids = sorted({row.company_id for row in rows})
+    current = {}
+    if ids:
+        current = {
+            row.id: row._asdict()
+            for row in await db.execute(
+                select(*models.COMPANY_OUT_COLUMNS).filter(models.Company.id.in_(ids))
+            )
+        }
+    changes = [
+        {"op": "upsert", "id": company_id, "company": current[company_id]}
+        if company_id in current else {"op": "delete", "id": company_id, "company": None}
+        for company_id in ids
+    ]
+    return ChangeSet(version, False, changes, points)
+
+
+class ChangeFeed:
+    """
+    Per-process LISTEN/NOTIFY listener fanning change sets out to subscribers.
+    """
+
+    def __init__(self):
+        self.version: Optional[int] = None
+        self._subscribers: Set[asyncio.Queue] = set()
+        self._listeners: List[Callable[[ChangeSet], None]] = []
+        self._wakeup: Optional[asyncio.Event] = None
+        self._waiters: List[asyncio.Future] = []
+        self._task: Optional[asyncio.Task] = None
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    def subscribe(self) -> asyncio.Queue:
+        queue: asyncio.Queue = asyncio.Queue(maxsize=SUBSCRIBER_QUEUE_SIZE)
+        self._subscribers.add(queue)
+        return queue
+
+    def unsubscribe(self, queue: asyncio.Queue):
+        self._subscribers.discard(queue)
+
+    def add_listener(self, listener: Callable[[ChangeSet], None]):
+        """
+        Call ``listener`` with every change set read, including empty ones,
+        before caches are invalidated.
+        """
+        if listener not in self._listeners:
+            self._listeners.append(listener)
+
+    async def catch_up(self, timeout: float = CHANGE_FEED_POLL_SECONDS) -> bool:
+        """
+        Read changes now instead of waiting for the notification, and wait
+        until a read started after this call has reached the listeners.
+
+        Writes that return no rows (bulk imports) use this to reach this
+        worker's snapshot before the response is sent. Transactions that
+        were still running when the write committed hold back the feed
+        watermark, so their changes, and any committed after them, may
+        still arrive with a later read.
+
+        Args:
+            timeout (float): Seconds to wait for the read
+
+        Returns:
+            bool: False if the feed is not running or the read did not
+            finish within ``timeout``
+        """
+        if not self.running:
+            return False
+        waiter = asyncio.get_running_loop().create_future()
+        self._waiters.append(waiter)
+        self._wakeup.set()
+        try:
+            return await asyncio.wait_for(waiter, timeout)
+        except asyncio.TimeoutError:
+            return False
+
+    def _publish(self, change_set: ChangeSet):
+        for queue in list(self._subscribers):
+            try:
+                queue.put_nowait(change_set)
+            except asyncio.QueueFull:
+                # A slow client skips the backlog and reloads instead
+                while not queue.empty():
+                    queue.get_nowait()
+                queue.put_nowait(ChangeSet(change_set.version, True, [], []))
+
+    async def start(self):
+        """
+        Start listening in the background; a no-op if disabled.
+        """
+        if not CHANGE_FEED_ENABLED or self.running:
+            return
+        self._wakeup = asyncio.Event()
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _connect(self):
+        import asyncpg
+
+        url = make_url(database.DATABASE_DIRECT_URL).set(drivername="postgresql")
+        connection = await asyncpg.connect(url.render_as_string(hide_password=False))
+        await connection.add_listener(CHANGE_FEED_CHANNEL, lambda *args: self._wakeup.set())
+        logger.info("Listening for company changes on channel %s", CHANGE_FEED_CHANNEL)
+        return connection
+
+    async def _run(self):
+        connection = None
+        next_prune = 0.0
+        try:
+            while True:
+                try:
+                    if connection is None or connection.is_closed():
+                        connection = await self._connect()
+                        # Catch up on anything committed while not listening
+                        self._wakeup.set()
+                    try:
+                        await asyncio.wait_for(self._wakeup.wait(), CHANGE_FEED_POLL_SECONDS)
+                    except asyncio.TimeoutError:
+                        pass
+                    self._wakeup.clear()
+                    # Callers waiting from now on need the next read, which starts after their write
+                    waiters, self._waiters = self._waiters, []
+                    polled = False
+                    try:
+                        await self._poll()
+                        polled = True
+                    finally:
+                        for waiter in waiters:
+                            if not waiter.done():
+                                waiter.set_result(polled)
+                    if time.monotonic() >= next_prune:
+                        await self._prune()
+                        next_prune = time.monotonic() + PRUNE_INTERVAL_SECONDS
+                except asyncio.CancelledError:
+                    raise
+                except Exception as e:
+                    logger.warning("Change feed listener error, retrying: %s", e)
+                    if connection is not None and not connection.is_closed():
+                        await connection.close()
+                    connection = None
+                    await asyncio.sleep(CHANGE_FEED_POLL_SECONDS)
+        finally:
+            if connection is not None and not connection.is_closed():
+                await connection.close()
+
+    async def _poll(self):
+        db = database.open_async_session()
+        try:
+            if self.version is None:
+                self.version = await current_version(db)
+                dataset_version.note_synced(2 * CHANGE_FEED_POLL_SECONDS)
+                return
+            change_set = await read_changes(db, self.version)
+        finally:
+            await db.close()
+
+        for listener in self._listeners:
+            listener(change_set)
+        if change_set.reset:
+            tile_cache.clear()
+        elif change_set.changes:
+            for longitude, latitude in set(change_set.points):
+                tile_cache.invalidate_point(longitude, latitude)
+        if change_set.reset or change_set.changes:
+            database.note_write()
+            dataset_version.bump_local()
+            self._publish(change_set)
+        self.version = change_set.version
+        # Other workers' writes up to now are reflected; the next poll is due within the poll interval
+        dataset_version.note_synced(2 * CHANGE_FEED_POLL_SECONDS)
+
+    async def _prune(self):
+        db = database.open_async_session()
+        try:
+            await db.execute(PRUNE_SQL, {"retention": CHANGE_LOG_RETENTION_HOURS * 3600})
+            await db.commit()
+        finally:
+            await db.close()
+
+
+change_feed = ChangeFeed()
@@ -0,0 +1,125 @@
+"""
+Columnar binary encoding of company lists for map clients.
+
+A JSON array repeats every key and prints every coordinate as text; this
+format sends each column as one typed array instead. A payload is::
+
+    b"GCOL" | uint32 metadata length | metadata (UTF-8 JSON) | column buffers
+
+The metadata is padded with spaces so the buffers start on an 8-byte
+boundary, and every buffer is padded to a multiple of 8 bytes, so clients
+can view them as typed arrays without copying. Numbers are little-endian.
+The metadata looks like::
+
+    {"version": 1, "rows": 2, "columns": [
+        {"name": "id", "type": "int32", "offset": 0, "length": 8},
+        {"name": "latitude", "type": "float32", "offset": 8, "length": 8},
+        {"name": "industry", "type": "dictionary", "index": "uint16",
+         "values": ["Retail", "Technology"], "offset": 16, "length": 4},
+        {"name": "name", "type": "utf8", "offsets": {"offset": 24, "length": 12},
+         "data": {"offset": 40, "length": 9}}
+    ]}
+
+Offsets are relative to the first buffer. ``dictionary`` columns hold
+indexes into ``values``; ``utf8`` columns hold ``rows + 1`` uint32 offsets
+into a block of UTF-8 bytes.
+"""
+import struct
+from typing import List, Sequence
+
+import numpy as np
+import orjson
+
+COLUMNAR_MEDIA_TYPE = "application/vnd.geo-company.columnar"
+
+COLUMNAR_MAGIC = b"GCOL"
+
+COLUMNAR_VERSION = 1
+
+# Columns a client can ask for besides ``id``, which is always sent
+COLUMNAR_COLUMNS = ("latitude", "longitude", "industry", "name")
+
+COLUMNAR_DEFAULT_COLUMNS = ("latitude", "longitude", "industry")
+
+_ALIGNMENT = 8
+
+
+def _padding(size: int) -> int:
+    return -size % _ALIGNMENT
+
+
+def split_joined(joined: bytes, rows: int):
+    """
+    Split NUL-separated UTF-8 strings (as aggregated by the database) into
+    offsets and data without creating a Python object per string.
+
+    Returns:
+        Tuple of ``rows + 1`` uint32 offsets and the UTF-8 bytes
+    """
+    buffer = np.frombuffer(joined, dtype=np.uint8)
+    if rows == 0:
+        return np.zeros(1, dtype="<u4"), b""
+    separators = np.flatnonzero(buffer == 0)
+    offsets = np.empty(rows + 1, dtype="<u4")
+    offsets[0] = 0
+    # Each string starts after its separator; removing the separators shifts it left by its index
+    offsets[1:rows] = separators - np.arange(rows - 1)
+    offsets[rows] = len(buffer) - (rows - 1)
+    return offsets, buffer[buffer != 0].tobytes()
+
+
+def join_strings(values: Sequence[str]) -> bytes:
+    """
+    NUL-join strings in the form :func:`split_joined` expects.
+    """
+    return "\0".join(values).encode()
+
+
+class ColumnarWriter:
+    """
+    Assemble a columnar payload from column buffers.
+    """
+
+    def __init__(self, rows: int):
+        self.rows = rows
+        self._columns: List[dict] = []
+        self._buffers: List[bytes] = []
+        self._size = 0
+
+    def _buffer(self, data: bytes) -> dict:
+        location = {"offset": self._size, "length": len(data)}
+        padding = _padding(len(data))
+        self._buffers.append(data + b"\0" * padding)
+        self._size += len(data) + padding
+        return location
+
+    def add_array(self, name: str, values: np.ndarray, dtype: str):
+        """
+        Add a numeric column; ``dtype`` is a NumPy name such as ``int32``.
+        """
+        data = np.ascontiguousarray(values, dtype=np.dtype(dtype).newbyteorder("<")).tobytes()
+        self._columns.append({"name": name, "type": dtype, **self._buffer(data)})
+
+    def add_dictionary(self, name: str, codes: np.ndarray, values: Sequence[str]):
+        """
+        Add a dictionary-encoded column of ``values[code]`` per row.
+        """
+        index = "uint16" if len(values) <= 1 << 16 else "uint32"
+        data = np.ascontiguousarray(codes, dtype=np.dtype(index).newbyteorder("<")).tobytes()
+        self._columns.append({"name": name, "type": "dictionary", "index": index, "values": list(values), **self._buffer(data)})
+
+    def add_strings(self, name: str, offsets: np.ndarray, data: bytes):
+        """
+        Add a string column from ``rows + 1`` offsets into UTF-8 ``data``.
+        """
+        self._columns.append({
+            "name": name,
+            "type": "utf8",
+            "offsets": self._buffer(np.asarray(offsets, dtype="<u4").tobytes()),
+            "data": self._buffer(data),
+        })
+
+    def tobytes(self) -> bytes:
+        metadata = orjson.dumps({"version": COLUMNAR_VERSION, "rows": self.rows, "columns": self._columns})
+        metadata += b" " * _padding(len(COLUMNAR_MAGIC) + 4 + len(metadata))
+        return b"".join([COLUMNAR_MAGIC, struct.pack("<I", len(metadata)), metadata, *self._buffers])
@@ -0,0 +1,294 @@
+"""
+Streaming bulk export of companies as GeoJSON, FlatGeobuf or GeoParquet.
+
+Rows are read from a server-side cursor in ``EXPORT_BATCH_SIZE`` batches and
+each batch is encoded and sent before the next is fetched, so memory does
+not grow with the table:
+
+- GeoJSON: a ``FeatureCollection`` whose features are written per batch.
+- GeoParquet: Arrow record batches with WKB point geometries, written as
+  row groups of ``EXPORT_PARQUET_ROW_GROUP_SIZE`` rows. Needs ``pyarrow``.
+- FlatGeobuf: features are spooled to a temporary file and sent after the
+  header and packed Hilbert R-tree index, which must precede them (see
+  ``app.flatgeobuf``).
+"""
+import logging
+import os
+from typing import Iterator, List, NamedTuple
+
+import numpy as np
+import orjson
+from starlette.concurrency import iterate_in_threadpool, run_in_threadpool
+
+from app import database, models
+from app.flatgeobuf import FlatGeobufSpool, encode_feature, encode_properties
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:  # pragma: no cover - pyarrow is optional
+    pa = pq = None
+
+logger = logging.getLogger(__name__)
+
+# Rows fetched from the server-side cursor and encoded per batch
+EXPORT_BATCH_SIZE = int(os.getenv("EXPORT_BATCH_SIZE", "10000"))
+
+# Rows per Parquet row group; batches are buffered until one is full
+EXPORT_PARQUET_ROW_GROUP_SIZE = int(os.getenv("EXPORT_PARQUET_ROW_GROUP_SIZE", "100000"))
+
+EXPORT_COLUMNS = (
+    models.Company.id,
+    models.Company.name,
+    models.Company.industry,
+    models.Company.address,
+    models.Company.longitude,
+    models.Company.latitude,
+)
+
+
+class ExportFormat(NamedTuple):
+    media_type: str
+    extension: str
+
+
+EXPORT_FORMATS = {
+    "geojson": ExportFormat("application/geo+json", "geojson"),
+    "flatgeobuf": ExportFormat("application/flatgeobuf", "fgb"),
+    "geoparquet": ExportFormat("application/vnd.apache.parquet", "parquet"),
+}
+
+
+def available(format: str) -> bool:
+    """
+    Whether the dependencies of an export format are installed.
+    """
+    return format != "geoparquet" or pa is not None
+
+
+class GeoJSONWriter:
+    def __init__(self):
+        self._first = True
+
+    def begin(self) -> bytes:
+        return b'{"type":"FeatureCollection","features":['
+
+    def write(self, rows) -> bytes:
+        features = orjson.dumps([
+            {
+                "type": "Feature",
+                "id": company_id,
+                "geometry": {"type": "Point", "coordinates": [longitude, latitude]},
+                "properties": {"name": name, "industry": industry, "address": address},
+            }
+            for company_id, name, industry, address, longitude, latitude in rows
+        ])[1:-1]
+        if not features:
+            return b""
+        separator = b"" if self._first else b","
+        self._first = False
+        return separator + features
+
+    def finish(self) -> Iterator[bytes]:
+        yield b"]}"
+
+    def close(self):
+        pass
+
+
+class FlatGeobufWriter:
+    def __init__(self):
+        self._spool = FlatGeobufSpool()
+
+    def begin(self) -> bytes:
+        return b""
+
+    def write(self, rows) -> bytes:
+        lon, lat = zip(*((longitude, latitude) for *_, longitude, latitude in rows))
+        self._spool.write(
+            np.array(lon, dtype=np.float64), np.array(lat, dtype=np.float64),
+            [
+                encode_feature(longitude, latitude, encode_properties(company_id, name, industry, address))
+                for company_id, name, industry, address, longitude, latitude in rows
+            ]
+        )
+        return b""
+
+    def finish(self) -> Iterator[bytes]:
+        return self._spool.chunks()
+
+    def close(self):
+        self._spool.close()
+
+
+class _Sink:
+    """
+    Write-only file object collecting what the Parquet writer has produced
+    since the last drain.
+    """
+
+    def __init__(self):
+        self._parts: List[bytes] = []
+        self._position = 0
+        self.closed = False
+
+    def write(self, data) -> int:
+        data = bytes(data)
+        self._parts.append(data)
+        self._position += len(data)
+        return len(data)
+
+    def tell(self) -> int:
+        return self._position
+
+    def flush(self):
+        pass
+
+    def close(self):
+        self.closed = True
+
+    def drain(self) -> bytes:
+        data = b"".join(self._parts)
+        self._parts = []
+        return data
+
+
+def _wkb_points(lon: np.ndarray, lat: np.ndarray):
+    """
+    Little-endian WKB points as an Arrow binary array, built from two buffers.
+    """
+    count = len(lon)
+    wkb = np.empty(count, dtype=[("order", "u1"), ("type", "<u4"), ("x", "<f8"), ("y", "<f8")])
+    wkb["order"] = 1
+    wkb["type"] = 1
+    wkb["x"] = lon
+    wkb["y"] = lat
+    offsets = np.arange(0, wkb.itemsize * (count + 1), wkb.itemsize, dtype=np.int32)
+    return pa.Array.from_buffers(pa.binary(), count, [None, pa.py_buffer(offsets), pa.py_buffer(wkb.tobytes())])
+
+
+class GeoParquetWriter:
+    def __init__(self):
+        geo = {
+            "version": "1.1.0",
+            "primary_column": "geometry",
+            # No "crs": GeoParquet then means OGC:CRS84, i.e. longitude/latitude on WGS 84
+            "columns": {"geometry": {"encoding": "WKB", "geometry_types": ["Point"]}},
+        }
+        self._schema = pa.schema(
+            [
+                ("id", pa.int32()),
+                ("name", pa.string()),
+                ("industry", pa.string()),
+                ("address", pa.string()),
+                ("geometry", pa.binary()),
+            ],
+            metadata={"geo": orjson.dumps(geo)}
+        )
+        self._sink = _Sink()
+        self._writer = pq.ParquetWriter(self._sink, self._schema, compression="zstd")
+        self._pending: List = []
+        self._pending_rows = 0
+
+    def begin(self) -> bytes:
+        return b""
+
+    def write(self, rows) -> bytes:
+        ids, names, industries, addresses, lon, lat = zip(*rows)
+        self._pending.append(pa.record_batch([
+            pa.array(ids, pa.int32()),
+            pa.array(names, pa.string()),
+            pa.array(industries, pa.string()),
+            pa.array(addresses, pa.string()),
+            _wkb_points(np.array(lon, dtype=np.float64), np.array(lat, dtype=np.float64)),
+        ], schema=self._schema))
+        self._pending_rows += len(rows)
+        if self._pending_rows < EXPORT_PARQUET_ROW_GROUP_SIZE:
+            return b""
+        return self._flush()
+
+    def _flush(self) -> bytes:
+        if self._pending:
+            self._writer.write_table(pa.Table.from_batches(self._pending), row_group_size=self._pending_rows)
+            self._pending = []
+            self._pending_rows = 0
+        return self._sink.drain()
+
+    def finish(self) -> Iterator[bytes]:
+        yield self._flush()
+        # The footer
+        self._writer.close()
+        yield self._sink.drain()
+
+    def close(self):
+        self._pending = []
+
+
+_WRITERS = {
+    "geojson": GeoJSONWriter,
+    "flatgeobuf": FlatGeobufWriter,
+    "geoparquet": GeoParquetWriter,
+}
+
+
+def stream_export(stmt, format: str, replica: bool = False) -> Iterator[bytes]:
+    """
+    Yield an export file encoded batch by batch from a server-side cursor.
+
+    The generator owns its session because the response body is produced
+    after the request dependencies have been torn down. Used when
+    ``DB_ASYNC`` is disabled; Starlette iterates it in the threadpool.
+    """
+    writer = _WRITERS[format]()
+    exported = 0
+    try:
+        header = writer.begin()
+        if header:
+            yield header
+        db = database.open_session(replica)
+        try:
+            for rows in db.execute(stmt).partitions():
+                exported += len(rows)
+                chunk = writer.write(rows)
+                if chunk:
+                    yield chunk
+        finally:
+            db.close()
+        yield from writer.finish()
+        logger.info("Exported %s companies as %s", exported, format)
+    except Exception as e:
+        logger.error("Error exporting companies: %s", e)
+        raise
+    finally:
+        writer.close()
+
+
+async def stream_export_async(stmt, format: str, replica: bool = False):
+    """
+    Async counterpart of ``stream_export`` using ``AsyncSession.stream``.
+    The session is released before buffered output (the FlatGeobuf spool,
+    the Parquet footer) is sent. Encoding runs in the threadpool: batches
+    and especially ``finish`` (the FlatGeobuf sort and index, Parquet row
+    groups) are CPU-bound and would otherwise stall the event loop.
+    """
+    writer = _WRITERS[format]()
+    exported = 0
+    try:
+        header = writer.begin()
+        if header:
+            yield header
+        async with database.open_async_session(replica) as db:
+            result = await db.stream(stmt)
+            async for rows in result.partitions():
+                exported += len(rows)
+                chunk = await run_in_threadpool(writer.write, rows)
+                if chunk:
+                    yield chunk
+        async for chunk in iterate_in_threadpool(writer.finish()):
+            yield chunk
+        logger.info("Exported %s companies as %s", exported, format)
+    except Exception as e:
+        logger.error("Error exporting companies: %s", e)
+        raise
+    finally:
+        writer.close()
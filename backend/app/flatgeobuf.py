@@ -0,0 +1,345 @@
+"""
+FlatGeobuf encoding of company points.
+
+A FlatGeobuf file is magic bytes, a size-prefixed FlatBuffers header, an
+optional packed Hilbert R-tree and size-prefixed FlatBuffers features. The
+index comes before the features and stores each feature's byte offset, so
+features are spooled to a temporary file as they are encoded and emitted in
+Hilbert order once the last one is known. Memory holds only the per-feature
+coordinates, sizes and index nodes, roughly 100 bytes per company.
+
+Features of this schema have a fixed layout, so they are packed with one
+``struct`` call instead of a FlatBuffers builder; the small builder below is
+only used for the header.
+"""
+import math
+import mmap
+import struct
+import tempfile
+from typing import IO, Iterator, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+MAGIC = bytes([0x66, 0x67, 0x62, 0x03, 0x66, 0x67, 0x62, 0x01])
+
+# Children per R-tree node (the FlatGeobuf default)
+INDEX_NODE_SIZE = 16
+
+# GeometryType.Point and ColumnType values from the FlatGeobuf schema
+_POINT = 1
+_COLUMN_INT = 5
+_COLUMN_STRING = 11
+
+# (name, type, nullable, primary key); property indexes follow this order
+COLUMNS = (
+    ("id", _COLUMN_INT, False, True),
+    ("name", _COLUMN_STRING, False, False),
+    ("industry", _COLUMN_STRING, False, False),
+    ("address", _COLUMN_STRING, True, False),
+)
+
+# Size-prefixed Feature table, its vtable, a Geometry table with its vtable,
+# the xy vector and the properties vector length, laid out front to back
+_FEATURE = struct.Struct("<II4HiII4HiII2dI")
+
+_NODE = np.dtype([("min_x", "<f8"), ("min_y", "<f8"), ("max_x", "<f8"), ("max_y", "<f8"), ("offset", "<u8")])
+
+_HILBERT_MAX = (1 << 16) - 1
+
+# Bytes of spooled features joined per yielded chunk
+_CHUNK_BYTES = 1 << 20
+
+
+def encode_feature(longitude: float, latitude: float, properties: bytes) -> bytes:
+    """
+    Encode a point feature as a size-prefixed FlatBuffer.
+    """
+    padding = -len(properties) % 4
+    size = _FEATURE.size + len(properties) + padding
+    return _FEATURE.pack(
+        size - 4,
+        12,                 # root table offset
+        8, 12, 4, 8,        # Feature vtable: geometry at 4, properties at 8
+        8,                  # Feature table -> its vtable
+        16, 40,             # -> Geometry table, -> properties vector
+        8, 8, 0, 4,         # Geometry vtable: xy (field 1) at 4
+        8,                  # Geometry table -> its vtable
+        4,                  # -> xy vector
+        2, longitude, latitude,
+        len(properties)
+    ) + properties + b"\0" * padding
+
+
+def encode_properties(company_id: int, name: str, industry: str, address: Optional[str]) -> bytes:
+    """
+    Encode property values as FlatGeobuf column index and value pairs.
+    """
+    name_bytes = name.encode()
+    industry_bytes = industry.encode()
+    properties = (
+        struct.pack("<HiHI", 0, company_id, 1, len(name_bytes)) + name_bytes
+        + struct.pack("<HI", 2, len(industry_bytes)) + industry_bytes
+    )
+    if address is not None:
+        address_bytes = address.encode()
+        properties += struct.pack("<HI", 3, len(address_bytes)) + address_bytes
+    return properties
+
+
+class _Builder:
+    """
+    Minimal back-to-front FlatBuffers builder.
+    """
+
+    def __init__(self):
+        self._buffer = bytearray()
+        self._min_align = 1
+
+    def _prep(self, size: int, additional: int = 0):
+        self._min_align = max(self._min_align, size)
+        self._buffer[0:0] = bytes(-(len(self._buffer) + additional) % size)
+
+    def _prepend(self, data: bytes) -> int:
+        self._buffer[0:0] = data
+        return len(self._buffer)
+
+    def _uoffset(self, target: int):
+        self._prep(4)
+        self._prepend(struct.pack("<I", len(self._buffer) + 4 - target))
+
+    def string(self, value: str) -> int:
+        data = value.encode()
+        self._prep(4, len(data) + 1)
+        self._prepend(data + b"\0")
+        return self._prepend(struct.pack("<I", len(data)))
+
+    def vector(self, fmt: str, values: Sequence) -> int:
+        data = struct.pack(f"<{len(values)}{fmt}", *values)
+        self._prep(4, len(data))
+        self._prep(struct.calcsize(fmt), len(data))
+        self._prepend(data)
+        return self._prepend(struct.pack("<I", len(values)))
+
+    def tables(self, offsets: Sequence[int]) -> int:
+        self._prep(4, 4 * len(offsets))
+        for offset in reversed(offsets):
+            self._uoffset(offset)
+        return self._prepend(struct.pack("<I", len(offsets)))
+
+    def table(self, fields: Sequence[Tuple[int, str, object]]) -> int:
+        """
+        Write a table from (slot, struct format or "offset", value) fields.
+        """
+        start = len(self._buffer)
+        positions = {}
+        for slot, fmt, value in sorted(fields, key=lambda field: 4 if field[1] == "offset" else struct.calcsize(field[1])):
+            if fmt == "offset":
+                self._uoffset(value)
+            else:
+                self._prep(struct.calcsize(fmt))
+                self._prepend(struct.pack("<" + fmt, value))
+            positions[slot] = len(self._buffer)
+        self._prep(4)
+        table = self._prepend(bytes(4))
+        slots = max(positions, default=-1) + 1
+        vtable = [4 + 2 * slots, table - start] + [table - positions[slot] if slot in positions else 0 for slot in range(slots)]
+        end = self._prepend(struct.pack(f"<{len(vtable)}H", *vtable))
+        # The table's first field is the signed distance back to its vtable
+        position = len(self._buffer) - table
+        self._buffer[position:position + 4] = struct.pack("<i", end - table)
+        return table
+
+    def finish(self, root: int) -> bytes:
+        """
+        Finish as a size-prefixed buffer.
+        """
+        self._prep(self._min_align, 8)
+        self._uoffset(root)
+        self._prepend(struct.pack("<I", len(self._buffer)))
+        return bytes(self._buffer)
+
+
+def encode_header(name: str, count: int, envelope: Optional[Sequence[float]], index_node_size: int) -> bytes:
+    """
+    Encode the size-prefixed FlatGeobuf header for EPSG:4326 points.
+    """
+    builder = _Builder()
+    columns = []
+    for column_name, column_type, nullable, primary_key in COLUMNS:
+        column_name_offset = builder.string(column_name)
+        columns.append(builder.table([
+            (0, "offset", column_name_offset),
+            (1, "B", column_type),
+            (7, "?", nullable),
+            (9, "?", primary_key),
+        ]))
+    columns_offset = builder.tables(columns)
+    org = builder.string("EPSG")
+    crs = builder.table([(0, "offset", org), (1, "i", 4326)])
+    name_offset = builder.string(name)
+    fields = [
+        (0, "offset", name_offset),
+        (2, "B", _POINT),
+        (7, "offset", columns_offset),
+        (8, "Q", count),
+        (9, "H", index_node_size),
+        (10, "offset", crs),
+    ]
+    if envelope is not None:
+        fields.append((1, "offset", builder.vector("d", envelope)))
+    return builder.finish(builder.table(fields))
+
+
+def hilbert(x: np.ndarray, y: np.ndarray) -> np.ndarray:
+    """
+    Hilbert curve distance of 16-bit grid coordinates (the ``flatbush`` algorithm).
+    """
+    x = x.astype(np.uint32)
+    y = y.astype(np.uint32)
+    a = x ^ y
+    b = 0xFFFF ^ a
+    c = 0xFFFF ^ (x | y)
+    d = x & (y ^ 0xFFFF)
+
+    A = a | (b >> 1)
+    B = (a >> 1) ^ a
+    C = ((c >> 1) ^ (b & (d >> 1))) ^ c
+    D = ((a & (c >> 1)) ^ (d >> 1)) ^ d
+
+    for shift in (2, 4):
+        a, b, c, d = A, B, C, D
+        A = (a & (a >> shift)) ^ (b & (b >> shift))
+        B = (a & (b >> shift)) ^ (b & ((a ^ b) >> shift))
+        C = C ^ ((a & (c >> shift)) ^ (b & (d >> shift)))
+        D = D ^ ((b & (c >> shift)) ^ ((a ^ b) & (d >> shift)))
+
+    a, b, c, d = A, B, C, D
+    C = C ^ ((a & (c >> 8)) ^ (b & (d >> 8)))
+    D = D ^ ((b & (c >> 8)) ^ ((a ^ b) & (d >> 8)))
+
+    a = C ^ (C >> 1)
+    b = D ^ (D >> 1)
+    i0 = x ^ y
+    i1 = b | (0xFFFF ^ (i0 | a))
+
+    def spread(value):
+        value = (value | (value << 8)) & 0x00FF00FF
+        value = (value | (value << 4)) & 0x0F0F0F0F
+        value = (value | (value << 2)) & 0x33333333
+        return (value | (value << 1)) & 0x55555555
+
+    return (spread(i1) << 1) | spread(i0)
+
+
+def level_bounds(count: int, node_size: int) -> List[Tuple[int, int]]:
+    """
+    Node index ranges of each R-tree level, leaves first; the root is node 0.
+    """
+    sizes = [count]
+    n = count
+    while True:
+        n = math.ceil(n / node_size)
+        sizes.append(n)
+        if n == 1:
+            break
+    bounds = []
+    end = sum(sizes)
+    for size in sizes:
+        bounds.append((end - size, end))
+        end -= size
+    return bounds
+
+
+def build_index(lon: np.ndarray, lat: np.ndarray, offsets: np.ndarray, node_size: int) -> np.ndarray:
+    """
+    Build a packed R-tree over points already in Hilbert order, with each
+    leaf pointing at its feature's byte offset.
+
+    Returns:
+        Structured array of nodes, root first, in their on-disk layout
+    """
+    levels = level_bounds(len(lon), node_size)
+    nodes = np.empty(levels[0][1], dtype=_NODE)
+    leaves = nodes[levels[0][0]:]
+    leaves["min_x"] = leaves["max_x"] = lon
+    leaves["min_y"] = leaves["max_y"] = lat
+    leaves["offset"] = offsets
+    for (start, end), (parent_start, parent_end) in zip(levels, levels[1:]):
+        children = nodes[start:end]
+        groups = np.arange(0, end - start, node_size)
+        parents = nodes[parent_start:parent_end]
+        for key, reduce in (("min_x", np.minimum), ("min_y", np.minimum), ("max_x", np.maximum), ("max_y", np.maximum)):
+            parents[key] = reduce.reduceat(children[key], groups)
+        parents["offset"] = start + groups
+    return nodes
+
+
+class FlatGeobufSpool:
+    """
+    Collect encoded features in a temporary file, then emit the whole file
+    with a spatial index.
+    """
+
+    def __init__(self, name: str = "companies", index_node_size: int = INDEX_NODE_SIZE):
+        self.name = name
+        self.index_node_size = index_node_size
+        self._file: IO[bytes] = tempfile.TemporaryFile()
+        self._lon: List[np.ndarray] = []
+        self._lat: List[np.ndarray] = []
+        self._sizes: List[np.ndarray] = []
+
+    def write(self, lon: np.ndarray, lat: np.ndarray, features: List[bytes]):
+        """
+        Spool one batch of encoded features and their coordinates.
+        """
+        self._file.write(b"".join(features))
+        self._lon.append(lon)
+        self._lat.append(lat)
+        self._sizes.append(np.fromiter(map(len, features), dtype=np.int64, count=len(features)))
+
+    def chunks(self) -> Iterator[bytes]:
+        """
+        Yield the FlatGeobuf file: header, index, then features in Hilbert order.
+        """
+        try:
+            lon = np.concatenate(self._lon) if self._lon else np.empty(0)
+            lat = np.concatenate(self._lat) if self._lat else np.empty(0)
+            sizes = np.concatenate(self._sizes) if self._sizes else np.empty(0, dtype=np.int64)
+            self._lon = self._lat = self._sizes = []
+            count = len(lon)
+            if count == 0:
+                yield MAGIC + encode_header(self.name, 0, None, 0)
+                return
+
+            envelope = (float(lon.min()), float(lat.min()), float(lon.max()), float(lat.max()))
+            width = envelope[2] - envelope[0] or 1.0
+            height = envelope[3] - envelope[1] or 1.0
+            order = np.argsort(hilbert(
+                np.floor(_HILBERT_MAX * (lon - envelope[0]) / width),
+                np.floor(_HILBERT_MAX * (lat - envelope[1]) / height)
+            ), kind="stable")
+
+            spool_offsets = np.concatenate([[0], np.cumsum(sizes)[:-1]])[order]
+            sizes = sizes[order]
+            offsets = np.concatenate([[0], np.cumsum(sizes)[:-1]])
+            yield MAGIC + encode_header(self.name, count, envelope, self.index_node_size)
+            nodes = build_index(lon[order], lat[order], offsets, self.index_node_size)
+            del lon, lat
+            per_chunk = _CHUNK_BYTES // nodes.itemsize
+            for start in range(0, len(nodes), per_chunk):
+                yield nodes[start:start + per_chunk].tobytes()
+            del nodes
+
+            self._file.flush()
+            with mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ) as spooled:
+                per_chunk = max(1, _CHUNK_BYTES // max(1, int(sizes.mean())))
+                for start in range(0, count, per_chunk):
+                    yield b"".join([
+                        spooled[offset:offset + size]
+                        for offset, size in zip(spool_offsets[start:start + per_chunk].tolist(), sizes[start:start + per_chunk].tolist())
+                    ])
+        finally:
+            self.close()
+
+    def close(self):
+        self._file.close()
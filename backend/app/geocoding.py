@@ -0,0 +1,316 @@
+"""
+Offline geocoding against a local gazetteer.
+
+The gazetteer is a CSV file (GeoNames/OpenAddresses style) with an address
+or place name column and coordinates. It is loaded into a compact token
+index: coordinates live in typed arrays and every normalized token maps to
+an ``array('I')`` posting list of entry numbers. Lookups go through a
+bounded LRU cache keyed by the normalized address.
+"""
+import csv
+import logging
+import math
+import os
+import re
+import threading
+import unicodedata
+from array import array
+from bisect import bisect_left
+from collections import OrderedDict
+from typing import Dict, List, Optional, Sequence
+
+logger = logging.getLogger(__name__)
+
+# Gazetteer CSV to load at startup; geocoding is disabled without it
+GAZETTEER_PATH = os.getenv("GAZETTEER_PATH")
+
+# Number of normalized addresses kept in the lookup cache
+GEOCODER_CACHE_SIZE = int(os.getenv("GEOCODER_CACHE_SIZE", "10000"))
+
+# Minimum share of the query's token weight a match must cover
+GEOCODER_MIN_SCORE = float(os.getenv("GEOCODER_MIN_SCORE", "0.6"))
+
+# Tokens expanded per query token when it only matches as a prefix
+MAX_PREFIX_EXPANSION = 32
+
+_LABEL_COLUMNS = ("address", "name", "asciiname", "place")
+_LATITUDE_COLUMNS = ("latitude", "lat", "y")
+_LONGITUDE_COLUMNS = ("longitude", "lon", "lng", "x")
+
+_ABBREVIATIONS = {
+    "st": "street",
+    "str": "street",
+    "ave": "avenue",
+    "av": "avenue",
+    "rd": "road",
+    "blvd": "boulevard",
+    "dr": "drive",
+    "ln": "lane",
+    "hwy": "highway",
+    "pl": "place",
+    "sq": "square",
+    "ct": "court",
+    "n": "north",
+    "s": "south",
+    "e": "east",
+    "w": "west",
+}
+
+_NON_WORD = re.compile(r"[^\w]+", re.UNICODE)
+
+
+def normalize_address(address: str) -> str:
+    """
+    Lowercase, strip accents and punctuation, and expand common abbreviations.
+    """
+    text = unicodedata.normalize("NFKD", address)
+    text = "".join(char for char in text if not unicodedata.combining(char)).lower()
+    tokens = [_ABBREVIATIONS.get(token, token) for token in _NON_WORD.sub(" ", text).split()]
+    return " ".join(tokens)
+
+
+def _contains(posting: array, entry: int) -> bool:
+    index = bisect_left(posting, entry)
+    return index < len(posting) and posting[index] == entry
+
+
+class GeocodeMatch:
+    __slots__ = ("latitude", "longitude", "label", "score")
+
+    def __init__(self, latitude: float, longitude: float, label: str, score: float):
+        self.latitude = latitude
+        self.longitude = longitude
+        self.label = label
+        self.score = score
+
+
+class Gazetteer:
+    """
+    Token index over gazetteer entries.
+    """
+
+    def __init__(self):
+        self.latitudes = array("d")
+        self.longitudes = array("d")
+        self.labels: List[str] = []
+        self._exact: Dict[str, int] = {}
+        self._postings: Dict[str, array] = {}
+        self._vocabulary: List[str] = []
+
+    def __len__(self) -> int:
+        return len(self.labels)
+
+    @property
+    def token_count(self) -> int:
+        return len(self._postings)
+
+    def add(self, label: str, latitude: float, longitude: float):
+        normalized = normalize_address(label)
+        if not normalized:
+            return
+        entry = len(self.labels)
+        self.labels.append(label)
+        self.latitudes.append(latitude)
+        self.longitudes.append(longitude)
+        self._exact.setdefault(normalized, entry)
+        for token in set(normalized.split()):
+            postings = self._postings.get(token)
+            if postings is None:
+                postings = self._postings[token] = array("I")
+            postings.append(entry)
+
+    def finalize(self):
+        """
+        Build the sorted vocabulary used for prefix lookups.
+        """
+        self._vocabulary = sorted(self._postings)
+
+    @classmethod
+    def load_csv(cls, path: str) -> "Gazetteer":
+        gazetteer = cls()
+        with open(path, newline="", encoding="utf-8-sig") as f:
+            reader = csv.DictReader(f)
+            fields = {name.lower(): name for name in reader.fieldnames or []}
+            label_column = next((fields[c] for c in _LABEL_COLUMNS if c in fields), None)
+            latitude_column = next((fields[c] for c in _LATITUDE_COLUMNS if c in fields), None)
+            longitude_column = next((fields[c] for c in _LONGITUDE_COLUMNS if c in fields), None)
+            if not (label_column and latitude_column and longitude_column):
+                raise ValueError(f"Gazetteer {path} needs an address/name, latitude and longitude column")
+
+            skipped = 0
+            for row in reader:
+                try:
+                    latitude = float(row[latitude_column])
+                    longitude = float(row[longitude_column])
+                except (TypeError, ValueError):
+                    skipped += 1
+                    continue
+                if not (-90 <= latitude <= 90 and -180 <= longitude <= 180):
+                    skipped += 1
+                    continue
+                gazetteer.add(row[label_column] or "", latitude, longitude)
+
+        gazetteer.finalize()
+        logger.info("Loaded gazetteer with %s entries and %s tokens (%s rows skipped)", len(gazetteer), gazetteer.token_count, skipped)
+        return gazetteer
+
+    def _token_postings(self, token: str) -> List[array]:
+        postings = self._postings.get(token)
+        if postings is not None:
+            return [postings]
+        # Fall back to tokens that start with the query token (typed prefixes)
+        matches = []
+        index = bisect_left(self._vocabulary, token)
+        while index < len(self._vocabulary) and len(matches) < MAX_PREFIX_EXPANSION:
+            candidate = self._vocabulary[index]
+            if not candidate.startswith(token):
+                break
+            matches.append(self._postings[candidate])
+            index += 1
+        return matches
+
+    def lookup(self, normalized: str) -> Optional[GeocodeMatch]:
+        """
+        Find the best entry for a normalized address.
+        """
+        if not normalized or not self.labels:
+            return None
+
+        entry = self._exact.get(normalized)
+        if entry is not None:
+            return GeocodeMatch(self.latitudes[entry], self.longitudes[entry], self.labels[entry], 1.0)
+
+        total = len(self.labels)
+        token_postings = [self._token_postings(token) for token in set(normalized.split())]
+        token_postings.sort(key=lambda postings: sum(len(p) for p in postings))
+
+        scores: Dict[int, float] = {}
+        query_weight = 0.0
+        for postings in token_postings:
+            frequency = sum(len(p) for p in postings)
+            # Rare tokens (house numbers, street names) say more than common ones
+            weight = math.log(1 + total / (1 + frequency))
+            query_weight += weight
+            if scores and frequency > len(scores):
+                # Common tokens only boost candidates found by rarer ones;
+                # posting lists are sorted, so membership is a binary search
+                for candidate in scores:
+                    if any(_contains(posting, candidate) for posting in postings):
+                        scores[candidate] += weight
+                continue
+            matched = set()
+            for posting in postings:
+                matched.update(posting)
+            for candidate in matched:
+                scores[candidate] = scores.get(candidate, 0.0) + weight
+
+        if not scores or query_weight <= 0:
+            return None
+        best = max(scores, key=scores.__getitem__)
+        score = scores[best] / query_weight
+        if score < GEOCODER_MIN_SCORE:
+            return None
+        return GeocodeMatch(self.latitudes[best], self.longitudes[best], self.labels[best], round(score, 4))
+
+
+class Geocoder:
+    """
+    Gazetteer lookups behind a bounded LRU cache of normalized addresses.
+    """
+
+    def __init__(self, gazetteer: Gazetteer, cache_size: int = GEOCODER_CACHE_SIZE):
+        self.gazetteer = gazetteer
+        self.cache_size = cache_size
+        self._cache: "OrderedDict[str, Optional[GeocodeMatch]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def geocode(self, address: str) -> Optional[GeocodeMatch]:
+        normalized = normalize_address(address or "")
+        with self._lock:
+            if normalized in self._cache:
+                self._cache.move_to_end(normalized)
+                self.hits += 1
+                return self._cache[normalized]
+            self.misses += 1
+
+        match = self.gazetteer.lookup(normalized)
+        with self._lock:
+            self._cache[normalized] = match
+            if len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+        return match
+
+    def geocode_many(self, addresses: Sequence[str]) -> List[Optional[GeocodeMatch]]:
+        """
+        Geocode many addresses, looking each distinct normalized address up once.
+        """
+        resolved: Dict[str, Optional[GeocodeMatch]] = {}
+        results = []
+        for address in addresses:
+            normalized = normalize_address(address or "")
+            if normalized not in resolved:
+                resolved[normalized] = self.geocode(address)
+            results.append(resolved[normalized])
+        return results
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self.gazetteer),
+                "tokens": self.gazetteer.token_count,
+                "cache_size": len(self._cache),
+                "cache_capacity": self.cache_size,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            }
+
+
+_geocoder: Optional[Geocoder] = None
+
+
+def load_geocoder(path: Optional[str] = GAZETTEER_PATH) -> Optional[Geocoder]:
+    """
+    Load the configured gazetteer; returns None when geocoding is not configured.
+    """
+    global _geocoder
+    if not path:
+        logger.info("GAZETTEER_PATH is not set; geocoding is disabled")
+        return None
+    _geocoder = Geocoder(Gazetteer.load_csv(path))
+    return _geocoder
+
+
+def get_geocoder() -> Optional[Geocoder]:
+    return _geocoder
+
+
+def geocode_missing(companies: Sequence) -> List[Optional[str]]:
+    """
+    Fill in coordinates of ``CompanyCreate`` objects that only have an address.
+
+    Returns one error message per company, or None where the company
+    already had coordinates or its address was found.
+    """
+    missing = [i for i, company in enumerate(companies) if company.latitude is None]
+    errors: List[Optional[str]] = [None] * len(companies)
+    if not missing:
+        return errors
+
+    geocoder = get_geocoder()
+    if geocoder is None:
+        for i in missing:
+            errors[i] = "latitude and longitude are required because geocoding is not configured"
+        return errors
+
+    matches = geocoder.geocode_many([companies[i].address for i in missing])
+    for i, match in zip(missing, matches):
+        if match is None:
+            errors[i] = f"address could not be geocoded: {companies[i].address}"
+            continue
+        companies[i].latitude = match.latitude
+        companies[i].longitude = match.longitude
+    return errors
@@ -0,0 +1,174 @@
+"""
+Liveness and readiness checks.
+
+Probes arrive from every load balancer and orchestrator node, so the
+database round-trip behind readiness is cached for
+``HEALTH_CACHE_SECONDS`` and shared: concurrent probes wait for the one
+check in flight instead of each taking a pooled connection. Liveness never
+touches the database, so a database outage makes workers unready rather
+than getting them restarted.
+
+Readiness also reports pool saturation (checked-out connections over the
+most the pool may open) and whether the schema is at the latest Alembic
+revision, which is read once at startup.
+"""
+import asyncio
+import logging
+import os
+import time
+from pathlib import Path
+from typing import Optional
+
+from sqlalchemy import text
+from sqlalchemy.pool import QueuePool
+from starlette.concurrency import run_in_threadpool
+
+from app import database
+
+logger = logging.getLogger(__name__)
+
+# Seconds a database check result is reused by later probes
+HEALTH_CACHE_SECONDS = float(os.getenv("HEALTH_CACHE_SECONDS", "2"))
+
+# Seconds a database check may take before the database counts as down
+HEALTH_DB_TIMEOUT = float(os.getenv("HEALTH_DB_TIMEOUT", "2"))
+
+ALEMBIC_CONFIG = Path(__file__).resolve().parent.parent / "alembic.ini"
+
+# Alembic logs every plugin it sets up at INFO when the schema check runs
+logging.getLogger("alembic.runtime.plugins").setLevel(logging.WARNING)
+
+
+class DatabaseCheck:
+    """
+    Cached, single-flight ``SELECT 1`` against the primary.
+    """
+
+    def __init__(self, ttl: float = HEALTH_CACHE_SECONDS):
+        self.ttl = ttl
+        self.alive = False
+        self.latency_ms: Optional[float] = None
+        self.error: Optional[str] = None
+        self._checked_at = float("-inf")
+        self._task: Optional[asyncio.Task] = None
+
+    @property
+    def age(self) -> float:
+        return time.monotonic() - self._checked_at
+
+    @staticmethod
+    def _ping_sync():
+        with database.engine.connect() as connection:
+            connection.execute(text("SELECT 1"))
+
+    async def _ping(self):
+        if database.DB_ASYNC:
+            async with database.async_engine.connect() as connection:
+                await connection.execute(text("SELECT 1"))
+        else:
+            await run_in_threadpool(self._ping_sync)
+
+    async def _run(self):
+        start = time.perf_counter()
+        try:
+            await asyncio.wait_for(self._ping(), HEALTH_DB_TIMEOUT)
+            self.alive, self.error = True, None
+        except asyncio.TimeoutError:
+            self.alive, self.error = False, f"no answer within {HEALTH_DB_TIMEOUT:g}s"
+        except Exception as e:
+            self.alive, self.error = False, str(e)
+        if not self.alive:
+            logger.warning("Database health check failed: %s", self.error)
+        self.latency_ms = round((time.perf_counter() - start) * 1000, 1)
+        self._checked_at = time.monotonic()
+
+    async def check(self) -> bool:
+        """
+        Whether the database answered recently, checking it again when the
+        cached result is older than ``ttl``.
+        """
+        if self.age >= self.ttl:
+            if self._task is None or self._task.done():
+                self._task = asyncio.create_task(self._run())
+            # Shielded: a probe that disconnects must not cancel the check others wait on
+            await asyncio.shield(self._task)
+        return self.alive
+
+    def status(self) -> dict:
+        return {
+            "status": "connected" if self.alive else "disconnected",
+            "latency_ms": self.latency_ms,
+            "checked_seconds_ago": round(self.age, 3) if self.latency_ms is not None else None,
+            "error": self.error,
+        }
+
+
+database_check = DatabaseCheck()
+
+
+def pool_status() -> dict:
+    """
+    Connections in use per pooled engine, and the largest saturation among them.
+    """
+    pools = {}
+    for label, engine in database.engines.items():
+        pool = engine.pool
+        if not isinstance(pool, QueuePool):
+            continue
+        capacity = pool.size() + max(database.DB_MAX_OVERFLOW, 0)
+        pools[label] = {
+            "size": pool.size(),
+            "checked_out": pool.checkedout(),
+            "overflow": max(pool.overflow(), 0),
+            "saturation": round(pool.checkedout() / capacity, 3) if capacity else 0.0,
+        }
+    return {
+        "saturation": max((pool["saturation"] for pool in pools.values()), default=0.0),
+        "pools": pools,
+    }
+
+
+# "current", "outdated" or "unknown"; set by check_schema at startup
+schema_state = "unknown"
+
+
+def check_schema() -> str:
+    """
+    Compare the database's Alembic revision with the newest migration and
+    warn if ``alembic upgrade head`` has not been run.
+
+    Returns:
+        str: ``current``, ``outdated`` or ``unknown`` (the check failed)
+    """
+    global schema_state
+    try:
+        from alembic.config import Config
+        from alembic.runtime.migration import MigrationContext
+        from alembic.script import ScriptDirectory
+
+        heads = set(ScriptDirectory.from_config(Config(str(ALEMBIC_CONFIG))).get_heads())
+        with database.engine.connect() as connection:
+            revisions = set(MigrationContext.configure(connection).get_current_heads())
+        schema_state = "current" if revisions == heads else "outdated"
+        if schema_state == "outdated":
+            logger.warning(
+                "Database schema is at revision %s, expected %s; run: alembic upgrade head",
+                ", ".join(sorted(revisions)) or "none", ", ".join(sorted(heads))
+            )
+    except Exception as e:
+        logger.error("Failed to check database schema revision: %s", e)
+        schema_state = "unknown"
+    return schema_state
+
+
+async def readiness() -> dict:
+    """
+    Readiness report; ``ready`` is whether this worker can serve requests.
+    """
+    alive = await database_check.check()
+    return {
+        "ready": alive,
+        "database": database_check.status(),
+        "pool": pool_status(),
+        "schema": schema_state,
+    }
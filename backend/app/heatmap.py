@@ -0,0 +1,222 @@
+"""
+Density rasters of companies for zoomed-out map views.
+
+Points are binned into a ``width`` x ``height`` grid over a bounding box,
+optionally smoothed with a separable Gaussian, and encoded as an RGBA PNG
+(ready to drop onto the map as an image overlay) or as raw little-endian
+``float32`` densities for client-side colouring. Rows run north to south
+and are spaced evenly in Web Mercator, so the image lines up with the
+tiles it is drawn over.
+
+Binning, smoothing and encoding are pure NumPy functions run in a process
+pool, keeping the event loop responsive. This module must stay importable
+without the rest of the app because pool workers are spawned and import it
+on their own.
+"""
+import asyncio
+import logging
+import math
+import multiprocessing
+import os
+import struct
+import zlib
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import NamedTuple, Optional, Tuple
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# Worker processes rendering heatmaps; 0 renders on the threadpool instead
+HEATMAP_WORKERS = int(os.getenv("HEATMAP_WORKERS", str(min(4, os.cpu_count() or 1))))
+
+HEATMAP_FORMATS = ("png", "raw")
+
+HEATMAP_MEDIA_TYPES = {"png": "image/png", "raw": "application/octet-stream"}
+
+# Web Mercator stops short of the poles
+MAX_MERCATOR_LATITUDE = 85.0511287798
+
+# Colour ramp from transparent through blue, cyan and yellow to red, as (position, RGBA)
+_RAMP = (
+    (0.0, (0, 0, 255, 0)),
+    (0.25, (0, 0, 255, 160)),
+    (0.5, (0, 255, 255, 200)),
+    (0.75, (255, 255, 0, 230)),
+    (1.0, (255, 0, 0, 255)),
+)
+
+_PALETTE = np.stack([
+    np.interp(np.linspace(0, 1, 256), [stop for stop, _ in _RAMP], [color[channel] for _, color in _RAMP])
+    for channel in range(4)
+], axis=1).round().astype(np.uint8)
+
+_executor: Optional[ProcessPoolExecutor] = None
+
+
+class Extent(NamedTuple):
+    """Raster bounds: longitudes and Web Mercator y (radians) of the outer edges."""
+    west: float
+    south_y: float
+    east: float
+    north_y: float
+
+
+def mercator_y(latitude):
+    """
+    Web Mercator y in radians; works on floats and NumPy arrays.
+    """
+    latitude = np.clip(latitude, -MAX_MERCATOR_LATITUDE, MAX_MERCATOR_LATITUDE)
+    return np.log(np.tan(np.pi / 4 + np.radians(latitude) / 2))
+
+
+def extent(min_lon: float, min_lat: float, max_lon: float, max_lat: float) -> Extent:
+    """
+    Raster bounds of a bounding box.
+
+    Raises:
+        ValueError: If the box has no width, or no height once projected,
+            e.g. when it lies entirely beyond ``MAX_MERCATOR_LATITUDE``
+    """
+    bounds = Extent(min_lon, float(mercator_y(min_lat)), max_lon, float(mercator_y(max_lat)))
+    if not (bounds.west < bounds.east and bounds.south_y < bounds.north_y):
+        raise ValueError(
+            f"bbox must have a non-zero width and overlap latitudes "
+            f"-{MAX_MERCATOR_LATITUDE:.4f} to {MAX_MERCATOR_LATITUDE:.4f}, which Web Mercator covers"
+        )
+    return bounds
+
+
+def quantize(min_lon: float, min_lat: float, max_lon: float, max_lat: float,
+             width: int, height: int) -> Tuple[float, float, float, float]:
+    """
+    Widen a bounding box to a grid of power-of-two degree steps no larger
+    than a pixel, so panning by a few pixels reuses the cached raster.
+    """
+    def snap(low: float, high: float, pixels: int, limit: float) -> Tuple[float, float]:
+        step = 2.0 ** math.floor(math.log2((high - low) / pixels))
+        return max(math.floor(low / step) * step, -limit), min(math.ceil(high / step) * step, limit)
+
+    west, east = snap(min_lon, max_lon, width, 180.0)
+    south, north = snap(min_lat, max_lat, height, 90.0)
+    return west, south, east, north
+
+
+def histogram(lon: np.ndarray, lat: np.ndarray, bounds: Extent, width: int, height: int) -> np.ndarray:
+    """
+    Count points per pixel with ``histogram2d``; row 0 is the northern edge.
+    """
+    counts, _, _ = np.histogram2d(
+        mercator_y(lat), lon,
+        bins=(height, width),
+        range=((bounds.south_y, bounds.north_y), (bounds.west, bounds.east))
+    )
+    return counts[::-1].astype(np.float32)
+
+
+def grid_from_bins(ix: np.ndarray, iy: np.ndarray, counts: np.ndarray, width: int, height: int) -> np.ndarray:
+    """
+    Build a grid from per-pixel counts pre-aggregated by the database
+    (``iy`` counted from the southern edge).
+    """
+    grid = np.zeros((height, width), dtype=np.float32)
+    np.add.at(grid, (height - 1 - np.asarray(iy, dtype=np.int64), np.asarray(ix, dtype=np.int64)), counts)
+    return grid
+
+
+def blur(grid: np.ndarray, sigma: float) -> np.ndarray:
+    """
+    Separable Gaussian blur with a kernel cut off at three standard deviations.
+    """
+    if sigma <= 0:
+        return grid
+    radius = max(1, int(math.ceil(3 * sigma)))
+    offsets = np.arange(-radius, radius + 1)
+    kernel = np.exp(-(offsets ** 2) / (2 * sigma ** 2))
+    kernel = (kernel / kernel.sum()).astype(np.float32)
+    for axis in (0, 1):
+        padded = np.pad(grid, [(radius, radius) if a == axis else (0, 0) for a in (0, 1)])
+        size = grid.shape[axis]
+        out = np.zeros_like(grid)
+        for i, weight in enumerate(kernel):
+            out += weight * (padded[i:i + size] if axis == 0 else padded[:, i:i + size])
+        grid = out
+    return grid
+
+
+def _png_chunk(kind: bytes, data: bytes) -> bytes:
+    return struct.pack(">I", len(data)) + kind + data + struct.pack(">I", zlib.crc32(kind + data) & 0xFFFFFFFF)
+
+
+def encode_png(grid: np.ndarray) -> bytes:
+    """
+    Colour a density grid on a log scale and encode it as an 8-bit RGBA PNG.
+    """
+    height, width = grid.shape
+    peak = float(grid.max())
+    levels = np.zeros(grid.shape, dtype=np.uint8)
+    if peak > 0:
+        levels = np.rint(np.log1p(grid) / math.log1p(peak) * 255).astype(np.uint8)
+    rgba = _PALETTE[levels]
+    # Each scanline is prefixed with filter type 0 (none)
+    scanlines = np.concatenate([np.zeros((height, 1), dtype=np.uint8), rgba.reshape(height, width * 4)], axis=1)
+    return (
+        b"\x89PNG\r\n\x1a\n"
+        + _png_chunk(b"IHDR", struct.pack(">IIBBBBB", width, height, 8, 6, 0, 0, 0))
+        + _png_chunk(b"IDAT", zlib.compress(scanlines.tobytes(), 6))
+        + _png_chunk(b"IEND", b"")
+    )
+
+
+def encode(grid: np.ndarray, sigma: float, fmt: str) -> Tuple[bytes, float]:
+    """
+    Smooth and encode a grid.
+
+    Returns:
+        Tuple of the payload and the largest smoothed value
+    """
+    grid = blur(grid, sigma)
+    peak = float(grid.max()) if grid.size else 0.0
+    if fmt == "png":
+        return encode_png(grid), peak
+    return grid.astype("<f4").tobytes(), peak
+
+
+def render_points(lon, lat, bounds: Extent, width: int, height: int, sigma: float, fmt: str) -> Tuple[bytes, float]:
+    return encode(histogram(lon, lat, bounds, width, height), sigma, fmt)
+
+
+def render_bins(ix, iy, counts, width: int, height: int, sigma: float, fmt: str) -> Tuple[bytes, float]:
+    return encode(grid_from_bins(ix, iy, counts, width, height), sigma, fmt)
+
+
+def _get_executor() -> Optional[ProcessPoolExecutor]:
+    global _executor
+    if _executor is None and HEATMAP_WORKERS > 0:
+        # Spawned, not forked: the server process runs threads and an event loop
+        _executor = ProcessPoolExecutor(HEATMAP_WORKERS, mp_context=multiprocessing.get_context("spawn"))
+    return _executor
+
+
+async def run(function, *args):
+    """
+    Run a render function in the process pool, or the default thread executor
+    when ``HEATMAP_WORKERS`` is 0.
+    """
+    global _executor
+    executor = _get_executor()
+    try:
+        return await asyncio.get_running_loop().run_in_executor(executor, function, *args)
+    except BrokenProcessPool:
+        # A worker died (e.g. killed for memory); start a fresh pool next time
+        if _executor is executor:
+            _executor = None
+        raise
+
+
+def shutdown():
+    global _executor
+    if _executor is not None:
+        _executor.shutdown(wait=False, cancel_futures=True)
+        _executor = None
@@ -1,15 +1,20 @@
 from fastapi import FastAPI, HTTPException, Request, status
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, Response
 from fastapi.exceptions import RequestValidationError
 from pydantic import ValidationError
-from app.routers import companies
-from app.database import init_db, check_db_connection
+from app.routers import companies, geocoding, tiles
+from app.geocoding import load_geocoder
+from app.change_feed import change_feed
+from app.snapshot import company_snapshot
+from app.database import PrimaryPinMiddleware
+from app import health, heatmap, metrics
+from app.structured_logging import REQUEST_ID_HEADER, RequestContextMiddleware, configure_logging
 import logging
 from datetime import datetime
 
 # Configure logging
-logging.basicConfig(level=logging.INFO)
+configure_logging()
 logger = logging.getLogger(__name__)
 
 app = FastAPI(
@@ -27,10 +32,26 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=[
+        "ETag", "Link", "X-Next-After-Id",
+        "X-Heatmap-Bbox", "X-Heatmap-Size", "X-Heatmap-Max", "X-Heatmap-Count",
+        REQUEST_ID_HEADER,
+    ],
 )
 
+# Pin a client's reads to the primary for a few seconds after its writes (with read replicas)
+app.add_middleware(PrimaryPinMiddleware)
+
+# Request latency histograms and Server-Timing; added last so it also times CORS handling
+app.add_middleware(metrics.MetricsMiddleware)
+
+# Request IDs for log correlation; outermost so every log line of a request carries one
+app.add_middleware(RequestContextMiddleware)
+
 # Include routers
 app.include_router(companies.router, prefix="/api/v1", tags=["companies"])
+app.include_router(tiles.router, prefix="/api/v1", tags=["tiles"])
+app.include_router(geocoding.router, prefix="/api/v1", tags=["geocoding"])
 
 @app.on_event("startup")
 async def startup_event():
@@ -39,19 +60,32 @@ async def startup_event():
     """
     try:
         logger.info("Starting Geo Company Map API...")
-        init_db()
+        # Schema changes are applied by migrations (alembic upgrade head), not by each worker
+        health.check_schema()
+        load_geocoder()
+        await change_feed.start()
+        await company_snapshot.start()
         logger.info("Application startup completed successfully")
     except Exception as e:
-        logger.error(f"Application startup failed: {str(e)}")
+        logger.error("Application startup failed: %s", e)
         raise
 
+@app.on_event("shutdown")
+async def shutdown_event():
+    """
+    Stop background tasks on shutdown.
+    """
+    await company_snapshot.stop()
+    await change_feed.stop()
+    heatmap.shutdown()
+
 # Global exception handlers
 @app.exception_handler(RequestValidationError)
 async def validation_exception_handler(request: Request, exc: RequestValidationError):
     """
     Handle Pydantic validation errors and return user-friendly error messages.
     """
-    logger.warning(f"Validation error: {exc.errors()}")
+    logger.warning("Validation error: %s", exc.errors())
     
     error_details = []
     for error in exc.errors():
@@ -77,7 +111,7 @@ async def pydantic_validation_exception_handler(request: Request, exc: Validatio
     """
     Handle Pydantic model validation errors.
     """
-    logger.warning(f"Pydantic validation error: {exc.errors()}")
+    logger.warning("Pydantic validation error: %s", exc.errors())
     
     error_details = []
     for error in exc.errors():
@@ -103,7 +137,7 @@ async def http_exception_handler(request: Request, exc: HTTPException):
     """
     Handle HTTP exceptions and add logging.
     """
-    logger.warning(f"HTTP {exc.status_code}: {exc.detail}")
+    logger.warning("HTTP %s: %s", exc.status_code, exc.detail)
     return JSONResponse(
         status_code=exc.status_code,
         content={
@@ -117,7 +151,7 @@ async def general_exception_handler(request: Request, exc: Exception):
     """
     Handle unexpected exceptions and log them.
     """
-    logger.error(f"Unexpected error: {str(exc)}", exc_info=True)
+    logger.error("Unexpected error: %s", exc, exc_info=True)
     return JSONResponse(
         status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
         content={
@@ -141,14 +175,41 @@ async def root():
 @app.get("/health", tags=["health"])
 async def health_check():
     """
-    Health check endpoint for monitoring.
+    Health check endpoint for monitoring; the database check is cached briefly.
     """
-    db_status = check_db_connection()
+    report = await health.readiness()
     current_time = datetime.utcnow().isoformat() + "Z"
     
     return {
-        "status": "healthy" if db_status else "unhealthy",
-        "database": "connected" if db_status else "disconnected",
+        "status": "healthy" if report["ready"] else "unhealthy",
+        "database": report["database"]["status"],
+        "pool_saturation": report["pool"]["saturation"],
         "timestamp": current_time,
         "version": "1.0.0"
     }
+
+@app.get("/health/live", tags=["health"])
+async def liveness():
+    """
+    Liveness probe: the process is serving requests. Never touches the database.
+    """
+    return {"status": "alive"}
+
+@app.get("/health/ready", tags=["health"])
+async def readiness():
+    """
+    Readiness probe: 503 while the database is unreachable. Reports pool
+    saturation and the schema revision state.
+    """
+    report = await health.readiness()
+    return JSONResponse(
+        status_code=status.HTTP_200_OK if report["ready"] else status.HTTP_503_SERVICE_UNAVAILABLE,
+        content={"status": "ready" if report["ready"] else "unready", **report}
+    )
+
+@app.get("/metrics", tags=["health"], include_in_schema=False)
+async def prometheus_metrics():
+    """
+    Prometheus scrape endpoint: request latency, query timing and pool stats.
+    """
+    return Response(content=metrics.render(), media_type=metrics.PROMETHEUS_CONTENT_TYPE)
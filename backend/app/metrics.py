@@ -0,0 +1,353 @@
+"""
+Prometheus metrics and per-request timing.
+
+The registry here is deliberately small: counters, gauges and histograms
+with fixed label names, rendered in the Prometheus text format by
+``render()``. Values are per process; with several workers, scrape each
+one (or aggregate in Prometheus).
+
+Three sources feed it:
+
+- ``MetricsMiddleware`` times every request per route template and status
+  and, when ``SERVER_TIMING`` is enabled, adds a ``Server-Timing`` header.
+- ``instrument_engine`` hooks ``before/after_cursor_execute`` on an engine
+  to time each statement, count queries per request and log slow queries
+  when ``SLOW_QUERY_MS`` is set.
+- ``TimedQueuePool`` / ``TimedAsyncQueuePool`` time how long a checkout
+  waits for a pooled connection; pool size gauges are read at scrape time.
+"""
+import abc
+import logging
+import os
+import threading
+import time
+from contextvars import ContextVar
+from typing import Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+from sqlalchemy import event
+from sqlalchemy.pool import AsyncAdaptedQueuePool, QueuePool
+
+logger = logging.getLogger(__name__)
+
+# Log statements slower than this many milliseconds (0 disables the slow-query log)
+SLOW_QUERY_MS = float(os.getenv("SLOW_QUERY_MS", "0"))
+
+# Add a Server-Timing header with app, db and pool durations to every response
+SERVER_TIMING = os.getenv("SERVER_TIMING", "false").lower() in ("1", "true", "yes")
+
+# Characters of SQL included in a slow-query log line
+SLOW_QUERY_SQL_CHARS = 500
+
+PROMETHEUS_CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+REQUEST_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 5.0)
+QUERY_COUNT_BUCKETS = (0, 1, 2, 3, 5, 10, 25, 50, 100)
+
+LabelValues = Tuple[str, ...]
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if not float(value).is_integer() else str(int(value))
+
+
+class _Metric(abc.ABC):
+    """Base class: a named metric with fixed label names, registered on creation."""
+
+    type = ""
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        _REGISTRY.append(self)
+
+    def _labels(self, labelvalues: LabelValues, extra: Iterable[Tuple[str, str]] = ()) -> str:
+        pairs = list(zip(self.labelnames, labelvalues)) + list(extra)
+        if not pairs:
+            return ""
+        return "{" + ",".join(f'{name}="{_escape(str(value))}"' for name, value in pairs) + "}"
+
+    @abc.abstractmethod
+    def samples(self) -> List[str]:
+        """Sample lines in the Prometheus text format."""
+
+    def render(self) -> List[str]:
+        return [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.type}"] + self.samples()
+
+
+class Counter(_Metric):
+    type = "counter"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        super().__init__(name, documentation, labelnames)
+        self._values: Dict[LabelValues, float] = {}
+
+    def inc(self, *labelvalues: str, amount: float = 1.0):
+        with self._lock:
+            self._values[labelvalues] = self._values.get(labelvalues, 0.0) + amount
+
+    def samples(self) -> List[str]:
+        with self._lock:
+            values = list(self._values.items())
+        return [f"{self.name}{self._labels(labels)} {_format_value(value)}" for labels, value in values]
+
+
+class Gauge(_Metric):
+    """
+    A gauge set directly, or computed at scrape time by a callback returning
+    ``(labelvalues, value)`` pairs.
+    """
+
+    type = "gauge"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        super().__init__(name, documentation, labelnames)
+        self._values: Dict[LabelValues, float] = {}
+        self._callbacks: List[Callable[[], Iterable[Tuple[LabelValues, float]]]] = []
+
+    def set(self, value: float, *labelvalues: str):
+        with self._lock:
+            self._values[labelvalues] = value
+
+    def inc(self, *labelvalues: str, amount: float = 1.0):
+        with self._lock:
+            self._values[labelvalues] = self._values.get(labelvalues, 0.0) + amount
+
+    def dec(self, *labelvalues: str, amount: float = 1.0):
+        self.inc(*labelvalues, amount=-amount)
+
+    def add_callback(self, callback: Callable[[], Iterable[Tuple[LabelValues, float]]]):
+        self._callbacks.append(callback)
+
+    def samples(self) -> List[str]:
+        with self._lock:
+            values = dict(self._values)
+        for callback in self._callbacks:
+            try:
+                values.update(callback())
+            except Exception as e:
+                logger.warning("Failed to collect gauge %s: %s", self.name, e)
+        return [f"{self.name}{self._labels(labels)} {_format_value(value)}" for labels, value in values.items()]
+
+
+class Histogram(_Metric):
+    type = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (), buckets: Sequence[float] = REQUEST_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets)) + (float("inf"),)
+        # Per label set: [count per bucket (non-cumulative)..., sum, count]
+        self._values: Dict[LabelValues, List[float]] = {}
+
+    def observe(self, value: float, *labelvalues: str):
+        with self._lock:
+            state = self._values.get(labelvalues)
+            if state is None:
+                state = self._values[labelvalues] = [0.0] * (len(self.buckets) + 2)
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    state[i] += 1
+                    break
+            state[-2] += value
+            state[-1] += 1
+
+    def samples(self) -> List[str]:
+        with self._lock:
+            values = [(labels, list(state)) for labels, state in self._values.items()]
+        lines = []
+        for labels, state in values:
+            cumulative = 0.0
+            for bound, count in zip(self.buckets, state):
+                cumulative += count
+                lines.append(f"{self.name}_bucket{self._labels(labels, [('le', _format_value(bound))])} {_format_value(cumulative)}")
+            lines.append(f"{self.name}_sum{self._labels(labels)} {_format_value(state[-2])}")
+            lines.append(f"{self.name}_count{self._labels(labels)} {_format_value(state[-1])}")
+        return lines
+
+
+_REGISTRY: List[_Metric] = []
+
+REQUEST_LATENCY = Histogram(
+    "http_request_duration_seconds", "HTTP request latency by route template and status",
+    ("method", "route", "status")
+)
+REQUESTS_IN_PROGRESS = Gauge("http_requests_in_progress", "HTTP requests currently being served")
+REQUEST_QUERIES = Histogram(
+    "http_request_db_queries", "Database statements executed per HTTP request",
+    ("route",), buckets=QUERY_COUNT_BUCKETS
+)
+QUERY_LATENCY = Histogram(
+    "db_query_duration_seconds", "Database statement execution time by statement type",
+    ("statement",), buckets=QUERY_BUCKETS
+)
+SLOW_QUERIES = Counter("db_slow_queries_total", "Statements slower than SLOW_QUERY_MS", ("statement",))
+POOL_WAIT = Histogram(
+    "db_pool_checkout_wait_seconds", "Time spent waiting for a pooled connection",
+    ("pool",), buckets=QUERY_BUCKETS
+)
+POOL_SIZE = Gauge("db_pool_size", "Configured number of pooled connections", ("pool",))
+POOL_CHECKED_OUT = Gauge("db_pool_checked_out", "Pooled connections currently in use", ("pool",))
+POOL_OVERFLOW = Gauge("db_pool_overflow", "Connections opened beyond the pool size", ("pool",))
+
+
+def render() -> str:
+    """Render every registered metric in the Prometheus text exposition format."""
+    lines: List[str] = []
+    for metric in _REGISTRY:
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
+
+
+class RequestTimings:
+    """Database time, query count and pool wait accumulated for one request."""
+
+    __slots__ = ("queries", "db_seconds", "pool_wait_seconds")
+
+    def __init__(self):
+        self.queries = 0
+        self.db_seconds = 0.0
+        self.pool_wait_seconds = 0.0
+
+
+# Timings of the request being served; None outside requests (startup, CLI tools)
+_request_timings: ContextVar[Optional[RequestTimings]] = ContextVar("request_timings", default=None)
+
+
+def _statement_type(statement: str) -> str:
+    keyword = statement.lstrip().split(None, 1)[0].upper() if statement.strip() else ""
+    if keyword in ("SELECT", "INSERT", "UPDATE", "DELETE", "WITH", "COPY", "BEGIN", "COMMIT", "ROLLBACK", "SAVEPOINT", "RELEASE"):
+        return keyword.lower()
+    return "other"
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("query_start", []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    elapsed = time.perf_counter() - conn.info["query_start"].pop()
+    kind = _statement_type(statement)
+    QUERY_LATENCY.observe(elapsed, kind)
+
+    timings = _request_timings.get()
+    if timings is not None:
+        timings.queries += 1
+        timings.db_seconds += elapsed
+
+    if SLOW_QUERY_MS and elapsed * 1000 >= SLOW_QUERY_MS:
+        SLOW_QUERIES.inc(kind)
+        logger.warning("Slow query (%.1f ms): %s", elapsed * 1000, " ".join(statement.split())[:SLOW_QUERY_SQL_CHARS])
+
+
+def _handle_error(exception_context):
+    # The statement failed, so after_cursor_execute will not pop its start time
+    starts = exception_context.connection.info.get("query_start") if exception_context.connection is not None else None
+    if starts:
+        starts.pop()
+
+
+def instrument_engine(engine, name: str):
+    """
+    Time statements and export pool gauges for ``engine``.
+
+    Args:
+        engine: A sync ``Engine``, or the ``sync_engine`` of an ``AsyncEngine``
+        name (str): Value of the ``pool`` label, e.g. ``sync`` or ``async``
+    """
+    event.listen(engine, "before_cursor_execute", _before_cursor_execute)
+    event.listen(engine, "after_cursor_execute", _after_cursor_execute)
+    event.listen(engine, "handle_error", _handle_error)
+
+    def gauge(read):
+        def collect():
+            # engine.pool is replaced by dispose(), so look it up on every scrape
+            pool = engine.pool
+            return [((name,), read(pool))] if isinstance(pool, QueuePool) else []
+        return collect
+
+    POOL_SIZE.add_callback(gauge(lambda pool: pool.size()))
+    POOL_CHECKED_OUT.add_callback(gauge(lambda pool: pool.checkedout()))
+    POOL_OVERFLOW.add_callback(gauge(lambda pool: max(pool.overflow(), 0)))
+
+
+class _TimedCheckout:
+    """Pool mixin recording how long each checkout waits for a connection."""
+
+    def _do_get(self):
+        start = time.perf_counter()
+        try:
+            return super()._do_get()
+        finally:
+            elapsed = time.perf_counter() - start
+            POOL_WAIT.observe(elapsed, self._orig_logging_name or "default")
+            timings = _request_timings.get()
+            if timings is not None:
+                timings.pool_wait_seconds += elapsed
+
+
+class TimedQueuePool(_TimedCheckout, QueuePool):
+    """``QueuePool`` with checkout wait timing; the ``pool`` label is ``pool_logging_name``."""
+
+
+class TimedAsyncQueuePool(_TimedCheckout, AsyncAdaptedQueuePool):
+    """``AsyncAdaptedQueuePool`` with checkout wait timing."""
+
+
+def _server_timing(total: float, timings: RequestTimings) -> bytes:
+    return (
+        f"app;dur={total * 1000:.1f}, "
+        f'db;dur={timings.db_seconds * 1000:.1f};desc="{timings.queries} queries", '
+        f"pool;dur={timings.pool_wait_seconds * 1000:.1f}"
+    ).encode("latin-1")
+
+
+class MetricsMiddleware:
+    """
+    ASGI middleware recording request latency per route template and status.
+
+    Routes are labelled with their path template (``/api/v1/companies/{company_id}``),
+    not the raw path, to keep label cardinality bounded. The duration covers
+    the handler up to the last body chunk, including streamed responses.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        start = time.perf_counter()
+        timings = RequestTimings()
+        token = _request_timings.set(timings)
+        status_code = 500
+
+        async def send_wrapper(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+                if SERVER_TIMING:
+                    headers = list(message.get("headers", []))
+                    headers.append((b"server-timing", _server_timing(time.perf_counter() - start, timings)))
+                    message = {**message, "headers": headers}
+            await send(message)
+
+        REQUESTS_IN_PROGRESS.inc()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            REQUESTS_IN_PROGRESS.dec()
+            _request_timings.reset(token)
+            route = scope.get("route")
+            route_path = getattr(route, "path", None) or "unmatched"
+            REQUEST_LATENCY.observe(time.perf_counter() - start, scope["method"], route_path, str(status_code))
+            REQUEST_QUERIES.observe(timings.queries, route_path)
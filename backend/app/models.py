@@ -1,6 +1,8 @@
-from sqlalchemy import Column, Integer, String, Float
+from sqlalchemy import BigInteger, Column, DateTime, Integer, String, Float, Index, func
 from geoalchemy2 import Geometry
 from .database import Base
+from .spatial import geography
+from .search import name_key, search_document
 
 class Company(Base):
     __tablename__ = "companies"
@@ -11,4 +13,86 @@ class Company(Base):
     address = Column(String, nullable=True)
     latitude = Column(Float, nullable=False)
     longitude = Column(Float, nullable=False)
-    location = Column(Geometry(geometry_type="POINT", srid=4326))
+    location = Column(Geometry(geometry_type="POINT", srid=4326, spatial_index=False))
+
+    __table_args__ = (
+        # GiST index backing bounding box (&&) viewport queries
+        Index("ix_companies_location", "location", postgresql_using="gist"),
+        Index("ix_companies_industry", "industry"),
+    )
+
+# GiST index on the geography cast backing KNN (<->) and ST_DWithin radius queries
+Index("ix_companies_location_geog", geography(Company.location), postgresql_using="gist")
+
+# Full-text search over name, industry and address (ranked word and prefix matches)
+Index(
+    "ix_companies_search",
+    search_document(Company.name, Company.industry, Company.address),
+    postgresql_using="gin"
+)
+
+# Trigram similarity on the name (typo-tolerant search); needs the pg_trgm extension
+Index(
+    "ix_companies_name_trgm",
+    name_key(Company.name).label("name_key"),
+    postgresql_using="gin",
+    postgresql_ops={"name_key": "gin_trgm_ops"}
+)
+
+# Short name prefixes (LIKE 'ab%'), which trigrams cannot serve
+Index(
+    "ix_companies_name_prefix",
+    name_key(Company.name).label("name_key"),
+    postgresql_ops={"name_key": "text_pattern_ops"}
+)
+
+# Columns serialized for CompanyOut, in its field order
+COMPANY_OUT_COLUMNS = (
+    Company.name,
+    Company.industry,
+    Company.address,
+    Company.latitude,
+    Company.longitude,
+    Company.id,
+)
+
+class CompanyStat(Base):
+    """
+    Company counts per industry and coarse grid cell, maintained by triggers
+    on ``companies`` (see ``app.stats``).
+    """
+    __tablename__ = "company_stats"
+
+    industry = Column(String, primary_key=True)
+    # floor(longitude / STATS_CELL_DEGREES), floor(latitude / STATS_CELL_DEGREES)
+    cell_x = Column(Integer, primary_key=True)
+    cell_y = Column(Integer, primary_key=True)
+    count = Column(BigInteger, nullable=False)
+
+class CompanyChange(Base):
+    """
+    Change log of ``companies`` written by triggers (see ``app.change_feed``).
+    """
+    __tablename__ = "company_changes"
+
+    id = Column(BigInteger, primary_key=True)
+    # Writing transaction ID; feed cursors are transaction ID watermarks
+    txid = Column(BigInteger, nullable=False, index=True)
+    # NULL for a "reset" entry written by TRUNCATE
+    company_id = Column(Integer, nullable=True)
+    op = Column(String, nullable=False)
+    longitude = Column(Float, nullable=True)
+    latitude = Column(Float, nullable=True)
+    # Previous position of an updated company, for tile invalidation
+    old_longitude = Column(Float, nullable=True)
+    old_latitude = Column(Float, nullable=True)
+    changed_at = Column(DateTime(timezone=True), nullable=False, server_default=func.now(), index=True)
+
+class ChangeFeedState(Base):
+    """
+    Single-row table: cursors below ``pruned_before`` refer to pruned changes.
+    """
+    __tablename__ = "change_feed_state"
+
+    id = Column(Integer, primary_key=True)
+    pruned_before = Column(BigInteger, nullable=False)
@@ -0,0 +1,316 @@
+import gzip
+import json
+import logging
+import os
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from typing import Dict, Iterable, Optional, Tuple
+
+import orjson
+from fastapi import Request, Response, status
+
+try:
+    import brotli
+except ImportError:  # pragma: no cover - brotli is optional
+    brotli = None
+
+try:
+    import redis.asyncio as redis
+except ImportError:  # pragma: no cover - redis is optional
+    redis = None
+
+logger = logging.getLogger(__name__)
+
+# Shared version counter and response cache across workers (optional)
+REDIS_URL = os.getenv("REDIS_URL")
+
+# Memory budget of the in-process response cache
+RESPONSE_CACHE_MAX_BYTES = int(os.getenv("RESPONSE_CACHE_MAX_BYTES", str(32 * 1024 * 1024)))
+
+# Lifetime of shared cache entries; entries of old versions are never read again
+RESPONSE_CACHE_TTL = int(os.getenv("RESPONSE_CACHE_TTL", "300"))
+
+# Seconds cached responses live when no shared version exists (no Redis, change feed not synced)
+RESPONSE_CACHE_LOCAL_TTL = float(os.getenv("RESPONSE_CACHE_LOCAL_TTL", "1"))
+
+# Bodies smaller than this are not worth compressing
+COMPRESS_MIN_BYTES = 512
+
+_VERSION_KEY = "geo:companies:version"
+_ENTRY_PREFIX = "geo:companies:response:"
+
+_redis_client = None
+if REDIS_URL:
+    if redis is None:
+        logger.warning("REDIS_URL is set but the redis package is not installed; using in-process caching only")
+    else:
+        _redis_client = redis.from_url(REDIS_URL)
+
+
+class DatasetVersion:
+    """
+    Counter bumped by every write path, used to key caches and ETags.
+
+    The version only covers other workers' writes when it is *shared*:
+    with ``REDIS_URL`` all workers use one counter, and without it the
+    change feed bumps each worker's counter when it hears of a write (see
+    ``note_synced``). Otherwise a worker only sees its own writes, so its
+    version carries a time bucket of ``RESPONSE_CACHE_LOCAL_TTL`` seconds
+    that expires cached entries, and ``not_modified`` answers no 304s.
+    Either way a random per-process epoch is folded into local versions, so
+    their ETags never validate against another worker or a Redis version.
+    """
+
+    def __init__(self, client=None):
+        self._client = client
+        self._epoch = uuid.uuid4().hex[:8]
+        self._local = 0
+        self._lock = threading.Lock()
+        self._client_ok = client is not None
+        self._synced_until = float("-inf")
+
+    @property
+    def shared(self) -> bool:
+        """
+        Whether the version reflects writes made by other workers.
+        """
+        return self._client_ok or time.monotonic() < self._synced_until
+
+    def note_synced(self, max_age: float):
+        """
+        Record that this process has caught up with all committed writes
+        (the change feed polled); the version counts as shared for ``max_age``
+        seconds, by which time the next poll should have happened.
+        """
+        self._synced_until = time.monotonic() + max_age
+
+    async def current(self) -> str:
+        if self._client is not None:
+            try:
+                value = await self._client.get(_VERSION_KEY)
+                self._client_ok = True
+                return f"shared.{int(value or 0)}"
+            except Exception as e:
+                self._client_ok = False
+                logger.warning("Failed to read shared dataset version: %s", e)
+        if self.shared:
+            return f"{self._epoch}.{self._local}"
+        # Writes by other workers go unseen: let cached entries expire quickly
+        return f"{self._epoch}.{self._local}.{int(time.monotonic() // RESPONSE_CACHE_LOCAL_TTL)}"
+
+    def bump_local(self):
+        """
+        Advance this process's counter only, after a write observed through
+        the change feed (the writer already bumped the shared counter).
+        """
+        with self._lock:
+            self._local += 1
+
+    async def bump(self):
+        with self._lock:
+            self._local += 1
+        if self._client is not None:
+            try:
+                await self._client.incr(_VERSION_KEY)
+            except Exception as e:
+                logger.warning("Failed to bump shared dataset version: %s", e)
+
+
+class CachedResponse:
+    """
+    A serialized JSON body with its pre-compressed variants and headers.
+    """
+
+    def __init__(self, etag: str, bodies: Dict[str, bytes], headers: Dict[str, str]):
+        self.etag = etag
+        self.bodies = bodies
+        self.headers = headers
+
+    @property
+    def size(self) -> int:
+        return sum(len(body) for body in self.bodies.values())
+
+    @classmethod
+    def build(cls, etag: str, content, headers: Optional[Dict[str, str]] = None) -> "CachedResponse":
+        return cls.from_body(etag, orjson.dumps(content), headers)
+
+    @classmethod
+    def from_body(cls, etag: str, body: bytes, headers: Optional[Dict[str, str]] = None,
+                  compress: bool = True) -> "CachedResponse":
+        bodies = {"identity": body}
+        if compress and len(body) >= COMPRESS_MIN_BYTES:
+            bodies["gzip"] = gzip.compress(body, compresslevel=6)
+            if brotli is not None:
+                bodies["br"] = brotli.compress(body, quality=5)
+        return cls(etag, bodies, dict(headers or {}))
+
+    def dumps(self) -> Dict[str, bytes]:
+        mapping = {f"body:{encoding}": body for encoding, body in self.bodies.items()}
+        mapping["etag"] = self.etag.encode("utf-8")
+        mapping["headers"] = json.dumps(self.headers).encode("utf-8")
+        return mapping
+
+    @classmethod
+    def loads(cls, mapping: Dict[bytes, bytes]) -> "CachedResponse":
+        bodies = {}
+        for key, value in mapping.items():
+            key = key.decode("utf-8")
+            if key.startswith("body:"):
+                bodies[key[len("body:"):]] = value
+        return cls(
+            mapping[b"etag"].decode("utf-8"),
+            bodies,
+            json.loads(mapping[b"headers"])
+        )
+
+
+class ResponseCache:
+    """
+    LRU of serialized responses bounded by total size, with an optional
+    Redis tier shared across workers. Keys include the dataset version, so
+    writes never need to purge entries: stale ones simply stop being read.
+    """
+
+    def __init__(self, max_bytes: int, client=None):
+        self.max_bytes = max_bytes
+        self._client = client
+        self._entries: "OrderedDict[str, CachedResponse]" = OrderedDict()
+        self._size = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    async def get(self, key: str) -> Optional[CachedResponse]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry
+
+        if self._client is not None:
+            try:
+                mapping = await self._client.hgetall(_ENTRY_PREFIX + key)
+                if mapping:
+                    entry = CachedResponse.loads(mapping)
+                    self._store(key, entry)
+                    self.hits += 1
+                    return entry
+            except Exception as e:
+                logger.warning("Failed to read shared response cache: %s", e)
+
+        self.misses += 1
+        return None
+
+    async def put(self, key: str, entry: CachedResponse):
+        self._store(key, entry)
+        if self._client is not None:
+            try:
+                async with self._client.pipeline(transaction=False) as pipe:
+                    pipe.hset(_ENTRY_PREFIX + key, mapping=entry.dumps())
+                    pipe.expire(_ENTRY_PREFIX + key, RESPONSE_CACHE_TTL)
+                    await pipe.execute()
+            except Exception as e:
+                logger.warning("Failed to write shared response cache: %s", e)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "bytes": self._size,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+            }
+
+    def _store(self, key: str, entry: CachedResponse):
+        size = entry.size
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            previous = self._entries.pop(key, None)
+            if previous is not None:
+                self._size -= previous.size
+            self._entries[key] = entry
+            self._size += size
+            while self._size > self.max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self._size -= evicted.size
+
+
+def cache_key(request: Request, version: str) -> str:
+    """
+    Key a request by path, normalized query parameters and dataset version.
+    """
+    params = "&".join(f"{key}={value}" for key, value in sorted(request.query_params.multi_items()))
+    return f"{version}:{request.url.path}?{params}"
+
+
+def make_etag(key: str) -> str:
+    """
+    Strong ETag for a cache key (version plus normalized request).
+    """
+    return uuid.uuid5(uuid.NAMESPACE_URL, key).hex
+
+
+def _accepted_encodings(header: str) -> Iterable[str]:
+    for part in header.split(","):
+        coding, _, params = part.strip().partition(";")
+        if params.replace(" ", "") in ("q=0", "q=0.0", "q=0.00", "q=0.000"):
+            continue
+        yield coding.strip().lower()
+
+
+def _etag_matches(if_none_match: str, etag: str) -> bool:
+    if if_none_match.strip() == "*":
+        return True
+    for candidate in if_none_match.split(","):
+        candidate = candidate.strip()
+        if candidate.startswith("W/"):
+            candidate = candidate[2:]
+        # Encoded variants carry a suffix; weak comparison ignores it
+        if candidate.strip('"').split("-")[0] == etag:
+            return True
+    return False
+
+
+def not_modified(request: Request, etag: str, vary: str = "Accept-Encoding") -> Optional[Response]:
+    """
+    Return a 304 response if the request's If-None-Match matches the ETag.
+    Never answers 304 while the dataset version is not shared, as the
+    client's copy may predate a write made by another worker.
+    """
+    if not dataset_version.shared:
+        return None
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match and _etag_matches(if_none_match, etag):
+        return Response(
+            status_code=status.HTTP_304_NOT_MODIFIED,
+            headers={"ETag": f'"{etag}"', "Vary": vary, "Cache-Control": "no-cache"}
+        )
+    return None
+
+
+def to_response(request: Request, entry: CachedResponse) -> Response:
+    """
+    Serve a cached entry in the best encoding the client accepts.
+    """
+    accepted = set(_accepted_encodings(request.headers.get("accept-encoding", "")))
+    encoding = next((coding for coding in ("br", "gzip") if coding in accepted and coding in entry.bodies), "identity")
+
+    headers = dict(entry.headers)
+    # Entries of content-negotiated routes carry their own Vary
+    headers.setdefault("Vary", "Accept-Encoding")
+    headers["Cache-Control"] = "no-cache"
+    if encoding == "identity":
+        headers["ETag"] = f'"{entry.etag}"'
+    else:
+        headers["ETag"] = f'"{entry.etag}-{encoding}"'
+        headers["Content-Encoding"] = encoding
+    return Response(content=entry.bodies[encoding], media_type="application/json", headers=headers)
+
+
+dataset_version = DatasetVersion(_redis_client)
+response_cache = ResponseCache(RESPONSE_CACHE_MAX_BYTES, _redis_client)
@@ -1,43 +1,1046 @@
-from fastapi import APIRouter, Depends, HTTPException, status
-from sqlalchemy.orm import Session
+from fastapi import APIRouter, Depends, File, Header, HTTPException, Query, Request, Response, UploadFile, status
+from fastapi.responses import StreamingResponse
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.exc import IntegrityError
-from app import models, schemas, database
-from sqlalchemy import func
-from geoalchemy2.shape import from_shape
-from shapely.geometry import Point
-from typing import List
+from app import models, schemas, database, batch, bulk_import, export, heatmap, stats
+from app.change_feed import ChangeSet, change_feed, current_version, read_changes
+from app.columnar import COLUMNAR_COLUMNS, COLUMNAR_DEFAULT_COLUMNS, COLUMNAR_MEDIA_TYPE, ColumnarWriter, split_joined
+from app.geocoding import geocode_missing, get_geocoder
+from app.spatial import BoundingBox, parse_bbox, bbox_filter, geography, make_point
+from app.snapshot import company_snapshot
+from app.search import SEARCH_CONFIG, escape_like, name_key, prefix_tsquery, search_document
+from app.tile_cache import tile_cache
+from app.response_cache import CachedResponse, cache_key, dataset_version, make_etag, not_modified, response_cache, to_response
+from app.single_flight import SingleFlight
+from sqlalchemy import REAL, case, cast, delete, func, insert, literal, literal_column, or_, select, update
+from sqlalchemy.dialects.postgresql import aggregate_order_by
+from starlette.concurrency import run_in_threadpool
+from collections import Counter
+from typing import Dict, List, Optional, Tuple
+import asyncio
 import logging
+import math
+import numpy as np
+import orjson
+import os
 
-# Configure logging
-logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 router = APIRouter()
 
-@router.get("/companies", response_model=List[schemas.CompanyOut], summary="Get all companies")
-def get_companies(db: Session = Depends(database.get_db)):
+# Upper bound for the ``limit`` query parameter on list endpoints
+MAX_PAGE_SIZE = int(os.getenv("COMPANIES_MAX_PAGE_SIZE", "10000"))
+
+# Rows fetched per round-trip from the server-side cursor when streaming
+STREAM_BATCH_SIZE = int(os.getenv("COMPANIES_STREAM_BATCH_SIZE", "1000"))
+
+NDJSON_MEDIA_TYPE = "application/x-ndjson"
+
+# The list endpoint picks JSON, NDJSON or columnar from the Accept header
+LIST_VARY = "Accept, Accept-Encoding"
+
+# Upper bounds for nearest-neighbour and radius searches
+MAX_NEAREST_K = int(os.getenv("COMPANIES_MAX_NEAREST_K", "1000"))
+MAX_SEARCH_RADIUS_M = float(os.getenv("COMPANIES_MAX_SEARCH_RADIUS_M", "100000"))
+
+# Grid cells per 256px map tile side used for clustering (4 -> 64px cells)
+CLUSTER_CELLS_PER_TILE = int(os.getenv("CLUSTER_CELLS_PER_TILE", "4"))
+
+# Cells with fewer companies than this are returned as individual companies
+CLUSTER_MIN_SIZE = int(os.getenv("CLUSTER_MIN_SIZE", "5"))
+
+# Hard upper bound for search results
+SEARCH_MAX_LIMIT = int(os.getenv("COMPANIES_SEARCH_MAX_LIMIT", "50"))
+
+# Matches ranked per search; bounds the ranking cost of very common words and prefixes
+SEARCH_CANDIDATES = int(os.getenv("COMPANIES_SEARCH_CANDIDATES", "500"))
+
+# Shorter queries are answered as alphabetical name prefixes (trigrams need 3 characters)
+SEARCH_MIN_FUZZY_LENGTH = 3
+
+# Largest heatmap side in pixels, and the largest smoothing radius
+HEATMAP_MAX_SIZE = int(os.getenv("HEATMAP_MAX_SIZE", "1024"))
+HEATMAP_MAX_SMOOTH = 16.0
+
+# Seconds between SSE keep-alive comments on an idle change stream
+CHANGE_STREAM_KEEPALIVE_SECONDS = 15
+
+# Concurrent identical cache misses share one query and serialization
+list_flight = SingleFlight("companies_list")
+company_flight = SingleFlight("company")
+
+def _read_source(request: Request) -> str:
+    """
+    Where a read is served from: ``snapshot``, ``replica`` or ``primary``.
+    Part of the single-flight key, so a client pinned to the primary never
+    joins a replica read.
+    """
+    if company_snapshot.usable(request):
+        return "snapshot"
+    return "replica" if database.read_from_replica(request) else "primary"
+
+def _parse_bbox_param(bbox: Optional[str]) -> Optional[BoundingBox]:
+    """
+    Parse an optional ``bbox`` query parameter, mapping bad input to a 400.
     """
-    Retrieve all companies from the database.
+    if bbox is None:
+        return None
+    try:
+        return parse_bbox(bbox)
+    except ValueError as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=str(e)
+        )
+
+async def _companies_changed(*points: Tuple[float, float]):
+    """
+    Invalidate cached tiles around ``(longitude, latitude)`` points, bump
+    the dataset version and pin reads to the primary after a committed write.
+    """
+    database.note_write()
+    for longitude, latitude in set(points):
+        tile_cache.invalidate_point(longitude, latitude)
+    await dataset_version.bump()
+
+def _filter_companies(query, viewport: Optional[BoundingBox], industry: Optional[str], after_id: Optional[int]):
+    """
+    Apply the list endpoint filters to a query or select over ``companies``.
+    """
+    if viewport is not None:
+        query = query.filter(bbox_filter(models.Company.location, viewport))
+    if industry:
+        query = query.filter(models.Company.industry == industry.strip())
+    if after_id is not None:
+        query = query.filter(models.Company.id > after_id)
+    return query
+
+def _ndjson_statement(viewport: Optional[BoundingBox], industry: Optional[str], after_id: Optional[int], limit: Optional[int]):
+    stmt = _filter_companies(select(*models.COMPANY_OUT_COLUMNS), viewport, industry, after_id)
+    stmt = stmt.order_by(models.Company.id)
+    if limit is not None:
+        stmt = stmt.limit(limit)
+    return stmt.execution_options(yield_per=STREAM_BATCH_SIZE)
+
+def _rows_to_json(rows, keys) -> bytes:
+    """
+    Encode column tuples as a JSON array of objects without Pydantic validation.
     
+    Rows come from ``COMPANY_OUT_COLUMNS`` and were validated on write, so
+    this yields exactly the ``CompanyOut`` shape at a fraction of the cost.
+    """
+    return orjson.dumps([dict(zip(keys, row)) for row in rows])
+
+def _ndjson_chunk(rows) -> bytes:
+    return b"".join(orjson.dumps(row._asdict()) + b"\n" for row in rows)
+
+def _stream_companies_ndjson(viewport: Optional[BoundingBox], industry: Optional[str], after_id: Optional[int], limit: Optional[int], replica: bool = False):
+    """
+    Yield companies as NDJSON, one chunk per batch read from a server-side cursor.
+    
+    The generator owns its session because the response body is produced
+    after the request dependencies have been torn down. Used when
+    ``DB_ASYNC`` is disabled; Starlette iterates it in the threadpool.
+    """
+    db = database.open_session(replica)
+    try:
+        result = db.execute(_ndjson_statement(viewport, industry, after_id, limit))
+        streamed = 0
+        for rows in result.partitions():
+            streamed += len(rows)
+            yield _ndjson_chunk(rows)
+        logger.info("Streamed %s companies", streamed)
+    except Exception as e:
+        logger.error("Error streaming companies: %s", e)
+        raise
+    finally:
+        db.close()
+
+async def _stream_companies_ndjson_async(viewport: Optional[BoundingBox], industry: Optional[str], after_id: Optional[int], limit: Optional[int], replica: bool = False):
+    """
+    Async counterpart of ``_stream_companies_ndjson`` using ``AsyncSession.stream``.
+    """
+    async with database.open_async_session(replica) as db:
+        try:
+            result = await db.stream(_ndjson_statement(viewport, industry, after_id, limit))
+            streamed = 0
+            async for rows in result.partitions():
+                streamed += len(rows)
+                yield _ndjson_chunk(rows)
+            logger.info("Streamed %s companies", streamed)
+        except Exception as e:
+            logger.error("Error streaming companies: %s", e)
+            raise
+
+def _parse_columns_param(columns: Optional[str]) -> Tuple[str, ...]:
+    """
+    Parse the ``columns`` query parameter of columnar list responses, mapping
+    unknown names to a 400.
+    """
+    if columns is None:
+        return COLUMNAR_DEFAULT_COLUMNS
+    names = tuple(dict.fromkeys(name.strip() for name in columns.split(",") if name.strip() and name.strip() != "id"))
+    unknown = [name for name in names if name not in COLUMNAR_COLUMNS]
+    if unknown:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Unknown columns: {', '.join(unknown)}; expected any of: {', '.join(COLUMNAR_COLUMNS)}"
+        )
+    return names
+
+def _columnar_statement(viewport: Optional[BoundingBox], industry: Optional[str], after_id: Optional[int],
+                        limit: Optional[int], columns: Tuple[str, ...], coordinate_type: str):
+    """
+    Aggregate the matching companies into one row of big-endian column
+    buffers (``int4send``/``float4send``/``float8send`` concatenated in ID
+    order), so no Python object is created per company.
+    """
+    company = models.Company
+    matches = _filter_companies(
+        select(company.id, company.latitude, company.longitude, company.industry, company.name),
+        viewport, industry, after_id
+    )
+    if limit is not None:
+        matches = matches.order_by(company.id).limit(limit)
+    matches = matches.cte("matches")
+    
+    def packed(value):
+        return func.string_agg(value, aggregate_order_by(literal_column("''::bytea"), matches.c.id))
+    
+    def coordinate(value):
+        return func.float4send(cast(value, REAL)) if coordinate_type == "float32" else func.float8send(value)
+    
+    selected = [func.count().label("rows"), packed(func.int4send(matches.c.id)).label("ids")]
+    for column in columns:
+        if column == "industry":
+            values = select(matches.c.industry).distinct().order_by(matches.c.industry).subquery()
+            dictionary = select(func.array_agg(values.c.industry)).scalar_subquery()
+            selected.append(dictionary.label("industries"))
+            selected.append(packed(func.int4send(func.array_position(dictionary, matches.c.industry) - 1)).label("industry"))
+        elif column == "name":
+            # PostgreSQL text cannot contain NUL, so it is a safe separator
+            selected.append(func.string_agg(
+                func.convert_to(matches.c.name, literal_column("'UTF8'")),
+                aggregate_order_by(literal_column("'\\x00'::bytea"), matches.c.id)
+            ).label("name"))
+        else:
+            selected.append(packed(coordinate(matches.c[column])).label(column))
+    return select(*selected)
+
+async def _columnar_from_db(db: AsyncSession, viewport: Optional[BoundingBox], industry: Optional[str],
+                            after_id: Optional[int], limit: Optional[int], columns: Tuple[str, ...],
+                            coordinate_type: str) -> Tuple[bytes, int, Optional[int]]:
+    """
+    Build a columnar list payload from the database.
+    
+    Returns:
+        Tuple of the payload, the number of companies and the last ID
+    """
+    row = (await db.execute(_columnar_statement(viewport, industry, after_id, limit, columns, coordinate_type))).one()._mapping
+    rows = row["rows"]
+    ids = np.frombuffer(row["ids"] or b"", dtype=">i4")
+    writer = ColumnarWriter(rows)
+    writer.add_array("id", ids, "int32")
+    for column in columns:
+        if column == "industry":
+            writer.add_dictionary(column, np.frombuffer(row["industry"] or b"", dtype=">i4"), row["industries"] or [])
+        elif column == "name":
+            writer.add_strings(column, *split_joined(bytes(row["name"] or b""), rows))
+        else:
+            dtype = ">f4" if coordinate_type == "float32" else ">f8"
+            writer.add_array(column, np.frombuffer(row[column] or b"", dtype=dtype), coordinate_type)
+    return writer.tobytes(), rows, int(ids[-1]) if rows else None
+
+@router.get(
+    "/companies",
+    response_model=List[schemas.CompanyOut],
+    responses={200: {"content": {NDJSON_MEDIA_TYPE: {}, COLUMNAR_MEDIA_TYPE: {}}}},
+    summary="Get all companies"
+)
+async def get_companies(
+    request: Request,
+    bbox: Optional[str] = Query(None, description="Viewport as minLon,minLat,maxLon,maxLat"),
+    industry: Optional[str] = Query(None, description="Only return companies in this industry"),
+    after_id: Optional[int] = Query(None, ge=0, description="Keyset cursor: only return companies with a greater ID"),
+    limit: Optional[int] = Query(None, ge=1, le=MAX_PAGE_SIZE, description="Maximum number of companies to return"),
+    columns: Optional[str] = Query(None, description="Columnar responses only: comma-separated columns besides id (latitude, longitude, industry, name); default all but name"),
+    precision: int = Query(32, description="Columnar responses only: coordinate precision in bits, 32 or 64")
+):
+    """
+    Retrieve companies from the database.
+    
+    Without filters every company is returned. With ``bbox`` only companies
+    inside the viewport are returned, using the GiST index on ``location``.
+    
+    Pages are ordered by ID: pass the ``X-Next-After-Id`` response header back
+    as ``after_id`` to fetch the next page. Sending ``Accept: application/x-ndjson``
+    streams the result as newline-delimited JSON instead of a single array.
+    ``Accept: application/vnd.geo-company.columnar`` returns typed column
+    buffers (see ``app.columnar``) ordered by ID: int32 IDs, float32 or
+    float64 coordinates and dictionary-encoded industries. Names are left
+    out unless requested with ``columns``, so clients can fetch them lazily.
+    
+    Array responses carry a strong ``ETag`` derived from the dataset version
+    and are served pre-compressed from the response cache until the next write.
+    With ``SNAPSHOT_ENABLED`` they are built from the in-memory snapshot.
+    Identical requests arriving while a response is being built wait for it
+    instead of querying again (see ``app.single_flight``).
+    
+    Args:
+        bbox (str, optional): Viewport as minLon,minLat,maxLon,maxLat
+        industry (str, optional): Industry to filter by
+        after_id (int, optional): Return companies with an ID greater than this
+        limit (int, optional): Maximum number of companies to return
+        columns (str, optional): Columns of a columnar response besides the ID
+        precision (int): Bits per coordinate in a columnar response
+        
     Returns:
-        List[CompanyOut]: List of all companies with their details
+        List[CompanyOut]: List of matching companies with their details
     """
+    viewport = _parse_bbox_param(bbox)
+    accept = request.headers.get("accept", "")
+    
+    if NDJSON_MEDIA_TYPE in accept:
+        stream = _stream_companies_ndjson_async if database.DB_ASYNC else _stream_companies_ndjson
+        return StreamingResponse(
+            stream(viewport, industry, after_id, limit, database.read_from_replica(request)),
+            media_type=NDJSON_MEDIA_TYPE,
+            headers={"Vary": LIST_VARY}
+        )
+    
+    columnar = COLUMNAR_MEDIA_TYPE in accept
+    if columnar:
+        selected_columns = _parse_columns_param(columns)
+        if precision not in (32, 64):
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="precision must be 32 or 64"
+            )
+        coordinate_type = f"float{precision}"
+    
+    version = await dataset_version.current()
+    key = cache_key(request, version) + (":columnar" if columnar else "")
+    etag = make_etag(key)
+    unchanged = not_modified(request, etag, LIST_VARY)
+    if unchanged is not None:
+        return unchanged
+    cached = await response_cache.get(key)
+    if cached is not None:
+        return to_response(request, cached)
+    
+    source = _read_source(request)
+    
+    async def build() -> Tuple[CachedResponse, int]:
+        if source == "snapshot" and columnar:
+            body, count, last_id = company_snapshot.list_columnar(
+                viewport, industry, after_id, limit, selected_columns, coordinate_type
+            )
+        elif source == "snapshot":
+            body, count, last_id = company_snapshot.list_json(viewport, industry, after_id, limit)
+        else:
+            # Its own session: the build may outlive the request that started it
+            db = database.open_async_session(replica=source == "replica")
+            try:
+                if columnar:
+                    body, count, last_id = await _columnar_from_db(
+                        db, viewport, industry, after_id, limit, selected_columns, coordinate_type
+                    )
+                else:
+                    stmt = _filter_companies(select(*models.COMPANY_OUT_COLUMNS), viewport, industry, after_id)
+                    if limit is not None or after_id is not None:
+                        stmt = stmt.order_by(models.Company.id)
+                    if limit is not None:
+                        stmt = stmt.limit(limit)
+                    
+                    result = await db.execute(stmt)
+                    keys = list(result.keys())
+                    companies = result.all()
+                    body, count = _rows_to_json(companies, keys), len(companies)
+                    last_id = companies[-1].id if companies else None
+            finally:
+                await db.close()
+        
+        headers = {"Vary": LIST_VARY}
+        if columnar:
+            headers["Content-Type"] = COLUMNAR_MEDIA_TYPE
+        if limit is not None and count == limit:
+            headers["X-Next-After-Id"] = str(last_id)
+            next_url = request.url.include_query_params(after_id=last_id)
+            headers["Link"] = f'<{next_url}>; rel="next"'
+        
+        entry = CachedResponse.from_body(etag, body, headers)
+        await response_cache.put(key, entry)
+        return entry, count
+    
     try:
-        companies = db.query(models.Company).all()
-        logger.info(f"Retrieved {len(companies)} companies")
-        return companies
+        entry, count = await list_flight.do(f"{key}:{source}", build)
+        logger.info("Retrieved %s companies", count)
+        return to_response(request, entry)
+    except asyncio.TimeoutError:
+        logger.error("Timed out retrieving companies")
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Timed out retrieving companies"
+        )
     except Exception as e:
-        logger.error(f"Error retrieving companies: {str(e)}")
+        logger.error("Error retrieving companies: %s", e)
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail="Failed to retrieve companies"
         )
 
+@router.get("/companies/clusters", response_model=schemas.ClusterResponse, summary="Get clustered companies for a map view")
+async def get_company_clusters(
+    bbox: str = Query(..., description="Viewport as minLon,minLat,maxLon,maxLat"),
+    zoom: int = Query(..., ge=0, le=22, description="Map zoom level"),
+    industry: Optional[str] = Query(None, description="Only cluster companies in this industry"),
+    min_cluster_size: int = Query(CLUSTER_MIN_SIZE, ge=2, le=100, description="Smallest cell returned as a cluster"),
+    db: AsyncSession = Depends(database.get_async_read_db)
+):
+    """
+    Group the companies inside a viewport into grid cells for a zoom level.
+    
+    Points are snapped to a grid with ``ST_SnapToGrid`` whose cell size halves
+    with every zoom level, and grouped in the database. Cells holding fewer
+    than ``min_cluster_size`` companies are returned as individual companies,
+    so the payload is bounded by the number of visible cells.
+    
+    Args:
+        bbox (str): Viewport as minLon,minLat,maxLon,maxLat
+        zoom (int): Map zoom level
+        industry (str, optional): Industry to filter by
+        min_cluster_size (int): Smallest cell returned as a cluster
+        
+    Returns:
+        ClusterResponse: Clusters and unclustered companies in the viewport
+    """
+    viewport = _parse_bbox_param(bbox)
+    cell_size = 360.0 / (2 ** zoom * CLUSTER_CELLS_PER_TILE)
+    
+    try:
+        snapped = func.ST_SnapToGrid(models.Company.location, cell_size)
+        points = _filter_companies(
+            select(
+                func.ST_X(snapped).label("cell_x"),
+                func.ST_Y(snapped).label("cell_y"),
+                models.Company.id,
+                models.Company.industry,
+                models.Company.latitude,
+                models.Company.longitude,
+            ),
+            viewport, industry, None
+        ).subquery()
+        
+        count = func.count()
+        stmt = select(
+            points.c.cell_x,
+            points.c.cell_y,
+            points.c.industry,
+            count.label("count"),
+            func.sum(points.c.latitude).label("lat_sum"),
+            func.sum(points.c.longitude).label("lng_sum"),
+            # IDs are only needed for groups that may end up unclustered
+            case((count < min_cluster_size, func.array_agg(points.c.id)), else_=None).label("ids"),
+        ).group_by(points.c.cell_x, points.c.cell_y, points.c.industry)
+        
+        cells: Dict[Tuple[float, float], dict] = {}
+        for row in await db.execute(stmt):
+            cell = cells.setdefault(
+                (row.cell_x, row.cell_y),
+                {"count": 0, "lat_sum": 0.0, "lng_sum": 0.0, "industries": Counter(), "ids": []}
+            )
+            cell["count"] += row.count
+            cell["lat_sum"] += row.lat_sum
+            cell["lng_sum"] += row.lng_sum
+            cell["industries"][row.industry] += row.count
+            if row.ids:
+                cell["ids"].extend(row.ids)
+        
+        clusters = []
+        single_ids = []
+        for cell in cells.values():
+            if cell["count"] < min_cluster_size:
+                single_ids.extend(cell["ids"])
+                continue
+            clusters.append(schemas.ClusterOut(
+                latitude=cell["lat_sum"] / cell["count"],
+                longitude=cell["lng_sum"] / cell["count"],
+                count=cell["count"],
+                industries=dict(cell["industries"])
+            ))
+        
+        companies = []
+        if single_ids:
+            companies = (await db.execute(
+                select(models.Company)
+                .filter(models.Company.id.in_(single_ids))
+                .order_by(models.Company.id)
+            )).scalars().all()
+        
+        logger.info("Computed %s clusters and %s single companies at zoom %s", len(clusters), len(companies), zoom)
+        return schemas.ClusterResponse(
+            zoom=zoom,
+            cell_size=cell_size,
+            clusters=clusters,
+            companies=[schemas.CompanyOut.from_orm(company) for company in companies]
+        )
+    except Exception as e:
+        logger.error("Error clustering companies: %s", e)
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="Failed to cluster companies"
+        )
+
+@router.get(
+    "/companies/heatmap",
+    response_class=Response,
+    responses={200: {"content": {media_type: {} for media_type in heatmap.HEATMAP_MEDIA_TYPES.values()}}},
+    summary="Get a company density heatmap for a map view"
+)
+async def get_company_heatmap(
+    request: Request,
+    bbox: str = Query(..., description="Viewport as minLon,minLat,maxLon,maxLat"),
+    width: int = Query(256, ge=1, le=HEATMAP_MAX_SIZE, description="Raster width in pixels"),
+    height: int = Query(256, ge=1, le=HEATMAP_MAX_SIZE, description="Raster height in pixels"),
+    industry: Optional[str] = Query(None, description="Only count companies in this industry"),
+    smooth: float = Query(1.5, ge=0, le=HEATMAP_MAX_SMOOTH, description="Gaussian smoothing radius in pixels; 0 disables it"),
+    format: str = Query("png", description="png (coloured RGBA overlay) or raw (little-endian float32 densities)"),
+    db: AsyncSession = Depends(database.get_async_read_db)
+):
+    """
+    Render the density of companies in a viewport as a raster.
+    
+    The viewport is widened to a pixel-sized grid so nearby views share
+    cached rasters; ``X-Heatmap-Bbox`` gives the bounds actually covered.
+    Rows run north to south, evenly spaced in Web Mercator. Companies are
+    binned with NumPy from the in-memory snapshot when it is serving,
+    otherwise counted per pixel in the database; smoothing and encoding run
+    in a process pool. Rasters are cached per dataset version.
+    
+    Args:
+        bbox (str): Viewport as minLon,minLat,maxLon,maxLat
+        width (int): Raster width in pixels
+        height (int): Raster height in pixels
+        industry (str, optional): Industry to filter by
+        smooth (float): Gaussian standard deviation in pixels
+        format (str): ``png`` or ``raw``
+        
+    Returns:
+        Response: PNG image or ``width * height`` float32 values, with the
+        bounds, peak density and company count in ``X-Heatmap-*`` headers
+        
+    Raises:
+        HTTPException: If the bbox or format is invalid, or the bbox lies
+            entirely beyond the latitudes Web Mercator covers
+    """
+    viewport = _parse_bbox_param(bbox)
+    if viewport.min_lon >= viewport.max_lon or viewport.min_lat >= viewport.max_lat:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="bbox must have a non-zero width and height"
+        )
+    if format not in heatmap.HEATMAP_FORMATS:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Unsupported heatmap format, expected one of: {', '.join(heatmap.HEATMAP_FORMATS)}"
+        )
+    
+    bounds = BoundingBox(*heatmap.quantize(*viewport, width, height))
+    try:
+        extent = heatmap.extent(*bounds)
+    except ValueError as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=str(e)
+        )
+    version = await dataset_version.current()
+    key = f"{version}:heatmap:{','.join(map(repr, bounds))}:{width}x{height}:{(industry or '').strip()}:{smooth}:{format}"
+    etag = make_etag(key)
+    unchanged = not_modified(request, etag)
+    if unchanged is not None:
+        return unchanged
+    cached = await response_cache.get(key)
+    if cached is not None:
+        return to_response(request, cached)
+    
+    try:
+        if company_snapshot.usable(request):
+            lon, lat = company_snapshot.points(bounds, industry)
+            total = len(lon)
+            payload, peak = await heatmap.run(heatmap.render_points, lon, lat, extent, width, height, smooth, format)
+        else:
+            # Count per pixel in the database so only occupied pixels are transferred
+            def pixel(value, low: float, high: float, pixels: int):
+                index = func.floor((value - low) * (pixels / (high - low)))
+                return func.greatest(func.least(index, pixels - 1), 0)
+            
+            latitude = func.greatest(func.least(models.Company.latitude, heatmap.MAX_MERCATOR_LATITUDE), -heatmap.MAX_MERCATOR_LATITUDE)
+            mercator_y = func.ln(func.tan(math.pi / 4 + func.radians(latitude) / 2))
+            ix = pixel(models.Company.longitude, extent.west, extent.east, width).label("ix")
+            iy = pixel(mercator_y, extent.south_y, extent.north_y, height).label("iy")
+            # Grouped outside the subquery: repeating the expressions would bind fresh parameters
+            pixels = _filter_companies(select(ix, iy), bounds, industry, None).subquery()
+            stmt = select(pixels.c.ix, pixels.c.iy, func.count().label("count")).group_by(pixels.c.ix, pixels.c.iy)
+            rows = (await db.execute(stmt)).all()
+            total = sum(row.count for row in rows)
+            payload, peak = await heatmap.run(
+                heatmap.render_bins,
+                [int(row.ix) for row in rows], [int(row.iy) for row in rows], [row.count for row in rows],
+                width, height, smooth, format
+            )
+        
+        headers = {
+            "Content-Type": heatmap.HEATMAP_MEDIA_TYPES[format],
+            "X-Heatmap-Bbox": ",".join(f"{value:.10g}" for value in bounds),
+            "X-Heatmap-Size": f"{width}x{height}",
+            "X-Heatmap-Max": f"{peak:.6g}",
+            "X-Heatmap-Count": str(total),
+        }
+        # PNG is already deflated
+        entry = CachedResponse.from_body(etag, payload, headers, compress=format == "raw")
+        await response_cache.put(key, entry)
+        
+        logger.info("Rendered %sx%s %s heatmap of %s companies", width, height, format, total)
+        return to_response(request, entry)
+    except Exception as e:
+        logger.error("Error rendering heatmap: %s", e)
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="Failed to render heatmap"
+        )
+
+@router.get("/companies/nearest", response_model=List[schemas.CompanyDistanceOut], summary="Get the companies nearest to a point")
+async def get_nearest_companies(
+    request: Request,
+    lat: float = Query(..., ge=-90, le=90, description="Latitude of the query point"),
+    lng: float = Query(..., ge=-180, le=180, description="Longitude of the query point"),
+    k: int = Query(20, ge=1, le=MAX_NEAREST_K, description="Number of companies to return"),
+    industry: Optional[str] = Query(None, description="Only return companies in this industry"),
+    db: AsyncSession = Depends(database.get_async_read_db)
+):
+    """
+    Retrieve the ``k`` companies closest to a point, nearest first.
+    
+    Ordering uses the index-assisted KNN ``<->`` operator on the geography
+    index, so only the closest candidates are read. With ``SNAPSHOT_ENABLED``
+    the in-memory snapshot answers instead.
+    
+    Args:
+        lat (float): Latitude of the query point
+        lng (float): Longitude of the query point
+        k (int): Number of companies to return
+        industry (str, optional): Industry to filter by
+        
+    Returns:
+        List[CompanyDistanceOut]: Companies with their distance in meters
+    """
+    try:
+        if company_snapshot.usable(request):
+            return company_snapshot.nearest(lng, lat, k, industry)
+        
+        target = geography(make_point(lng, lat))
+        location = geography(models.Company.location)
+        stmt = _filter_companies(
+            select(*models.COMPANY_OUT_COLUMNS, func.ST_Distance(location, target).label("distance_m")),
+            None, industry, None
+        ).order_by(location.op("<->")(target)).limit(k)
+        
+        companies = [row._asdict() for row in await db.execute(stmt)]
+        logger.info("Retrieved %s companies nearest to (%s, %s)", len(companies), lat, lng)
+        return companies
+    except Exception as e:
+        logger.error("Error retrieving nearest companies: %s", e)
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="Failed to retrieve nearest companies"
+        )
+
+@router.get("/companies/within", response_model=List[schemas.CompanyDistanceOut], summary="Get companies within a radius")
+async def get_companies_within(
+    request: Request,
+    lat: float = Query(..., ge=-90, le=90, description="Latitude of the query point"),
+    lng: float = Query(..., ge=-180, le=180, description="Longitude of the query point"),
+    radius_m: float = Query(..., gt=0, le=MAX_SEARCH_RADIUS_M, description="Search radius in meters"),
+    industry: Optional[str] = Query(None, description="Only return companies in this industry"),
+    limit: int = Query(MAX_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE, description="Maximum number of companies to return"),
+    db: AsyncSession = Depends(database.get_async_read_db)
+):
+    """
+    Retrieve the companies within ``radius_m`` meters of a point, nearest first.
+    
+    Uses ``ST_DWithin`` on the geography cast, which is served by the
+    geography GiST index. With ``SNAPSHOT_ENABLED`` the in-memory snapshot
+    answers instead.
+    
+    Args:
+        lat (float): Latitude of the query point
+        lng (float): Longitude of the query point
+        radius_m (float): Search radius in meters
+        industry (str, optional): Industry to filter by
+        limit (int): Maximum number of companies to return
+        
+    Returns:
+        List[CompanyDistanceOut]: Companies with their distance in meters
+    """
+    try:
+        if company_snapshot.usable(request):
+            return company_snapshot.within(lng, lat, radius_m, industry, limit)
+        
+        target = geography(make_point(lng, lat))
+        location = geography(models.Company.location)
+        distance = func.ST_Distance(location, target).label("distance_m")
+        stmt = _filter_companies(
+            select(*models.COMPANY_OUT_COLUMNS, distance),
+            None, industry, None
+        ).filter(func.ST_DWithin(location, target, radius_m)).order_by(distance).limit(limit)
+        
+        companies = [row._asdict() for row in await db.execute(stmt)]
+        logger.info("Retrieved %s companies within %sm of (%s, %s)", len(companies), radius_m, lat, lng)
+        return companies
+    except Exception as e:
+        logger.error("Error retrieving companies within radius: %s", e)
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="Failed to retrieve companies within radius"
+        )
+
+@router.get("/companies/search", response_model=List[schemas.CompanySearchOut], summary="Search companies by name, industry and address")
+async def search_companies(
+    q: str = Query(..., min_length=1, max_length=100, description="Search text; the last word matches as a prefix"),
+    bbox: Optional[str] = Query(None, description="Only search inside this viewport: minLon,minLat,maxLon,maxLat"),
+    limit: int = Query(10, ge=1, le=SEARCH_MAX_LIMIT, description="Maximum number of results"),
+    db: AsyncSession = Depends(database.get_async_read_db)
+):
+    """
+    Search companies for a search box or typeahead, best match first.
+    
+    Words are matched against name, industry and address through the
+    full-text GIN index, the last word as a prefix, and the name is also
+    matched by trigram similarity so typos still find it. At most
+    ``SEARCH_CANDIDATES`` matches are ranked; names starting with the query
+    rank first. Queries shorter than three characters return names with that
+    prefix in alphabetical order from a B-tree index.
+    
+    Args:
+        q (str): Search text
+        bbox (str, optional): Viewport as minLon,minLat,maxLon,maxLat
+        limit (int): Maximum number of results
+        
+    Returns:
+        List[CompanySearchOut]: Matching companies with their relevance score
+    """
+    viewport = _parse_bbox_param(bbox)
+    needle = q.strip().lower()
+    if not needle:
+        return []
+    
+    try:
+        key = name_key(models.Company.name)
+        name_prefix = key.like(escape_like(needle) + "%", escape="\\")
+        
+        if len(needle) < SEARCH_MIN_FUZZY_LENGTH:
+            stmt = _filter_companies(
+                select(*models.COMPANY_OUT_COLUMNS, literal(1.0).label("score")),
+                viewport, None, None
+            ).filter(name_prefix).order_by(key, models.Company.id).limit(limit)
+        else:
+            document = search_document(models.Company.name, models.Company.industry, models.Company.address)
+            matches = [key.op("%")(needle)]
+            score = func.similarity(key, needle) + case((name_prefix, 1.0), else_=0.0)
+            tsquery_text = prefix_tsquery(needle)
+            if tsquery_text is not None:
+                tsquery = func.to_tsquery(SEARCH_CONFIG, tsquery_text)
+                matches.append(document.op("@@")(tsquery))
+                score = score + func.ts_rank_cd(document, tsquery)
+            
+            candidates = _filter_companies(
+                select(models.Company.id).filter(or_(*matches)),
+                viewport, None, None
+            ).limit(SEARCH_CANDIDATES).subquery()
+            score = score.label("score")
+            stmt = (
+                select(*models.COMPANY_OUT_COLUMNS, score)
+                .join(candidates, candidates.c.id == models.Company.id)
+                .order_by(score.desc(), models.Company.id)
+                .limit(limit)
+            )
+        
+        companies = [row._asdict() for row in await db.execute(stmt)]
+        logger.info("Search for %r returned %s companies", q, len(companies))
+        return companies
+    except Exception as e:
+        logger.error("Error searching companies: %s", e)
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="Failed to search companies"
+        )
+
+@router.get("/companies/stats", response_model=schemas.CompanyStats, summary="Get company counts per industry and region")
+async def get_company_stats(
+    request: Request,
+    bbox: Optional[str] = Query(None, description="Only count cells overlapping this viewport: minLon,minLat,maxLon,maxLat"),
+    industry: Optional[str] = Query(None, description="Only count companies in this industry"),
+    cells: bool = Query(False, description="Include per-cell counts"),
+    db: AsyncSession = Depends(database.get_async_read_db)
+):
+    """
+    Retrieve company counts per industry, globally or for a region.
+    
+    Counts come from ``company_stats``, which triggers keep up to date per
+    industry and ``STATS_CELL_DEGREES`` grid cell, so the cost depends on the
+    number of occupied cells and industries rather than on the number of
+    companies. With ``bbox``, every cell overlapping the viewport is counted
+    in full, so edge counts are approximate at cell granularity.
+    
+    Args:
+        bbox (str, optional): Viewport as minLon,minLat,maxLon,maxLat
+        industry (str, optional): Industry to count
+        cells (bool): Include per-cell counts
+        
+    Returns:
+        CompanyStats: Total and per-industry counts, optionally per cell
+    """
+    viewport = _parse_bbox_param(bbox)
+    
+    version = await dataset_version.current()
+    key = cache_key(request, version)
+    etag = make_etag(key)
+    unchanged = not_modified(request, etag)
+    if unchanged is not None:
+        return unchanged
+    cached = await response_cache.get(key)
+    if cached is not None:
+        return to_response(request, cached)
+    
+    try:
+        table = models.CompanyStat
+        if cells:
+            stmt = select(table.industry, table.cell_x, table.cell_y, table.count)
+        else:
+            stmt = select(table.industry, func.sum(table.count).label("count")).group_by(table.industry)
+        if viewport is not None:
+            size = stats.STATS_CELL_DEGREES
+            stmt = stmt.filter(
+                table.cell_x.between(math.floor(viewport.min_lon / size), math.floor(viewport.max_lon / size)),
+                table.cell_y.between(math.floor(viewport.min_lat / size), math.floor(viewport.max_lat / size))
+            )
+        if industry:
+            stmt = stmt.filter(table.industry == industry.strip())
+        
+        industries: Counter = Counter()
+        by_cell: Dict[Tuple[int, int], dict] = {}
+        for row in await db.execute(stmt):
+            # sum() over bigint is numeric in PostgreSQL and arrives as Decimal
+            count = int(row.count)
+            industries[row.industry] += count
+            if cells:
+                cell = by_cell.setdefault((row.cell_x, row.cell_y), {"count": 0, "industries": {}})
+                cell["count"] += count
+                cell["industries"][row.industry] = count
+        
+        content = {
+            "total": sum(industries.values()),
+            "industries": dict(industries.most_common()),
+            "cell_size": stats.STATS_CELL_DEGREES,
+            "cells": [
+                {
+                    "longitude": cell_x * stats.STATS_CELL_DEGREES,
+                    "latitude": cell_y * stats.STATS_CELL_DEGREES,
+                    **cell
+                }
+                for (cell_x, cell_y), cell in sorted(by_cell.items())
+            ] if cells else None,
+        }
+        entry = CachedResponse.build(etag, content)
+        await response_cache.put(key, entry)
+        
+        logger.info("Retrieved stats for %s industries", len(industries))
+        return to_response(request, entry)
+    except Exception as e:
+        logger.error("Error retrieving company stats: %s", e)
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="Failed to retrieve company stats"
+        )
+
+@router.get("/companies/changes", response_model=schemas.CompanyChanges, summary="Get companies changed since a feed version")
+async def get_company_changes(
+    since: Optional[int] = Query(None, ge=0, description="Feed version from a previous response; omit to get the current version"),
+    db: AsyncSession = Depends(database.get_async_db)
+):
+    """
+    Retrieve the companies created, updated or deleted since a feed version.
+    
+    Call without ``since`` before loading the full list to get a starting
+    version, then pass the returned ``version`` back to receive only what
+    changed. Upserts carry the current company; replaying a window is safe.
+    When ``reset`` is true (too many changes or expired history) the client
+    must reload the full list. Always read from the primary: versions are
+    its transaction IDs, which replicas do not share.
+    
+    Args:
+        since (int, optional): Feed version from a previous response
+        
+    Returns:
+        CompanyChanges: New feed version and the changed companies
+    """
+    try:
+        if since is None:
+            return {"version": await current_version(db), "reset": False, "changes": []}
+        change_set = await read_changes(db, since)
+        logger.info("Retrieved %s company changes since version %s", len(change_set.changes), since)
+        return {"version": change_set.version, "reset": change_set.reset, "changes": change_set.changes}
+    except Exception as e:
+        logger.error("Error retrieving company changes: %s", e)
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="Failed to retrieve company changes"
+        )
+
+def _sse_event(change_set: ChangeSet) -> bytes:
+    data = orjson.dumps({"version": change_set.version, "reset": change_set.reset, "changes": change_set.changes})
+    return b"id: %d\nevent: changes\ndata: %s\n\n" % (change_set.version, data)
+
+async def _stream_company_changes(since: Optional[int]):
+    """
+    Yield SSE events: a catch-up from ``since``, then every change set the
+    process-wide feed publishes past the client's version.
+    """
+    # Subscribe before the catch-up read so nothing published in between is lost
+    queue = change_feed.subscribe()
+    try:
+        db = database.open_async_session()
+        try:
+            if since is None:
+                version = await current_version(db)
+                yield b"id: %d\nevent: ready\ndata: {\"version\":%d}\n\n" % (version, version)
+            else:
+                change_set = await read_changes(db, since)
+                version = change_set.version
+                yield _sse_event(change_set)
+        finally:
+            await db.close()
+        
+        while True:
+            try:
+                change_set = await asyncio.wait_for(queue.get(), CHANGE_STREAM_KEEPALIVE_SECONDS)
+            except asyncio.TimeoutError:
+                yield b": keep-alive\n\n"
+                continue
+            if change_set.version <= version and not change_set.reset:
+                continue
+            version = max(version, change_set.version)
+            yield _sse_event(change_set)
+    finally:
+        change_feed.unsubscribe(queue)
+
+@router.get("/companies/changes/stream", summary="Stream company changes as Server-Sent Events")
+async def stream_company_changes(
+    since: Optional[int] = Query(None, ge=0, description="Feed version to start from"),
+    last_event_id: Optional[int] = Header(None, ge=0, description="Set by EventSource when reconnecting")
+):
+    """
+    Stream company changes as Server-Sent Events.
+    
+    Each ``changes`` event has the same payload as ``GET /companies/changes``
+    and its feed version as the event ID, so a reconnecting ``EventSource``
+    resumes where it stopped. Without ``since`` the stream starts with a
+    ``ready`` event carrying the current version. Events are pushed as soon
+    as PostgreSQL notifies the listener of a committed write.
+    
+    Args:
+        since (int, optional): Feed version to start from
+        
+    Returns:
+        StreamingResponse: ``text/event-stream`` of change sets
+    """
+    if not change_feed.running:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Change feed is not running"
+        )
+    
+    return StreamingResponse(
+        _stream_company_changes(last_event_id if last_event_id is not None else since),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+@router.get("/companies/snapshot", response_model=schemas.SnapshotStatus, summary="Get in-memory snapshot status")
+async def get_snapshot_status():
+    """
+    Report the size, memory use and staleness of this worker's in-memory
+    company snapshot.
+    
+    Returns:
+        SnapshotStatus: Snapshot state; ``serving`` tells whether reads use it
+    """
+    return company_snapshot.status()
+
+@router.get(
+    "/companies/export",
+    response_class=StreamingResponse,
+    responses={200: {"content": {export_format.media_type: {} for export_format in export.EXPORT_FORMATS.values()}}},
+    summary="Export companies as GeoJSON, FlatGeobuf or GeoParquet"
+)
+async def export_companies(
+    request: Request,
+    format: str = Query("geojson", description="geojson, flatgeobuf or geoparquet"),
+    bbox: Optional[str] = Query(None, description="Only export companies inside this box: minLon,minLat,maxLon,maxLat"),
+    industry: Optional[str] = Query(None, description="Only export companies in this industry")
+):
+    """
+    Stream companies as a downloadable file for GIS and analytics tools.
+    
+    Rows are read from a server-side cursor in ``EXPORT_BATCH_SIZE`` batches
+    and encoded as they arrive, so memory stays flat however large the
+    table. GeoParquet is written as Arrow record batches with WKB
+    geometries. FlatGeobuf includes a packed Hilbert R-tree index; because
+    the index precedes the features, those are spooled to a temporary file
+    and the download starts once every row has been read.
+    
+    Args:
+        format (str): ``geojson``, ``flatgeobuf`` or ``geoparquet``
+        bbox (str, optional): Bounding box as minLon,minLat,maxLon,maxLat
+        industry (str, optional): Industry to filter by
+        
+    Returns:
+        StreamingResponse: The export file as an attachment
+        
+    Raises:
+        HTTPException: If the format is unknown or its dependencies are missing
+    """
+    viewport = _parse_bbox_param(bbox)
+    export_format = export.EXPORT_FORMATS.get(format)
+    if export_format is None:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Unsupported export format, expected one of: {', '.join(export.EXPORT_FORMATS)}"
+        )
+    if not export.available(format):
+        raise HTTPException(
+            status_code=status.HTTP_501_NOT_IMPLEMENTED,
+            detail=f"{format} export requires pyarrow, which is not installed"
+        )
+    
+    stmt = _filter_companies(select(*export.EXPORT_COLUMNS), viewport, industry, None)
+    stmt = stmt.execution_options(yield_per=export.EXPORT_BATCH_SIZE)
+    stream = export.stream_export_async if database.DB_ASYNC else export.stream_export
+    return StreamingResponse(
+        stream(stmt, format, database.read_from_replica(request)),
+        media_type=export_format.media_type,
+        headers={"Content-Disposition": f'attachment; filename="companies.{export_format.extension}"'}
+    )
+
 @router.get("/companies/{company_id}", response_model=schemas.CompanyOut, summary="Get company by ID")
-def get_company(company_id: int, db: Session = Depends(database.get_db)):
+async def get_company(company_id: int, request: Request):
     """
     Retrieve a specific company by its ID.
     
+    Responses carry a strong ``ETag``; a matching ``If-None-Match`` gets a
+    304 without touching the database. Concurrent requests for the same
+    company share one query.
+    
     Args:
         company_id (int): The unique identifier of the company
         
@@ -53,29 +1056,62 @@ def get_company(company_id: int, db: Session = Depends(database.get_db)):
             detail="Company ID must be a positive integer"
         )
     
-    try:
-        company = db.query(models.Company).filter(models.Company.id == company_id).first()
+    version = await dataset_version.current()
+    key = cache_key(request, version)
+    etag = make_etag(key)
+    unchanged = not_modified(request, etag)
+    if unchanged is not None:
+        return unchanged
+    cached = await response_cache.get(key)
+    if cached is not None:
+        return to_response(request, cached)
+    
+    replica = database.read_from_replica(request)
+    
+    async def build() -> CachedResponse:
+        # Its own session: the query may outlive the request that started it
+        db = database.open_async_session(replica=replica)
+        try:
+            company = (await db.execute(
+                select(*models.COMPANY_OUT_COLUMNS).filter(models.Company.id == company_id)
+            )).first()
+        finally:
+            await db.close()
         if not company:
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND,
                 detail=f"Company with ID {company_id} not found"
             )
-        logger.info(f"Retrieved company with ID: {company_id}")
-        return company
+        entry = CachedResponse.build(etag, company._asdict())
+        await response_cache.put(key, entry)
+        return entry
+    
+    try:
+        entry = await company_flight.do(f"{key}:{'replica' if replica else 'primary'}", build)
+        logger.info("Retrieved company with ID: %s", company_id)
+        return to_response(request, entry)
     except HTTPException:
         raise
+    except asyncio.TimeoutError:
+        logger.error("Timed out retrieving company %s", company_id)
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Timed out retrieving company"
+        )
     except Exception as e:
-        logger.error(f"Error retrieving company {company_id}: {str(e)}")
+        logger.error("Error retrieving company %s: %s", company_id, e)
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail="Failed to retrieve company"
         )
 
 @router.post("/companies", response_model=schemas.CompanyOut, status_code=status.HTTP_201_CREATED, summary="Create a new company")
-def create_company(company: schemas.CompanyCreate, db: Session = Depends(database.get_db)):
+async def create_company(company: schemas.CompanyCreate, db: AsyncSession = Depends(database.get_async_db)):
     """
     Create a new company in the database.
     
+    If latitude and longitude are omitted they are geocoded from the address.
+    
     Args:
         company (CompanyCreate): Company data to create
         
@@ -83,9 +1119,17 @@ def create_company(company: schemas.CompanyCreate, db: Session = Depends(databas
         CompanyOut: Created company details
         
     Raises:
-        HTTPException: If creation fails or validation errors occur
+        HTTPException: If creation fails, the address cannot be geocoded or validation errors occur
     """
     try:
+        # Geocoder lookups are CPU-bound (and load the index on first use); keep them off the event loop
+        geocode_error = (await run_in_threadpool(geocode_missing, [company]))[0]
+        if geocode_error is not None:
+            raise HTTPException(
+                status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+                detail=geocode_error
+            )
+        
         # Validate coordinates are within valid ranges
         if not (-90 <= company.latitude <= 90):
             raise HTTPException(
@@ -98,29 +1142,27 @@ def create_company(company: schemas.CompanyCreate, db: Session = Depends(databas
                 detail="Longitude must be between -180 and 180 degrees"
             )
         
-        # Create geometric point
-        point = from_shape(Point(company.longitude, company.latitude), srid=4326)
-        
-        # Create company object
-        db_company = models.Company(
+        # One round-trip: location is built in SQL and the row comes back via RETURNING
+        stmt = insert(models.Company).values(
             name=company.name,
             industry=company.industry,
             address=company.address,
             latitude=company.latitude,
             longitude=company.longitude,
-            location=point
-        )
+            location=make_point(company.longitude, company.latitude)
+        ).returning(*models.COMPANY_OUT_COLUMNS)
         
-        db.add(db_company)
-        db.commit()
-        db.refresh(db_company)
+        db_company = (await db.execute(stmt)).one()
+        await db.commit()
+        company_snapshot.upsert(db_company._asdict())
+        await _companies_changed((db_company.longitude, db_company.latitude))
         
-        logger.info(f"Created company: {db_company.name} with ID: {db_company.id}")
-        return db_company
+        logger.info("Created company: %s with ID: %s", db_company.name, db_company.id)
+        return db_company._asdict()
         
     except IntegrityError as e:
-        db.rollback()
-        logger.error(f"Database integrity error creating company: {str(e)}")
+        await db.rollback()
+        logger.error("Database integrity error creating company: %s", e)
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="Company with this name already exists or invalid data provided"
@@ -128,15 +1170,112 @@ def create_company(company: schemas.CompanyCreate, db: Session = Depends(databas
     except HTTPException:
         raise
     except Exception as e:
-        db.rollback()
-        logger.error(f"Error creating company: {str(e)}")
+        await db.rollback()
+        logger.error("Error creating company: %s", e)
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail="Failed to create company"
         )
 
+@router.post("/companies/import", response_model=schemas.ImportReport, summary="Bulk import companies from a file")
+async def import_companies(
+    file: UploadFile = File(..., description="CSV (with header) or NDJSON file of companies"),
+    format: Optional[str] = Query(None, description="File format: csv or ndjson (default: detected from the upload)")
+):
+    """
+    Bulk import companies from an uploaded CSV or NDJSON file.
+    
+    Rows are validated in chunks with the same rules as ``POST /companies``.
+    Valid rows are loaded with ``COPY`` in one transaction; invalid rows are
+    skipped and listed in the report.
+    
+    Args:
+        file (UploadFile): CSV or NDJSON file with name, industry, address, latitude and longitude
+        format (str, optional): File format, detected from the upload if omitted
+        
+    Returns:
+        ImportReport: Number of imported rows and per-row validation errors
+        
+    Raises:
+        HTTPException: If the format is unknown or the import fails
+    """
+    fmt = format or bulk_import.detect_format(file.filename, file.content_type)
+    if fmt not in bulk_import.IMPORT_FORMATS:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Unsupported import format, expected one of: {', '.join(bulk_import.IMPORT_FORMATS)}"
+        )
+    
+    try:
+        report = await run_in_threadpool(
+            bulk_import.import_companies,
+            database.engine,
+            bulk_import.read_records(file.file, fmt),
+            fmt
+        )
+    except UnicodeDecodeError:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Import file must be UTF-8 encoded"
+        )
+    except Exception as e:
+        logger.error("Error importing companies: %s", e)
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="Failed to import companies"
+        )
+    
+    if report.imported:
+        database.note_write()
+        tile_cache.clear()
+        await dataset_version.bump()
+        # COPY returns no rows to apply, so have the feed read the import into the snapshot now
+        if company_snapshot.ready and not await change_feed.catch_up():
+            logger.warning("Change feed did not catch up after the import; the snapshot will apply it with a later read")
+    return report
+
+@router.post("/companies/batch", response_model=schemas.BatchResponse, summary="Apply a batch of create, update and delete operations")
+async def batch_companies(request: schemas.BatchRequest, response: Response, db: AsyncSession = Depends(database.get_async_db)):
+    """
+    Apply a mixed batch of company operations in one transaction.
+    
+    Each operation type is applied with a single multi-row statement. In
+    ``atomic`` mode any failed operation rolls back the whole batch and the
+    response status is 400; in ``best_effort`` mode every operation that
+    succeeds is committed.
+    
+    Args:
+        request (BatchRequest): Operations and batch mode
+        
+    Returns:
+        BatchResponse: One result per operation, in request order
+    """
+    try:
+        result, points = await batch.execute_batch(db, request)
+    except Exception as e:
+        await db.rollback()
+        logger.error("Error applying company batch: %s", e)
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="Failed to apply batch"
+        )
+    
+    if result.committed:
+        # After a commit every ok result is a committed change
+        for item in result.results:
+            if item.status != schemas.BatchOperationStatus.ok:
+                continue
+            if item.op == schemas.BatchOperationType.delete:
+                company_snapshot.delete(item.id)
+            else:
+                company_snapshot.upsert(item.company.dict())
+        await _companies_changed(*points)
+    if request.mode == schemas.BatchMode.atomic and result.failed:
+        response.status_code = status.HTTP_400_BAD_REQUEST
+    return result
+
 @router.put("/companies/{company_id}", response_model=schemas.CompanyOut, summary="Update a company")
-def update_company(company_id: int, company_update: schemas.CompanyUpdate, db: Session = Depends(database.get_db)):
+async def update_company(company_id: int, company_update: schemas.CompanyUpdate, db: AsyncSession = Depends(database.get_async_db)):
     """
     Update an existing company by ID.
     
@@ -157,13 +1296,6 @@ def update_company(company_id: int, company_update: schemas.CompanyUpdate, db: S
         )
     
     try:
-        db_company = db.query(models.Company).filter(models.Company.id == company_id).first()
-        if not db_company:
-            raise HTTPException(
-                status_code=status.HTTP_404_NOT_FOUND,
-                detail=f"Company with ID {company_id} not found"
-            )
-        
         # Get update data, excluding unset fields
         update_data = company_update.dict(exclude_unset=True)
         
@@ -173,39 +1305,75 @@ def update_company(company_id: int, company_update: schemas.CompanyUpdate, db: S
                 detail="No valid fields provided for update"
             )
         
-        # Handle location update if latitude or longitude is provided
+        # Re-geocode a changed address unless coordinates were sent with it;
+        # an address the gazetteer does not know keeps the current location
+        geocoder = get_geocoder()
+        if (
+            geocoder is not None
+            and update_data.get("address")
+            and "latitude" not in update_data
+            and "longitude" not in update_data
+        ):
+            # Off the event loop, as in create_company: the lookup is CPU-bound
+            match = await run_in_threadpool(geocoder.geocode, update_data["address"])
+            if match is not None:
+                update_data["latitude"] = match.latitude
+                update_data["longitude"] = match.longitude
+        
+        # Validate coordinates
+        if update_data.get("latitude") is not None and not (-90 <= update_data["latitude"] <= 90):
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="Latitude must be between -90 and 90 degrees"
+            )
+        if update_data.get("longitude") is not None and not (-180 <= update_data["longitude"] <= 180):
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="Longitude must be between -180 and 180 degrees"
+            )
+        
+        # Rebuild location in SQL when either coordinate changes; a coordinate
+        # that was not sent keeps its stored value (SET expressions see the old row)
         if "latitude" in update_data or "longitude" in update_data:
-            lat = update_data.get("latitude", db_company.latitude)
-            lng = update_data.get("longitude", db_company.longitude)
-            
-            # Validate coordinates
-            if not (-90 <= lat <= 90):
-                raise HTTPException(
-                    status_code=status.HTTP_400_BAD_REQUEST,
-                    detail="Latitude must be between -90 and 90 degrees"
-                )
-            if not (-180 <= lng <= 180):
-                raise HTTPException(
-                    status_code=status.HTTP_400_BAD_REQUEST,
-                    detail="Longitude must be between -180 and 180 degrees"
-                )
-            
-            point = from_shape(Point(lng, lat), srid=4326)
-            update_data["location"] = point
+            update_data["location"] = make_point(
+                update_data.get("longitude", models.Company.longitude),
+                update_data.get("latitude", models.Company.latitude)
+            )
+        
+        # One round-trip: a self-join on the pre-update row returns the old
+        # coordinates for tile invalidation alongside the updated company
+        old = models.Company.__table__.alias("old")
+        stmt = (
+            update(models.Company)
+            .where(models.Company.id == company_id)
+            .where(old.c.id == models.Company.id)
+            .values(**update_data)
+            .returning(
+                *models.COMPANY_OUT_COLUMNS,
+                old.c.latitude.label("old_latitude"),
+                old.c.longitude.label("old_longitude")
+            )
+        )
+        row = (await db.execute(stmt)).first()
+        if row is None:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail=f"Company with ID {company_id} not found"
+            )
         
-        # Update the company fields
-        for field, value in update_data.items():
-            setattr(db_company, field, value)
+        await db.commit()
         
-        db.commit()
-        db.refresh(db_company)
+        company = {column.key: getattr(row, column.key) for column in models.COMPANY_OUT_COLUMNS}
+        company_snapshot.upsert(company)
+        # Tiles carry name and industry too, so any change touches the tiles
+        await _companies_changed((row.old_longitude, row.old_latitude), (row.longitude, row.latitude))
         
-        logger.info(f"Updated company with ID: {company_id}")
-        return db_company
+        logger.info("Updated company with ID: %s", company_id)
+        return company
         
     except IntegrityError as e:
-        db.rollback()
-        logger.error(f"Database integrity error updating company {company_id}: {str(e)}")
+        await db.rollback()
+        logger.error("Database integrity error updating company %s: %s", company_id, e)
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="Invalid data provided for update"
@@ -213,15 +1381,15 @@ def update_company(company_id: int, company_update: schemas.CompanyUpdate, db: S
     except HTTPException:
         raise
     except Exception as e:
-        db.rollback()
-        logger.error(f"Error updating company {company_id}: {str(e)}")
+        await db.rollback()
+        logger.error("Error updating company %s: %s", company_id, e)
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail="Failed to update company"
         )
 
 @router.delete("/companies/{company_id}", status_code=status.HTTP_204_NO_CONTENT, summary="Delete a company")
-def delete_company(company_id: int, db: Session = Depends(database.get_db)):
+async def delete_company(company_id: int, db: AsyncSession = Depends(database.get_async_db)):
     """
     Delete a company by ID.
     
@@ -241,25 +1409,30 @@ def delete_company(company_id: int, db: Session = Depends(database.get_db)):
         )
     
     try:
-        db_company = db.query(models.Company).filter(models.Company.id == company_id).first()
-        if not db_company:
+        stmt = (
+            delete(models.Company)
+            .where(models.Company.id == company_id)
+            .returning(models.Company.name, models.Company.latitude, models.Company.longitude)
+        )
+        db_company = (await db.execute(stmt)).first()
+        if db_company is None:
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND,
                 detail=f"Company with ID {company_id} not found"
             )
         
-        company_name = db_company.name
-        db.delete(db_company)
-        db.commit()
+        await db.commit()
+        company_snapshot.delete(company_id)
+        await _companies_changed((db_company.longitude, db_company.latitude))
         
-        logger.info(f"Deleted company: {company_name} with ID: {company_id}")
+        logger.info("Deleted company: %s with ID: %s", db_company.name, company_id)
         return None
         
     except HTTPException:
         raise
     except Exception as e:
-        db.rollback()
-        logger.error(f"Error deleting company {company_id}: {str(e)}")
+        await db.rollback()
+        logger.error("Error deleting company %s: %s", company_id, e)
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail="Failed to delete company"
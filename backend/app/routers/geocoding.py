@@ -0,0 +1,73 @@
+from fastapi import APIRouter, HTTPException, Query, status
+from app import schemas
+from app.geocoding import Geocoder, GeocodeMatch, get_geocoder
+from typing import Optional
+import logging
+
+logger = logging.getLogger(__name__)
+
+router = APIRouter()
+
+def _require_geocoder() -> Geocoder:
+    geocoder = get_geocoder()
+    if geocoder is None:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Geocoding is not configured; set GAZETTEER_PATH"
+        )
+    return geocoder
+
+def _to_result(query: str, match: Optional[GeocodeMatch]) -> schemas.GeocodeResult:
+    if match is None:
+        return schemas.GeocodeResult(query=query, found=False)
+    return schemas.GeocodeResult(
+        query=query,
+        found=True,
+        latitude=match.latitude,
+        longitude=match.longitude,
+        label=match.label,
+        score=match.score
+    )
+
+@router.get("/geocode", response_model=schemas.GeocodeResult, summary="Geocode an address")
+def geocode_address(q: str = Query(..., min_length=1, max_length=200, description="Address to geocode")):
+    """
+    Resolve an address to coordinates using the local gazetteer.
+    
+    Args:
+        q (str): Address to geocode
+        
+    Returns:
+        GeocodeResult: Best match, or ``found: false``
+        
+    Raises:
+        HTTPException: If geocoding is not configured
+    """
+    geocoder = _require_geocoder()
+    result = _to_result(q, geocoder.geocode(q))
+    logger.info("Geocoded address (found: %s)", result.found)
+    return result
+
+@router.post("/geocode/batch", response_model=schemas.GeocodeBatchResponse, summary="Geocode many addresses")
+def geocode_batch(request: schemas.GeocodeBatchRequest):
+    """
+    Resolve many addresses in one call; repeated addresses are looked up once.
+    
+    Args:
+        request (GeocodeBatchRequest): Addresses to geocode
+        
+    Returns:
+        GeocodeBatchResponse: One result per address, in request order
+    """
+    geocoder = _require_geocoder()
+    matches = geocoder.geocode_many(request.addresses)
+    results = [_to_result(address, match) for address, match in zip(request.addresses, matches)]
+    logger.info("Geocoded %s addresses (%s found)", len(results), sum(r.found for r in results))
+    return schemas.GeocodeBatchResponse(results=results)
+
+@router.get("/geocode/stats", response_model=schemas.GeocoderStats, summary="Get geocoder index and cache statistics")
+def geocode_stats():
+    """
+    Report gazetteer size and address cache hit rate.
+    """
+    return schemas.GeocoderStats(**_require_geocoder().stats())
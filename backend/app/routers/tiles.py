@@ -0,0 +1,95 @@
+from fastapi import APIRouter, Depends, HTTPException, Response, status
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncSession
+from app import database
+from app.tile_cache import MAX_TILE_ZOOM, tile_cache
+import logging
+import os
+
+logger = logging.getLogger(__name__)
+
+router = APIRouter()
+
+MVT_MEDIA_TYPE = "application/vnd.mapbox-vector-tile"
+
+# Browser/CDN cache lifetime for rendered tiles, in seconds
+TILE_MAX_AGE = int(os.getenv("TILE_MAX_AGE", "60"))
+
+# Tile coordinate space and the buffer kept around each tile, in tile units
+TILE_EXTENT = 4096
+TILE_BUFFER = 64
+
+TILE_QUERY = text("""
+    WITH bounds AS (
+        SELECT ST_TileEnvelope(:z, :x, :y) AS geom
+    ),
+    mvtgeom AS (
+        SELECT
+            ST_AsMVTGeom(ST_Transform(c.location, 3857), bounds.geom, :extent, :buffer, true) AS geom,
+            c.id,
+            c.name,
+            c.industry
+        FROM companies c, bounds
+        WHERE c.location && ST_Transform(bounds.geom, 4326)
+    )
+    SELECT ST_AsMVT(mvtgeom, 'companies', :extent, 'geom') FROM mvtgeom
+""")
+
+@router.get(
+    "/tiles/{z}/{x}/{y}.mvt",
+    response_class=Response,
+    responses={200: {"content": {MVT_MEDIA_TYPE: {}}}},
+    summary="Get a vector tile of companies"
+)
+async def get_tile(z: int, x: int, y: int, db: AsyncSession = Depends(database.get_async_read_db)):
+    """
+    Render the companies inside an XYZ tile as a Mapbox Vector Tile.
+    
+    Tiles are served from the tile cache when possible and rendered with
+    ``ST_AsMVT`` otherwise. Each feature carries ``id``, ``name`` and ``industry``.
+    
+    Args:
+        z (int): Zoom level
+        x (int): Tile column
+        y (int): Tile row
+        
+    Returns:
+        Response: Protobuf encoded vector tile
+        
+    Raises:
+        HTTPException: If the tile coordinates are out of range
+    """
+    if not (0 <= z <= MAX_TILE_ZOOM):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Zoom level must be between 0 and {MAX_TILE_ZOOM}"
+        )
+    if not (0 <= x < 2 ** z and 0 <= y < 2 ** z):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Tile coordinates must be between 0 and {2 ** z - 1} at zoom {z}"
+        )
+    
+    key = (z, x, y)
+    tile = tile_cache.get(key)
+    if tile is None:
+        generation = tile_cache.generation
+        try:
+            result = (await db.execute(
+                TILE_QUERY,
+                {"z": z, "x": x, "y": y, "extent": TILE_EXTENT, "buffer": TILE_BUFFER}
+            )).scalar()
+        except Exception as e:
+            logger.error("Error rendering tile %s/%s/%s: %s", z, x, y, e)
+            raise HTTPException(
+                status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+                detail="Failed to render tile"
+            )
+        tile = bytes(result) if result is not None else b""
+        tile_cache.put(key, tile, generation)
+    
+    return Response(
+        content=tile,
+        media_type=MVT_MEDIA_TYPE,
+        headers={"Cache-Control": f"public, max-age={TILE_MAX_AGE}"}
+    )
@@ -1,6 +1,15 @@
-from pydantic import BaseModel, Field, validator, ValidationError
-from typing import Optional
+from pydantic import BaseModel, Field, root_validator, validator, ValidationError
+from typing import Any, Dict, List, Optional
+from datetime import datetime
 from decimal import Decimal
+from enum import Enum
+import os
+
+# Maximum number of operations accepted in one batch request
+BATCH_MAX_OPERATIONS = int(os.getenv("BATCH_MAX_OPERATIONS", "10000"))
+
+# Maximum number of addresses accepted in one geocoding batch
+GEOCODE_BATCH_MAX_ADDRESSES = int(os.getenv("GEOCODE_BATCH_MAX_ADDRESSES", "1000"))
 
 class CompanyBase(BaseModel):
     name: str = Field(
@@ -63,7 +72,30 @@ class CompanyBase(BaseModel):
         return float(v)
 
 class CompanyCreate(CompanyBase):
-    pass
+    latitude: Optional[float] = Field(
+        None, 
+        ge=-90, 
+        le=90,
+        description="Latitude coordinate (geocoded from address if omitted)",
+        example=40.7128
+    )
+    longitude: Optional[float] = Field(
+        None, 
+        ge=-180, 
+        le=180,
+        description="Longitude coordinate (geocoded from address if omitted)",
+        example=-74.0060
+    )
+
+    @root_validator(skip_on_failure=True)
+    def validate_location_source(cls, values):
+        lat = values.get('latitude')
+        lng = values.get('longitude')
+        if (lat is None) != (lng is None):
+            raise ValueError('Both latitude and longitude must be provided together')
+        if lat is None and not values.get('address'):
+            raise ValueError('Either latitude and longitude or an address to geocode must be provided')
+        return values
 
 class CompanyUpdate(BaseModel):
     name: Optional[str] = Field(
@@ -156,3 +188,153 @@ class CompanyOut(CompanyBase):
                 "longitude": -74.0060
             }
         }
+
+class ClusterOut(BaseModel):
+    latitude: float = Field(..., description="Latitude of the cluster centroid", example=40.7128)
+    longitude: float = Field(..., description="Longitude of the cluster centroid", example=-74.0060)
+    count: int = Field(..., description="Number of companies in the cluster", example=42)
+    industries: Dict[str, int] = Field(
+        ...,
+        description="Number of companies per industry",
+        example={"Technology": 30, "Finance": 12}
+    )
+
+class ClusterResponse(BaseModel):
+    zoom: int = Field(..., description="Zoom level the clusters were computed for", example=10)
+    cell_size: float = Field(..., description="Grid cell size in degrees", example=0.0879)
+    clusters: List[ClusterOut] = Field(..., description="Grid cells holding at least min_cluster_size companies")
+    companies: List[CompanyOut] = Field(..., description="Companies in cells below the cluster threshold")
+
+class StatsCell(BaseModel):
+    longitude: float = Field(..., description="Western edge of the cell", example=-75.0)
+    latitude: float = Field(..., description="Southern edge of the cell", example=40.0)
+    count: int = Field(..., description="Number of companies in the cell", example=1250)
+    industries: Dict[str, int] = Field(
+        ...,
+        description="Number of companies per industry",
+        example={"Technology": 900, "Finance": 350}
+    )
+
+class CompanyStats(BaseModel):
+    total: int = Field(..., description="Number of companies counted", example=125000)
+    industries: Dict[str, int] = Field(
+        ...,
+        description="Number of companies per industry",
+        example={"Technology": 90000, "Finance": 35000}
+    )
+    cell_size: float = Field(..., description="Side of a stats cell in degrees", example=1.0)
+    cells: Optional[List[StatsCell]] = Field(None, description="Per-cell counts, when requested")
+
+class SnapshotStatus(BaseModel):
+    enabled: bool = Field(..., description="Whether SNAPSHOT_ENABLED is set", example=True)
+    ready: bool = Field(..., description="Whether the snapshot has been loaded", example=True)
+    serving: bool = Field(..., description="Whether reads are currently answered from the snapshot", example=True)
+    companies: int = Field(..., description="Companies in the snapshot", example=125000)
+    industries: int = Field(..., description="Distinct industries encoded", example=12)
+    memory_bytes: int = Field(..., description="Approximate memory held by the snapshot", example=31000000)
+    unindexed_rows: int = Field(..., description="Rows written since the grid index was last sorted", example=42)
+    cell_size: float = Field(..., description="Side of a grid index cell in degrees", example=0.25)
+    version: Optional[int] = Field(None, description="Change feed version the snapshot is current to", example=73512)
+    loaded_at: Optional[datetime] = Field(None, description="When the snapshot was last loaded from the database")
+    staleness_seconds: Optional[float] = Field(None, description="Seconds since the change feed last synced it", example=1.2)
+
+class CompanyDistanceOut(CompanyOut):
+    distance_m: float = Field(..., description="Distance from the query point in meters", example=1523.4)
+
+class CompanySearchOut(CompanyOut):
+    score: float = Field(..., description="Relevance score; higher is better", example=1.42)
+
+class CompanyChangeOp(str, Enum):
+    upsert = "upsert"
+    delete = "delete"
+
+class CompanyChangeOut(BaseModel):
+    op: CompanyChangeOp = Field(..., description="upsert carries the current company, delete only its ID")
+    id: int = Field(..., description="Company ID", example=1)
+    company: Optional[CompanyOut] = Field(None, description="Current company data for upserts")
+
+class CompanyChanges(BaseModel):
+    version: int = Field(..., description="Feed version to pass as since on the next call", example=1234567)
+    reset: bool = Field(False, description="The changes cannot be sent as deltas; reload the full list")
+    changes: List[CompanyChangeOut] = Field(..., description="One entry per changed company")
+
+class ImportRowError(BaseModel):
+    row: int = Field(..., description="1-based data row number in the uploaded file", example=3)
+    errors: List[str] = Field(..., description="Validation errors for the row", example=["latitude: ensure this value is less than or equal to 90"])
+
+class ImportReport(BaseModel):
+    format: str = Field(..., description="Detected file format", example="csv")
+    total_rows: int = Field(..., description="Number of data rows read", example=100000)
+    imported: int = Field(..., description="Number of companies inserted", example=99998)
+    failed: int = Field(..., description="Number of rows rejected by validation", example=2)
+    errors: List[ImportRowError] = Field(..., description="Per-row validation errors")
+    errors_truncated: bool = Field(False, description="True if more errors occurred than are listed")
+
+class BatchOperationType(str, Enum):
+    create = "create"
+    update = "update"
+    delete = "delete"
+
+class BatchMode(str, Enum):
+    atomic = "atomic"
+    best_effort = "best_effort"
+
+class BatchOperationStatus(str, Enum):
+    ok = "ok"
+    error = "error"
+    not_found = "not_found"
+    rolled_back = "rolled_back"
+
+class BatchOperation(BaseModel):
+    op: BatchOperationType = Field(..., description="Operation type", example="update")
+    id: Optional[int] = Field(None, description="Company ID, required for update and delete", example=1)
+    data: Optional[Dict[str, Any]] = Field(
+        None,
+        description="Company fields: CompanyCreate for create, CompanyUpdate for update",
+        example={"industry": "Finance"}
+    )
+
+class BatchRequest(BaseModel):
+    mode: BatchMode = Field(
+        BatchMode.atomic,
+        description="atomic: all operations succeed or none are applied; best_effort: apply every operation that succeeds"
+    )
+    operations: List[BatchOperation] = Field(..., min_items=1, max_items=BATCH_MAX_OPERATIONS)
+
+class BatchOperationResult(BaseModel):
+    index: int = Field(..., description="Position of the operation in the request", example=0)
+    op: BatchOperationType = Field(..., description="Operation type", example="update")
+    status: BatchOperationStatus = Field(..., description="Outcome of the operation", example="ok")
+    id: Optional[int] = Field(None, description="ID of the affected company", example=1)
+    company: Optional[CompanyOut] = Field(None, description="Company after a create or update")
+    error: Optional[str] = Field(None, description="Reason the operation failed")
+
+class BatchResponse(BaseModel):
+    mode: BatchMode = Field(..., description="Mode the batch ran in")
+    committed: bool = Field(..., description="Whether any changes were committed")
+    succeeded: int = Field(..., description="Number of applied operations", example=10)
+    failed: int = Field(..., description="Number of failed operations", example=0)
+    results: List[BatchOperationResult] = Field(..., description="One result per operation, in request order")
+
+class GeocodeResult(BaseModel):
+    query: str = Field(..., description="Address as submitted", example="350 5th Ave, New York")
+    found: bool = Field(..., description="Whether the address was found in the gazetteer", example=True)
+    latitude: Optional[float] = Field(None, description="Latitude of the match", example=40.7484)
+    longitude: Optional[float] = Field(None, description="Longitude of the match", example=-73.9857)
+    label: Optional[str] = Field(None, description="Gazetteer entry that matched", example="350 5th Ave, New York, NY")
+    score: Optional[float] = Field(None, description="Share of the query matched, 0 to 1", example=0.92)
+
+class GeocodeBatchRequest(BaseModel):
+    addresses: List[str] = Field(..., min_items=1, max_items=GEOCODE_BATCH_MAX_ADDRESSES, description="Addresses to geocode")
+
+class GeocodeBatchResponse(BaseModel):
+    results: List[GeocodeResult] = Field(..., description="One result per address, in request order")
+
+class GeocoderStats(BaseModel):
+    entries: int = Field(..., description="Gazetteer entries loaded", example=120000)
+    tokens: int = Field(..., description="Distinct tokens in the index", example=45000)
+    cache_size: int = Field(..., description="Addresses currently cached", example=812)
+    cache_capacity: int = Field(..., description="Maximum cached addresses", example=10000)
+    hits: int = Field(..., description="Cache hits", example=5120)
+    misses: int = Field(..., description="Cache misses", example=812)
+    hit_rate: float = Field(..., description="Cache hit rate, 0 to 1", example=0.863)
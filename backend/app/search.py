@@ -0,0 +1,71 @@
+"""
+Full-text and trigram search helpers for companies.
+
+Companies are searched through two expression indexes instead of stored
+columns, so existing tables only need ``CREATE INDEX``:
+
+- a GIN index on ``search_document()``, a ``simple``-configuration tsvector
+  over name, industry and address, for ranked word and prefix matches;
+- a GIN ``gin_trgm_ops`` index on ``lower(name)`` for typo-tolerant
+  similarity matches, plus a ``text_pattern_ops`` B-tree on the same
+  expression for one- and two-character name prefixes.
+
+Queries must build their expressions with these helpers for the planner to
+match them to the indexes.
+"""
+import re
+from typing import Optional
+
+from sqlalchemy import func, text
+
+# No stemming or stop words: company names are proper nouns
+SEARCH_CONFIG = text("'simple'::regconfig")
+
+_TOKEN_RE = re.compile(r"[^\W_]+", re.UNICODE)
+
+
+def search_document(name, industry, address):
+    """
+    The tsvector indexed for full-text search.
+
+    Literals are inlined rather than bound so that prepared statements
+    (asyncpg) produce the same expression as the index definition.
+    """
+    empty = text("''")
+    space = text("' '")
+    return func.to_tsvector(
+        SEARCH_CONFIG,
+        func.coalesce(name, empty).op("||")(space)
+        .op("||")(func.coalesce(industry, empty))
+        .op("||")(space)
+        .op("||")(func.coalesce(address, empty))
+    )
+
+
+def name_key(name):
+    """
+    The lowercased name indexed for trigram and prefix matching.
+    """
+    return func.lower(name)
+
+
+def prefix_tsquery(text: str) -> Optional[str]:
+    """
+    Build a ``to_tsquery`` string matching every word of ``text``, the last
+    one as a prefix, e.g. ``"acme cor"`` -> ``"acme & cor:*"``.
+
+    Returns None if ``text`` contains no words. Only word characters reach
+    the query, so user input cannot inject tsquery operators.
+    """
+    tokens = [token.lower() for token in _TOKEN_RE.findall(text)]
+    if not tokens:
+        return None
+    tokens[-1] += ":*"
+    return " & ".join(tokens)
+
+
+def escape_like(text: str) -> str:
+    """
+    Escape ``LIKE`` wildcards so ``text`` matches literally.
+    """
+    return text.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
@@ -0,0 +1,120 @@
+"""
+Request coalescing ("single flight") for read routes.
+
+When many clients ask for the same thing at once, e.g. everyone opening a
+popular map view after a write invalidated the response cache, the first
+request runs the query and serializes the body while identical requests
+that arrive before it finishes wait for that result instead of running
+their own. Keys come from ``cache_key``, so they include the normalized
+query and the dataset version: a request that starts after a write never
+joins a flight started before it.
+
+The shared call runs as its own task with its own database session, so
+it outlives any single client:
+
+- a waiter that disconnects stops waiting, and the call carries on for
+  the others; it is cancelled only once every waiter has gone;
+- the call is bounded by ``SINGLE_FLIGHT_TIMEOUT``, after which every
+  waiter gets ``asyncio.TimeoutError``;
+- an exception raised by the call is raised to every waiter.
+"""
+import asyncio
+import logging
+import os
+from typing import Awaitable, Callable, Dict, Optional, TypeVar
+
+from app import metrics
+
+logger = logging.getLogger(__name__)
+
+# Seconds a shared call may run before its waiters give up
+SINGLE_FLIGHT_TIMEOUT = float(os.getenv("SINGLE_FLIGHT_TIMEOUT", "30"))
+
+SINGLE_FLIGHT_CALLS = metrics.Counter(
+    "single_flight_calls_total", "Shared calls started, one per group of coalesced requests", ("flight",)
+)
+SINGLE_FLIGHT_COALESCED = metrics.Counter(
+    "single_flight_coalesced_total", "Requests that joined a call already in flight instead of starting one", ("flight",)
+)
+SINGLE_FLIGHT_TIMEOUTS = metrics.Counter(
+    "single_flight_timeouts_total", "Shared calls that ran longer than SINGLE_FLIGHT_TIMEOUT", ("flight",)
+)
+SINGLE_FLIGHT_IN_FLIGHT = metrics.Gauge(
+    "single_flight_in_flight", "Shared calls currently running", ("flight",)
+)
+
+T = TypeVar("T")
+
+
+class _Call:
+    __slots__ = ("task", "waiters")
+
+    def __init__(self, task: asyncio.Task):
+        self.task = task
+        self.waiters = 0
+
+
+class SingleFlight:
+    """
+    Coalesce concurrent calls with the same key into one execution.
+    """
+
+    def __init__(self, name: str, timeout: float = SINGLE_FLIGHT_TIMEOUT):
+        self.name = name
+        self.timeout = timeout
+        self._calls: Dict[str, _Call] = {}
+
+    def __len__(self) -> int:
+        return len(self._calls)
+
+    async def _run(self, key: str, function: Callable[[], Awaitable[T]]) -> T:
+        SINGLE_FLIGHT_IN_FLIGHT.inc(self.name)
+        try:
+            return await asyncio.wait_for(function(), self.timeout)
+        except asyncio.TimeoutError:
+            SINGLE_FLIGHT_TIMEOUTS.inc(self.name)
+            logger.warning("Shared %s call timed out after %ss", self.name, self.timeout)
+            raise
+        finally:
+            SINGLE_FLIGHT_IN_FLIGHT.dec(self.name)
+            self._forget(key, asyncio.current_task())
+
+    def _forget(self, key: str, task: asyncio.Task):
+        # A cancelled call may finish after a new call for its key has started
+        call = self._calls.get(key)
+        if call is not None and call.task is task:
+            del self._calls[key]
+
+    async def do(self, key: str, function: Callable[[], Awaitable[T]]) -> T:
+        """
+        Await ``function()``, or the result of an identical call in flight.
+
+        Args:
+            key (str): Identity of the call; callers with equal keys share a result
+            function: Coroutine function run once per group of concurrent callers.
+                It must not use per-request resources such as the caller's session.
+
+        Returns:
+            The call's result, shared by every caller that waited on it
+
+        Raises:
+            asyncio.TimeoutError: If the call ran longer than ``timeout``
+        """
+        call: Optional[_Call] = self._calls.get(key)
+        if call is None:
+            call = _Call(asyncio.create_task(self._run(key, function)))
+            self._calls[key] = call
+            SINGLE_FLIGHT_CALLS.inc(self.name)
+        else:
+            SINGLE_FLIGHT_COALESCED.inc(self.name)
+
+        call.waiters += 1
+        try:
+            # Shielded: one waiter being cancelled must not cancel the call for the rest
+            return await asyncio.shield(call.task)
+        finally:
+            call.waiters -= 1
+            if call.waiters == 0 and not call.task.done():
+                # Every waiter has gone (clients disconnected); stop the work
+                call.task.cancel()
+                self._forget(key, call.task)
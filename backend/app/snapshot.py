@@ -0,0 +1,702 @@
+"""
+In-memory, array-backed snapshot of companies for answering list, bbox,
+nearest and radius reads without querying PostgreSQL.
+
+Enabled with ``SNAPSHOT_ENABLED``. Each worker loads every company once, in
+keyset pages, and then follows the change feed: each change set the
+listener reads is applied as row upserts and deletes. Single and batch
+writes made through a worker are applied to its snapshot as soon as they
+commit; bulk imports return no rows, so the import route has the feed read
+them before it responds. Writes made through other workers or processes
+arrive with the feed: at once on notification, at the latest after
+``CHANGE_FEED_POLL_SECONDS``, or later while a long transaction holds the
+feed watermark back. Until the first load finishes, when the feed is not
+running, or when it has not been heard from for
+``SNAPSHOT_MAX_STALENESS_SECONDS``, routes fall back to the database.
+
+IDs, coordinates and dictionary-encoded industries live in NumPy arrays.
+Names and addresses are UTF-8 in one contiguous buffer per column,
+addressed by per-row offset and length arrays, so no Python object is kept
+per company; responses are serialized from the columns on demand. Rows are
+indexed by a uniform grid. The *base* segment is sorted by grid cell, so a
+bounding box becomes one ``searchsorted`` range per row of cells. Writes mark the old slot dead and append to an unsorted *tail*,
+which is scanned linearly and merged into the base by an in-memory re-sort
+(no database reads) once it outgrows ``SNAPSHOT_COMPACT_ROWS``.
+
+Distances use a spherical earth and are within 0.5% of the spheroidal
+``geography`` distances PostGIS returns.
+"""
+import asyncio
+import logging
+import math
+import os
+import sys
+import time
+from datetime import datetime
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+import orjson
+from sqlalchemy import select
+
+from app import database, metrics, models
+from app.change_feed import ChangeSet, change_feed, current_version, read_changes
+from app.columnar import ColumnarWriter
+from app.spatial import BoundingBox
+
+logger = logging.getLogger(__name__)
+
+# Serve list, nearest and radius reads from a per-worker in-memory snapshot
+SNAPSHOT_ENABLED = os.getenv("SNAPSHOT_ENABLED", "false").lower() in ("1", "true", "yes")
+
+# Side of a grid index cell in degrees
+SNAPSHOT_CELL_DEGREES = float(os.getenv("SNAPSHOT_CELL_DEGREES", "0.01"))
+
+# Reads go to the database when the change feed has been silent for longer than this
+SNAPSHOT_MAX_STALENESS_SECONDS = float(os.getenv("SNAPSHOT_MAX_STALENESS_SECONDS", "30"))
+
+# Appended rows kept unsorted before they are merged into the grid index
+SNAPSHOT_COMPACT_ROWS = int(os.getenv("SNAPSHOT_COMPACT_ROWS", "10000"))
+
+SNAPSHOT_LOAD_BATCH_SIZE = 50000
+
+# Seconds between attempts after a failed load
+SNAPSHOT_RETRY_SECONDS = 10
+
+# Mean earth radius, as used for spherical distances
+EARTH_RADIUS_M = 6371008.8
+
+_EMPTY = np.empty(0, dtype=np.int64)
+
+
+def _ranges(starts: np.ndarray, ends: np.ndarray) -> np.ndarray:
+    """
+    Concatenate ``arange(start, end)`` for every pair without a Python loop.
+    """
+    lengths = ends - starts
+    keep = lengths > 0
+    starts, lengths = starts[keep], lengths[keep]
+    total = int(lengths.sum())
+    if total == 0:
+        return _EMPTY
+    return np.repeat(starts - np.cumsum(lengths) + lengths, lengths) + np.arange(total)
+
+
+def _boxes(lon: float, lat: float, half_lon: float, half_lat: float) -> List[BoundingBox]:
+    """
+    Boxes covering ``half_lon``/``half_lat`` degrees around a point, split at the antimeridian.
+    """
+    min_lat, max_lat = max(-90.0, lat - half_lat), min(90.0, lat + half_lat)
+    if half_lon >= 180:
+        return [BoundingBox(-180.0, min_lat, 180.0, max_lat)]
+    west, east = lon - half_lon, lon + half_lon
+    boxes = [BoundingBox(max(west, -180.0), min_lat, min(east, 180.0), max_lat)]
+    if west < -180:
+        boxes.append(BoundingBox(west + 360, min_lat, 180.0, max_lat))
+    if east > 180:
+        boxes.append(BoundingBox(-180.0, min_lat, east - 360, max_lat))
+    return boxes
+
+
+class _TextColumn:
+    """
+    Nullable strings as NUL-terminated UTF-8 in one buffer, addressed by
+    per-slot start and length arrays (length -1 for NULL). Overwritten
+    slots leave their bytes behind until the column is rebuilt with ``take``.
+
+    PostgreSQL text cannot contain NUL, so the terminators double as
+    separators: a run of strings decodes with one ``decode`` and ``split``.
+    The buffer starts with a NUL that NULL slots point at, reading as "".
+    """
+
+    def __init__(self, starts: np.ndarray, lengths: np.ndarray, data: np.ndarray):
+        self.starts = starts
+        self.lengths = lengths
+        self.data = data
+        self.size = len(data)
+
+    @classmethod
+    def from_values(cls, values: Sequence[Optional[str]]) -> "_TextColumn":
+        data = np.frombuffer(("\0" + "".join([(value or "") + "\0" for value in values])).encode(), dtype=np.uint8)
+        ends = np.flatnonzero(data == 0)[1:]
+        starts = np.concatenate(([0], ends))[:-1] + 1
+        lengths = (ends - starts).astype(np.int32)
+        nulls = [i for i, value in enumerate(values) if value is None]
+        starts[nulls], lengths[nulls] = 0, -1
+        return cls(starts, lengths, data)
+
+    @property
+    def nbytes(self) -> int:
+        return self.starts.nbytes + self.lengths.nbytes + self.data.nbytes
+
+    def _spans(self, slots: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        # Starts and lengths, with NULLs as the empty string at offset 0
+        return self.starts[slots], np.maximum(self.lengths[slots], 0)
+
+    def take(self, slots: np.ndarray) -> "_TextColumn":
+        """
+        A compacted copy holding only ``slots``, in that order.
+        """
+        lengths = self.lengths[slots]
+        strings = lengths >= 0
+        starts, sizes = self.starts[slots][strings], lengths[strings] + 1
+        data = np.concatenate((np.zeros(1, np.uint8), self.data[_ranges(starts, starts + sizes)]))
+        new_starts = np.zeros(len(slots), dtype=np.int64)
+        new_starts[strings] = np.cumsum(sizes) - sizes + 1
+        return _TextColumn(new_starts, lengths, data)
+
+    def grow(self, capacity: int):
+        for name in ("starts", "lengths"):
+            array = getattr(self, name)
+            grown = np.zeros(capacity, dtype=array.dtype)
+            grown[:len(array)] = array
+            setattr(self, name, grown)
+
+    def set(self, slot: int, value: Optional[str]):
+        if value is None:
+            self.starts[slot], self.lengths[slot] = 0, -1
+            return
+        encoded = value.encode() + b"\0"
+        end = self.size + len(encoded)
+        if end > len(self.data):
+            grown = np.zeros(max(2 * len(self.data), end, 1 << 16), dtype=np.uint8)
+            grown[:self.size] = self.data[:self.size]
+            self.data = grown
+        self.data[self.size:end] = np.frombuffer(encoded, dtype=np.uint8)
+        self.starts[slot], self.lengths[slot] = self.size, len(encoded) - 1
+        self.size = end
+
+    def values(self, slots: np.ndarray) -> List[Optional[str]]:
+        """
+        The strings of ``slots``, decoded in one go.
+        """
+        if len(slots) == 0:
+            return []
+        starts, sizes = self._spans(slots)
+        # Each string with its terminator, dropping the last one so split gives one value per slot
+        joined = self.data[_ranges(starts, starts + sizes + 1)][:-1]
+        values: List[Optional[str]] = joined.tobytes().decode().split("\0")
+        for i in np.flatnonzero(self.lengths[slots] < 0).tolist():
+            values[i] = None
+        return values
+
+    def joined(self, slots: np.ndarray) -> Tuple[np.ndarray, bytes]:
+        """
+        ``len(slots) + 1`` offsets and the UTF-8 bytes, as ``ColumnarWriter.add_strings`` takes them.
+        """
+        starts, sizes = self._spans(slots)
+        offsets = np.zeros(len(slots) + 1, dtype="<u4")
+        offsets[1:] = np.cumsum(sizes)
+        return offsets, self.data[_ranges(starts, starts + sizes)].tobytes()
+
+
+class CompanySnapshot:
+    """
+    Column arrays and a grid index over every company, kept current from the change feed.
+    """
+
+    def __init__(self, cell_degrees: float = SNAPSHOT_CELL_DEGREES):
+        self.cell_degrees = cell_degrees
+        self._columns = math.ceil(360 / cell_degrees)
+        self._rows = math.ceil(180 / cell_degrees)
+        self.version: Optional[int] = None
+        self.loaded_at: Optional[datetime] = None
+        self.synced_at: Optional[float] = None
+        self._task: Optional[asyncio.Task] = None
+        self._industries: List[str] = []
+        self._industry_codes: Dict[str, int] = {}
+        self._set_base(
+            np.empty(0, np.int64), np.empty(0, np.float64), np.empty(0, np.float64), np.empty(0, np.int32),
+            _TextColumn.from_values([]), _TextColumn.from_values([])
+        )
+
+    # Storage
+
+    def _cell_keys(self, lon: np.ndarray, lat: np.ndarray) -> np.ndarray:
+        x = np.clip(np.floor((lon + 180) / self.cell_degrees), 0, self._columns - 1).astype(np.int64)
+        y = np.clip(np.floor((lat + 90) / self.cell_degrees), 0, self._rows - 1).astype(np.int64)
+        return y * self._columns + x
+
+    def _industry_code(self, industry: str) -> int:
+        code = self._industry_codes.get(industry)
+        if code is None:
+            code = self._industry_codes[industry] = len(self._industries)
+            self._industries.append(industry)
+        return code
+
+    def _set_base(self, ids, lon, lat, industry, names: _TextColumn, addresses: _TextColumn):
+        """
+        Replace all rows with the given ones, sorted by grid cell then ID.
+        """
+        cells = self._cell_keys(lon, lat)
+        order = np.lexsort((ids, cells))
+        self._ids, self._lon, self._lat, self._industry = ids[order], lon[order], lat[order], industry[order]
+        self._cells = cells[order]
+        self._names, self._addresses = names.take(order), addresses.take(order)
+        self._alive = np.ones(len(ids), dtype=bool)
+        self._base = self._size = len(ids)
+        # Base slots in ID order, for ID lookups and ID-ordered pages
+        self._base_by_id = np.argsort(self._ids, kind="stable")
+        self._base_ids = self._ids[self._base_by_id]
+        # Live tail slots by ID
+        self._tail: Dict[int, int] = {}
+        self._live = len(ids)
+
+    def _compact(self):
+        slots = np.flatnonzero(self._alive[:self._size])
+        self._set_base(
+            self._ids[slots], self._lon[slots], self._lat[slots], self._industry[slots],
+            self._names.take(slots), self._addresses.take(slots)
+        )
+
+    def _grow(self):
+        capacity = max(2 * len(self._ids), 1024)
+        for name in ("_ids", "_lon", "_lat", "_industry", "_alive"):
+            array = getattr(self, name)
+            grown = np.zeros(capacity, dtype=array.dtype)
+            grown[:len(array)] = array
+            setattr(self, name, grown)
+        self._names.grow(capacity)
+        self._addresses.grow(capacity)
+
+    def _find(self, company_id: int) -> Optional[int]:
+        slot = self._tail.get(company_id)
+        if slot is not None:
+            return slot
+        i = int(np.searchsorted(self._base_ids, company_id))
+        if i < len(self._base_ids) and self._base_ids[i] == company_id:
+            slot = int(self._base_by_id[i])
+            if self._alive[slot]:
+                return slot
+        return None
+
+    def _remove(self, company_id: int):
+        slot = self._find(company_id)
+        if slot is None:
+            return
+        self._alive[slot] = False
+        self._tail.pop(company_id, None)
+        self._live -= 1
+
+    def _append(self, company: dict):
+        if self._size == len(self._ids):
+            self._grow()
+        slot = self._size
+        self._ids[slot] = company["id"]
+        self._lon[slot] = company["longitude"]
+        self._lat[slot] = company["latitude"]
+        self._industry[slot] = self._industry_code(company["industry"])
+        self._alive[slot] = True
+        self._names.set(slot, company["name"])
+        self._addresses.set(slot, company["address"])
+        self._tail[company["id"]] = slot
+        self._size += 1
+        self._live += 1
+
+    # Updates
+
+    @property
+    def ready(self) -> bool:
+        return self.version is not None
+
+    def upsert(self, company: dict):
+        """
+        Insert or replace a company given as a ``CompanyOut`` dict.
+        """
+        if not self.ready:
+            return
+        self._remove(company["id"])
+        self._append(company)
+        if self._size - self._base > max(SNAPSHOT_COMPACT_ROWS, self._base // 8):
+            self._compact()
+
+    def delete(self, company_id: int):
+        if self.ready:
+            self._remove(company_id)
+
+    def apply(self, change_set: ChangeSet):
+        """
+        Change feed listener: apply a change set read after this snapshot's version.
+
+        Sets read before the snapshot's own catch-up read carry an equal or
+        lower version and are skipped; their changes are already included.
+        """
+        if not self.ready or change_set.version < self.version:
+            return
+        if change_set.reset:
+            logger.info("Company snapshot reset by the change feed, reloading")
+            self.version = None
+            self._start_load()
+            return
+        if change_set.version > self.version:
+            for change in change_set.changes:
+                if change["op"] == "upsert":
+                    self.upsert(change["company"])
+                else:
+                    self.delete(change["id"])
+            self.version = change_set.version
+        self.synced_at = time.monotonic()
+
+    # Reads
+
+    def staleness(self) -> Optional[float]:
+        """
+        Seconds since the change feed last confirmed the snapshot is current.
+        """
+        return None if self.synced_at is None else time.monotonic() - self.synced_at
+
+    def usable(self, request=None) -> bool:
+        """
+        Whether a read can be served from the snapshot: it is loaded, the
+        feed is running and being heard from, and the client is not pinned
+        to the primary after a write made through another worker.
+        """
+        if not SNAPSHOT_ENABLED or not self.ready or not change_feed.running:
+            return False
+        if self.staleness() > SNAPSHOT_MAX_STALENESS_SECONDS:
+            return False
+        return request is None or not database.client_pinned(request)
+
+    def _code_filter(self, industry: Optional[str]) -> Tuple[bool, Optional[int]]:
+        # (matches anything, industry code or None for no filter)
+        if not industry:
+            return True, None
+        code = self._industry_codes.get(industry.strip())
+        return code is not None, code
+
+    def _cell_ranges(self, bbox: BoundingBox) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Base slot ranges, one per row of grid cells, covering ``bbox``.
+        """
+        keys = self._cell_keys(np.array([bbox.min_lon, bbox.max_lon]), np.array([bbox.min_lat, bbox.max_lat]))
+        y0, x0 = divmod(int(keys[0]), self._columns)
+        y1, x1 = divmod(int(keys[1]), self._columns)
+        rows = np.arange(y0, y1 + 1, dtype=np.int64) * self._columns
+        return np.searchsorted(self._cells, rows + x0, "left"), np.searchsorted(self._cells, rows + x1, "right")
+
+    def _base_slots(self, bbox: BoundingBox) -> np.ndarray:
+        return _ranges(*self._cell_ranges(bbox))
+
+    def _candidates(self, boxes: List[BoundingBox]) -> np.ndarray:
+        slots = np.concatenate([self._base_slots(box) for box in boxes] + [np.arange(self._base, self._size)])
+        return np.unique(slots) if len(boxes) > 1 else slots
+
+    def _match(self, slots: np.ndarray, code: Optional[int], bbox: Optional[BoundingBox] = None) -> np.ndarray:
+        keep = self._alive[slots]
+        if code is not None:
+            keep &= self._industry[slots] == code
+        if bbox is not None:
+            lon, lat = self._lon[slots], self._lat[slots]
+            keep &= (lon >= bbox.min_lon) & (lon <= bbox.max_lon) & (lat >= bbox.min_lat) & (lat <= bbox.max_lat)
+        return slots[keep]
+
+    def _distances(self, slots: np.ndarray, lon: float, lat: float) -> np.ndarray:
+        phi = math.radians(lat)
+        phis = np.radians(self._lat[slots])
+        half_dphi = (phis - phi) / 2
+        half_dlambda = np.radians(self._lon[slots] - lon) / 2
+        a = np.sin(half_dphi) ** 2 + math.cos(phi) * np.cos(phis) * np.sin(half_dlambda) ** 2
+        return 2 * EARTH_RADIUS_M * np.arcsin(np.sqrt(np.minimum(a, 1.0)))
+
+    @staticmethod
+    def _closest(distances: np.ndarray, k: int) -> np.ndarray:
+        # Positions of the k smallest distances, in ascending order
+        if len(distances) > k:
+            nearest = np.argpartition(distances, k - 1)[:k]
+            return nearest[np.argsort(distances[nearest], kind="stable")]
+        return np.argsort(distances, kind="stable")
+
+    def _companies(self, slots: np.ndarray) -> List[dict]:
+        """
+        ``CompanyOut`` dicts for ``slots``, built column by column, with keys
+        in the order the database path returns them.
+        """
+        industries = self._industries
+        return [
+            {"name": name, "industry": industries[code], "address": address,
+             "latitude": latitude, "longitude": longitude, "id": company_id}
+            for name, code, address, latitude, longitude, company_id in zip(
+                self._names.values(slots), self._industry[slots].tolist(), self._addresses.values(slots),
+                self._lat[slots].tolist(), self._lon[slots].tolist(), self._ids[slots].tolist(),
+            )
+        ]
+
+    def _with_distances(self, slots: np.ndarray, distances: np.ndarray) -> List[dict]:
+        companies = self._companies(slots)
+        for company, distance in zip(companies, distances.tolist()):
+            company["distance_m"] = distance
+        return companies
+
+    def _list_slots(self, viewport: Optional[BoundingBox], industry: Optional[str],
+                    after_id: Optional[int], limit: Optional[int]) -> np.ndarray:
+        """
+        Slots of the companies matching the list endpoint filters, ordered by ID.
+        """
+        any_match, code = self._code_filter(industry)
+        if not any_match:
+            return _EMPTY
+
+        tail = self._match(np.arange(self._base, self._size), code, viewport)
+        in_cells = 0
+        if viewport is not None:
+            starts, ends = self._cell_ranges(viewport)
+            in_cells = int((ends - starts).sum())
+        # A page of a large viewport is cheaper to find by walking IDs (about
+        # limit * base / in_cells rows) than by sorting every row in it
+        if viewport is None or (limit is not None and in_cells ** 2 > limit * self._base):
+            # Base slots are walked in ID order, so only the first ``limit`` matches are needed
+            start = 0 if after_id is None else int(np.searchsorted(self._base_ids, after_id, "right"))
+            candidates = self._base_by_id[start:]
+            window = len(candidates) if limit is None else limit
+            while True:
+                base = self._match(candidates[:window], code, viewport)
+                if limit is None or len(base) >= limit or window >= len(candidates):
+                    break
+                window *= 4
+            if limit is not None:
+                base = base[:limit]
+        else:
+            base = self._match(_ranges(starts, ends), code, viewport)
+            if after_id is not None:
+                base = base[self._ids[base] > after_id]
+            base = base[np.argsort(self._ids[base], kind="stable")]
+        if after_id is not None:
+            tail = tail[self._ids[tail] > after_id]
+        if len(tail):
+            tail = tail[np.argsort(self._ids[tail], kind="stable")]
+            base = np.insert(base, np.searchsorted(self._ids[base], self._ids[tail]), tail)
+        if limit is not None:
+            base = base[:limit]
+        return base
+
+    def list_json(self, viewport: Optional[BoundingBox], industry: Optional[str],
+                  after_id: Optional[int], limit: Optional[int]) -> Tuple[bytes, int, Optional[int]]:
+        """
+        Companies matching the list endpoint filters, ordered by ID.
+
+        Returns:
+            Tuple of the JSON array body, the number of companies and the last ID
+        """
+        slots = self._list_slots(viewport, industry, after_id, limit)
+        body = orjson.dumps(self._companies(slots))
+        return body, len(slots), int(self._ids[slots[-1]]) if len(slots) else None
+
+    def list_columnar(self, viewport: Optional[BoundingBox], industry: Optional[str],
+                      after_id: Optional[int], limit: Optional[int],
+                      columns: Sequence[str], coordinate_type: str) -> Tuple[bytes, int, Optional[int]]:
+        """
+        Companies matching the list endpoint filters, ordered by ID, as a
+        columnar payload (see ``app.columnar``) sliced from the column arrays.
+
+        Returns:
+            Tuple of the payload, the number of companies and the last ID
+        """
+        slots = self._list_slots(viewport, industry, after_id, limit)
+        writer = ColumnarWriter(len(slots))
+        writer.add_array("id", self._ids[slots], "int32")
+        for column in columns:
+            if column == "latitude":
+                writer.add_array(column, self._lat[slots], coordinate_type)
+            elif column == "longitude":
+                writer.add_array(column, self._lon[slots], coordinate_type)
+            elif column == "industry":
+                codes, index = np.unique(self._industry[slots], return_inverse=True)
+                writer.add_dictionary(column, index, [self._industries[code] for code in codes.tolist()])
+            elif column == "name":
+                writer.add_strings(column, *self._names.joined(slots))
+        return writer.tobytes(), len(slots), int(self._ids[slots[-1]]) if len(slots) else None
+
+    def points(self, bbox: BoundingBox, industry: Optional[str]) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Longitudes and latitudes of the companies inside ``bbox``.
+        """
+        any_match, code = self._code_filter(industry)
+        if not any_match:
+            return np.empty(0), np.empty(0)
+        slots = self._match(self._candidates([bbox]), code, bbox)
+        return self._lon[slots], self._lat[slots]
+
+    def nearest(self, lon: float, lat: float, k: int, industry: Optional[str]) -> List[dict]:
+        """
+        The ``k`` companies closest to a point, nearest first.
+
+        Searches a box around the point that doubles until its inscribed
+        circle holds ``k`` candidates, or until it spans the globe.
+        """
+        any_match, code = self._code_filter(industry)
+        if not any_match or self._live == 0:
+            return []
+
+        cos_lat = math.cos(math.radians(lat))
+        half = self.cell_degrees
+        while True:
+            spans_globe = half >= 180
+            slots = self._match(self._candidates(_boxes(lon, lat, half, half)), code)
+            if len(slots) < k and not spans_globe:
+                half *= 2
+                continue
+            distances = self._distances(slots, lon, lat)
+            order = self._closest(distances, k)
+            if spans_globe:
+                return self._with_distances(slots[order], distances[order])
+            # Anything outside the box is farther than the nearer of its
+            # edges: the parallel ``half`` degrees away or the meridian
+            covered = EARTH_RADIUS_M * min(
+                math.radians(half), math.asin(cos_lat * math.sin(math.radians(min(half, 90))))
+            )
+            kth = distances[order[-1]] / EARTH_RADIUS_M
+            if kth * EARTH_RADIUS_M <= covered:
+                return self._with_distances(slots[order], distances[order])
+            # The k-th candidate bounds the answer: grow the box to cover it
+            if cos_lat <= math.sin(kth):
+                half = 180.0
+            else:
+                half = max(2 * half, math.degrees(kth), math.degrees(math.asin(math.sin(kth) / cos_lat))) * 1.000001
+
+    def within(self, lon: float, lat: float, radius_m: float, industry: Optional[str], limit: int) -> List[dict]:
+        """
+        Companies within ``radius_m`` meters of a point, nearest first.
+        """
+        any_match, code = self._code_filter(industry)
+        if not any_match:
+            return []
+
+        angle = radius_m / EARTH_RADIUS_M
+        half_lat = math.degrees(angle)
+        cos_lat = math.cos(math.radians(lat))
+        if abs(lat) + half_lat >= 90 or math.sin(angle) >= cos_lat:
+            half_lon = 180.0
+        else:
+            half_lon = math.degrees(math.asin(math.sin(angle) / cos_lat))
+
+        slots = self._match(self._candidates(_boxes(lon, lat, half_lon, half_lat)), code)
+        distances = self._distances(slots, lon, lat)
+        inside = distances <= radius_m
+        slots, distances = slots[inside], distances[inside]
+        order = self._closest(distances, limit)
+        return self._with_distances(slots[order], distances[order])
+
+    # Loading
+
+    def text_bytes(self) -> int:
+        """
+        Bytes held by the name and address columns, a part of ``memory_bytes``.
+        """
+        return self._names.nbytes + self._addresses.nbytes
+
+    def memory_bytes(self) -> int:
+        arrays = (self._ids, self._lon, self._lat, self._industry, self._alive,
+                  self._cells, self._base_by_id, self._base_ids)
+        return sum(array.nbytes for array in arrays) + self.text_bytes() + sys.getsizeof(self._tail)
+
+    def status(self) -> dict:
+        staleness = self.staleness()
+        return {
+            "enabled": SNAPSHOT_ENABLED,
+            "ready": self.ready,
+            "serving": self.usable(),
+            "companies": self._live,
+            "industries": len(self._industries),
+            "memory_bytes": self.memory_bytes(),
+            "text_bytes": self.text_bytes(),
+            "unindexed_rows": self._size - self._base,
+            "cell_size": self.cell_degrees,
+            "version": self.version,
+            "loaded_at": self.loaded_at,
+            "staleness_seconds": round(staleness, 3) if staleness is not None else None,
+        }
+
+    async def start(self):
+        """
+        Start loading in the background; a no-op unless enabled.
+        """
+        if not SNAPSHOT_ENABLED:
+            return
+        if not change_feed.running:
+            logger.warning("Company snapshot needs the change feed to stay current; serving reads from the database")
+            return
+        change_feed.add_listener(self.apply)
+        self._start_load()
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def _start_load(self):
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._load_until_ready())
+
+    async def _load_until_ready(self):
+        while not self.ready:
+            try:
+                await self._load()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error("Failed to load company snapshot, retrying: %s", e)
+                await asyncio.sleep(SNAPSHOT_RETRY_SECONDS)
+
+    async def _load(self):
+        start = time.perf_counter()
+        ids, lons, lats, industries, names, addresses = [], [], [], [], [], []
+        # Always the primary: feed versions are its transaction IDs
+        db = database.open_async_session()
+        try:
+            version = await current_version(db)
+            after_id = 0
+            while True:
+                rows = (await db.execute(
+                    select(*models.COMPANY_OUT_COLUMNS)
+                    .filter(models.Company.id > after_id)
+                    .order_by(models.Company.id)
+                    .limit(SNAPSHOT_LOAD_BATCH_SIZE)
+                )).all()
+                for row in rows:
+                    ids.append(row.id)
+                    lons.append(row.longitude)
+                    lats.append(row.latitude)
+                    industries.append(self._industry_code(row.industry))
+                    names.append(row.name)
+                    addresses.append(row.address)
+                if len(rows) < SNAPSHOT_LOAD_BATCH_SIZE:
+                    break
+                after_id = rows[-1].id
+
+            # Rows written while paging are replayed from the change log
+            change_set = await read_changes(db, version)
+            if change_set.reset:
+                raise RuntimeError("too many changes while loading")
+            # No awaits from here on, so no feed change set can slip in between
+            self._set_base(
+                np.array(ids, dtype=np.int64), np.array(lons, dtype=np.float64),
+                np.array(lats, dtype=np.float64), np.array(industries, dtype=np.int32),
+                _TextColumn.from_values(names), _TextColumn.from_values(addresses)
+            )
+            self.version = version
+            self.apply(change_set)
+            self.loaded_at = datetime.utcnow()
+            self.synced_at = time.monotonic()
+        finally:
+            await db.close()
+        logger.info(
+            "Loaded company snapshot: %s companies, %.1f MB in %.1fs",
+            self._live, self.memory_bytes() / 1e6, time.perf_counter() - start
+        )
+
+
+company_snapshot = CompanySnapshot()
+
+metrics.Gauge("company_snapshot_companies", "Companies held by the in-memory snapshot").add_callback(
+    lambda: [((), company_snapshot._live)] if company_snapshot.ready else []
+)
+metrics.Gauge("company_snapshot_memory_bytes", "Approximate memory used by the in-memory snapshot").add_callback(
+    lambda: [((), company_snapshot.memory_bytes())] if company_snapshot.ready else []
+)
+metrics.Gauge("company_snapshot_staleness_seconds", "Seconds since the change feed last synced the snapshot").add_callback(
+    lambda: [((), company_snapshot.staleness())] if company_snapshot.ready else []
+)
@@ -0,0 +1,74 @@
+from typing import NamedTuple
+from geoalchemy2 import Geography
+from sqlalchemy import cast, func
+
+# All stored geometries use WGS 84 lon/lat
+SRID = 4326
+
+
+class BoundingBox(NamedTuple):
+    min_lon: float
+    min_lat: float
+    max_lon: float
+    max_lat: float
+
+
+def parse_bbox(value: str) -> BoundingBox:
+    """
+    Parse a ``minLon,minLat,maxLon,maxLat`` query string value.
+
+    Args:
+        value (str): Comma separated bounding box
+
+    Returns:
+        BoundingBox: Parsed and range-checked bounding box
+
+    Raises:
+        ValueError: If the value is malformed or out of range
+    """
+    parts = value.split(",")
+    if len(parts) != 4:
+        raise ValueError("bbox must have the form minLon,minLat,maxLon,maxLat")
+    try:
+        bbox = BoundingBox(*(float(part) for part in parts))
+    except ValueError:
+        raise ValueError("bbox values must be numbers")
+
+    if not (-180 <= bbox.min_lon <= 180 and -180 <= bbox.max_lon <= 180):
+        raise ValueError("bbox longitudes must be between -180 and 180 degrees")
+    if not (-90 <= bbox.min_lat <= 90 and -90 <= bbox.max_lat <= 90):
+        raise ValueError("bbox latitudes must be between -90 and 90 degrees")
+    if bbox.min_lon > bbox.max_lon or bbox.min_lat > bbox.max_lat:
+        raise ValueError("bbox minimum values must not exceed maximum values")
+    return bbox
+
+
+def envelope(bbox: BoundingBox):
+    """
+    Build an ``ST_MakeEnvelope`` polygon for a bounding box.
+    """
+    return func.ST_MakeEnvelope(bbox.min_lon, bbox.min_lat, bbox.max_lon, bbox.max_lat, SRID)
+
+
+def bbox_filter(column, bbox: BoundingBox):
+    """
+    Index-assisted ``&&`` (bounding box intersects) filter for a geometry column.
+    """
+    return column.op("&&")(envelope(bbox))
+
+
+def make_point(longitude: float, latitude: float):
+    """
+    Build a WGS 84 point geometry from coordinates.
+    """
+    return func.ST_SetSRID(func.ST_MakePoint(longitude, latitude), SRID)
+
+
+def geography(expr):
+    """
+    Cast a point geometry to geography for distances in meters.
+
+    The company geography index is built on exactly this expression, so
+    queries must use this helper for the planner to pick the index.
+    """
+    return cast(expr, Geography(geometry_type="POINT", srid=SRID, spatial_index=False))
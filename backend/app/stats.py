@@ -0,0 +1,105 @@
+"""
+Company counts per industry and coarse grid cell.
+
+``company_stats`` holds one row per (industry, cell) with a count. It is
+kept up to date by statement-level triggers on ``companies`` that read the
+transition tables (created by the Alembic migrations), so every write path (the API, batches, ``COPY`` imports,
+manual SQL) adjusts it by the net change of the statement; name or address
+edits change nothing. Facet queries then aggregate over occupied cells
+instead of scanning companies.
+
+Usage:
+    python -m app.stats check      # compare with a fresh aggregate, exit 1 on drift
+    python -m app.stats rebuild    # recompute from companies
+"""
+import argparse
+import logging
+import sys
+from typing import List, Tuple
+
+from sqlalchemy import text
+
+logger = logging.getLogger(__name__)
+
+# Side of a stats cell in degrees; the triggers use the same size, so changing it
+# takes a migration replacing company_stats_apply() and a rebuild
+STATS_CELL_DEGREES = 1.0
+
+_CELL_X = f"floor(longitude / {STATS_CELL_DEGREES})::int"
+_CELL_Y = f"floor(latitude / {STATS_CELL_DEGREES})::int"
+
+AGGREGATE_SQL = f"""
+    SELECT industry, {_CELL_X} AS cell_x, {_CELL_Y} AS cell_y, count(*) AS count
+    FROM companies
+    GROUP BY 1, 2, 3
+"""
+
+# Blocks writers while rebuilding so no trigger delta lands between the two statements
+LOCK_SQL = "LOCK TABLE companies IN SHARE MODE"
+
+REBUILD_SQL = f"INSERT INTO company_stats (industry, cell_x, cell_y, count) {AGGREGATE_SQL}"
+
+CHECK_SQL = f"""
+    SELECT coalesce(s.industry, a.industry) AS industry,
+           coalesce(s.cell_x, a.cell_x) AS cell_x,
+           coalesce(s.cell_y, a.cell_y) AS cell_y,
+           coalesce(s.count, 0) AS stored,
+           coalesce(a.count, 0) AS actual
+    FROM company_stats s
+    FULL JOIN ({AGGREGATE_SQL}) AS a
+      ON s.industry = a.industry AND s.cell_x = a.cell_x AND s.cell_y = a.cell_y
+    WHERE coalesce(s.count, 0) <> coalesce(a.count, 0)
+"""
+
+
+def _rebuild(connection) -> int:
+    connection.execute(text(LOCK_SQL))
+    connection.execute(text("DELETE FROM company_stats"))
+    rows = connection.execute(text(REBUILD_SQL)).rowcount
+    logger.info("Rebuilt company stats: %s industry/cell rows", rows)
+    return rows
+
+
+def rebuild(engine) -> int:
+    """
+    Recompute ``company_stats`` from ``companies`` in one transaction.
+
+    Returns:
+        int: Number of stats rows written
+    """
+    with engine.begin() as connection:
+        return _rebuild(connection)
+
+
+def check(engine) -> List[Tuple[str, int, int, int, int]]:
+    """
+    Compare ``company_stats`` with a fresh aggregate of ``companies``.
+
+    Returns:
+        List of (industry, cell_x, cell_y, stored, actual) for rows that differ
+    """
+    with engine.connect() as connection:
+        return [tuple(row) for row in connection.execute(text(CHECK_SQL))]
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Check or rebuild the company stats table.")
+    parser.add_argument("command", choices=("check", "rebuild"))
+    args = parser.parse_args(argv)
+
+    from app.database import engine
+
+    if args.command == "rebuild":
+        print(f"Rebuilt {rebuild(engine)} stats rows")
+        return 0
+
+    drift = check(engine)
+    for industry, cell_x, cell_y, stored, actual in drift:
+        print(f"{industry!r} cell ({cell_x}, {cell_y}): stored {stored}, actual {actual}")
+    print("company_stats is consistent" if not drift else f"{len(drift)} stats rows differ; run: python -m app.stats rebuild")
+    return 0 if not drift else 1
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    sys.exit(main())
@@ -0,0 +1,295 @@
+"""
+Non-blocking, structured logging with request IDs and sampling.
+
+``configure_logging`` gives the root logger a single ``QueueHandler``, so a
+request only appends the record to a bounded queue; a ``QueueListener``
+thread formats it (one JSON object per line by default) and writes it.
+The handler renders the message and any traceback before queueing, so the
+record no longer refers to objects request code may change afterwards.
+Records filtered out are never rendered, so call sites pass arguments
+(``logger.info("Retrieved %d companies", count)``) rather than f-strings.
+Uvicorn's own and access loggers are routed through the same queue.
+
+``RequestContextMiddleware`` gives each request an ID, taken from a valid
+``X-Request-ID`` header or generated, returns it in ``X-Request-ID`` and
+stamps it on every record logged while the request is handled.
+
+Records below WARNING logged during a request are sampled per route
+template with ``LOG_SAMPLE_RATES`` (``LOG_SAMPLE_RATE`` for other routes).
+The decision is made once per request, so a sampled request keeps all of
+its lines. Warnings and errors are always kept. If the queue is full,
+records below ERROR are dropped and counted rather than waited for;
+errors wait up to ``LOG_QUEUE_ERROR_TIMEOUT`` before being dropped too.
+"""
+import atexit
+import contextvars
+import copy
+import logging
+import os
+import queue
+import random
+import re
+import sys
+import uuid
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener
+from typing import Dict, Optional
+
+import orjson
+
+from app import metrics
+
+# Root log level
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
+
+# "json" for one JSON object per line, "text" for plain lines
+LOG_FORMAT = os.getenv("LOG_FORMAT", "json").lower()
+
+# Records buffered between request code and the writer thread
+LOG_QUEUE_SIZE = int(os.getenv("LOG_QUEUE_SIZE", "10000"))
+
+# Seconds an ERROR record may wait for room in a full queue before it is dropped
+LOG_QUEUE_ERROR_TIMEOUT = float(os.getenv("LOG_QUEUE_ERROR_TIMEOUT", "0.1"))
+
+# Share of requests whose success-path (below WARNING) records are kept
+LOG_SAMPLE_RATE = float(os.getenv("LOG_SAMPLE_RATE", "1.0"))
+
+# Per-route overrides as "[METHOD ]route template=rate" pairs, comma-separated, e.g.
+# "GET /api/v1/companies=0.01,/api/v1/tiles/{z}/{x}/{y}.mvt=0"
+LOG_SAMPLE_RATES = os.getenv("LOG_SAMPLE_RATES", "")
+
+REQUEST_ID_HEADER = "X-Request-ID"
+
+TEXT_FORMAT = "%(asctime)s %(levelname)s %(name)s [%(request_id)s] %(message)s"
+
+# Incoming request IDs are echoed into logs and headers, so only accept safe ones
+_REQUEST_ID_RE = re.compile(r"^[A-Za-z0-9._:-]{1,128}$")
+
+# Attributes every LogRecord has; anything else was passed in ``extra``
+_RECORD_ATTRIBUTES = frozenset(vars(logging.LogRecord("", 0, "", 0, "", (), None))) | {"message", "asctime", "request_id"}
+
+LOG_RECORDS_DROPPED = metrics.Counter(
+    "log_records_dropped_total", "Log records not written, by reason (sampled, queue_full)", ("reason",)
+)
+
+
+class RequestContext:
+    """Request ID and sampling decision for the request being handled."""
+
+    __slots__ = ("request_id", "scope", "sampled")
+
+    def __init__(self, request_id: str, scope: dict):
+        self.request_id = request_id
+        self.scope = scope
+        self.sampled: Optional[bool] = None
+
+
+_request_context: contextvars.ContextVar[Optional[RequestContext]] = contextvars.ContextVar("request_context", default=None)
+
+
+def current_request_id() -> Optional[str]:
+    """
+    The ID of the request being handled, or None outside a request.
+    """
+    context = _request_context.get()
+    return context.request_id if context is not None else None
+
+
+def parse_sample_rates(value: str) -> Dict[str, float]:
+    """
+    Parse ``LOG_SAMPLE_RATES`` into a mapping of ``"METHOD route"`` or
+    ``"route"`` to a rate between 0 and 1.
+    """
+    rates = {}
+    for item in value.split(","):
+        route, _, rate = item.strip().rpartition("=")
+        if not route:
+            continue
+        try:
+            rates[route.strip()] = min(max(float(rate), 0.0), 1.0)
+        except ValueError:
+            raise ValueError(f"Invalid LOG_SAMPLE_RATES entry {item.strip()!r}, expected route=rate")
+    return rates
+
+
+_sample_rates = parse_sample_rates(LOG_SAMPLE_RATES)
+
+
+def sample_rate(method: str, route: Optional[str]) -> float:
+    if route is None:
+        return LOG_SAMPLE_RATE
+    rate = _sample_rates.get(f"{method} {route}")
+    if rate is None:
+        rate = _sample_rates.get(route, LOG_SAMPLE_RATE)
+    return rate
+
+
+class RequestContextFilter(logging.Filter):
+    """
+    Stamp records with the request ID and drop unsampled success-path
+    records. Runs in the thread that logs, where the request context is visible.
+    """
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        context = _request_context.get()
+        if context is None:
+            record.request_id = None
+            return True
+        record.request_id = context.request_id
+        if record.levelno >= logging.WARNING:
+            return True
+        if context.sampled is None:
+            # Routing has happened by the time handlers log, so the route template is known
+            route = getattr(context.scope.get("route"), "path", None)
+            context.sampled = random.random() < sample_rate(context.scope.get("method", ""), route)
+        if not context.sampled:
+            LOG_RECORDS_DROPPED.inc("sampled")
+        return context.sampled
+
+
+class NonBlockingQueueHandler(QueueHandler):
+    """
+    ``QueueHandler`` that queues a self-contained copy of each record and
+    does not wait on a full queue: records below ERROR are dropped at once,
+    errors after ``LOG_QUEUE_ERROR_TIMEOUT``.
+    """
+
+    _exception_formatter = logging.Formatter()
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # Render now: arguments and tracebacks may be mutated or freed before the listener runs.
+        # Layout (JSON or text) is still applied in the listener thread.
+        record = copy.copy(record)
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            if not record.exc_text:
+                record.exc_text = self._exception_formatter.formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+    def enqueue(self, record: logging.LogRecord):
+        try:
+            self.queue.put_nowait(record)
+            return
+        except queue.Full:
+            pass
+        if record.levelno >= logging.ERROR:
+            try:
+                self.queue.put(record, timeout=LOG_QUEUE_ERROR_TIMEOUT)
+                return
+            except queue.Full:
+                pass
+        LOG_RECORDS_DROPPED.inc("queue_full")
+
+
+class JSONFormatter(logging.Formatter):
+    """
+    One JSON object per record: time, level, logger, message, request ID,
+    any ``extra`` fields and the formatted exception.
+    """
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "time": datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        request_id = getattr(record, "request_id", None)
+        if request_id is not None:
+            entry["request_id"] = request_id
+        for key, value in vars(record).items():
+            if key not in _RECORD_ATTRIBUTES:
+                entry[key] = value
+        if record.exc_info:
+            entry["exception"] = self.formatException(record.exc_info)
+        elif record.exc_text:
+            entry["exception"] = record.exc_text
+        if record.stack_info:
+            entry["stack"] = self.formatStack(record.stack_info)
+        return orjson.dumps(entry, default=str).decode()
+
+
+_listener: Optional[QueueListener] = None
+
+
+def configure_logging():
+    """
+    Route all logging through a queue to a writer thread. Safe to call more
+    than once; only the first call has an effect.
+    """
+    global _listener
+    if _listener is not None:
+        return
+
+    output = logging.StreamHandler(sys.stderr)
+    output.setFormatter(JSONFormatter() if LOG_FORMAT == "json" else logging.Formatter(TEXT_FORMAT))
+
+    log_queue: queue.Queue = queue.Queue(LOG_QUEUE_SIZE)
+    handler = NonBlockingQueueHandler(log_queue)
+    handler.addFilter(RequestContextFilter())
+
+    root = logging.getLogger()
+    for existing in root.handlers[:]:
+        root.removeHandler(existing)
+    root.addHandler(handler)
+    root.setLevel(LOG_LEVEL)
+
+    # Uvicorn installs its own synchronous handlers; send its records through the queue too
+    for name in ("uvicorn", "uvicorn.error", "uvicorn.access"):
+        uvicorn_logger = logging.getLogger(name)
+        for existing in uvicorn_logger.handlers[:]:
+            uvicorn_logger.removeHandler(existing)
+        uvicorn_logger.propagate = True
+
+    _listener = QueueListener(log_queue, output)
+    _listener.start()
+    atexit.register(shutdown_logging)
+
+
+def shutdown_logging():
+    """
+    Write out queued records and stop the writer thread.
+    """
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+
+
+class RequestContextMiddleware:
+    """
+    ASGI middleware assigning each request an ID for log correlation and
+    returning it in the ``X-Request-ID`` response header.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        request_id = None
+        for name, value in scope.get("headers", ()):
+            if name == b"x-request-id":
+                candidate = value.decode("latin-1")
+                if _REQUEST_ID_RE.match(candidate):
+                    request_id = candidate
+                break
+        if request_id is None:
+            request_id = uuid.uuid4().hex
+        header = (b"x-request-id", request_id.encode("latin-1"))
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                message = {**message, "headers": [*message.get("headers", []), header]}
+            await send(message)
+
+        token = _request_context.set(RequestContext(request_id, scope))
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            _request_context.reset(token)
@@ -0,0 +1,196 @@
+import math
+import os
+import logging
+import tempfile
+import threading
+from collections import OrderedDict
+from typing import Iterable, Optional, Set, Tuple
+
+logger = logging.getLogger(__name__)
+
+TileKey = Tuple[int, int, int]
+
+# Highest zoom level served by the tile endpoint
+MAX_TILE_ZOOM = int(os.getenv("TILE_MAX_ZOOM", "22"))
+
+# Tolerance for points that sit exactly on a tile edge
+_EDGE_EPSILON = 1e-9
+
+
+def tiles_for_point(longitude: float, latitude: float, zooms: Iterable[int]) -> Set[TileKey]:
+    """
+    Return the XYZ tiles that contain a WGS 84 point at the given zoom levels.
+
+    Points lying on a tile edge belong to both neighbouring tiles, because
+    the tile query uses an inclusive ``&&`` against the tile envelope.
+    """
+    lat_rad = math.radians(max(min(latitude, 85.0511287798), -85.0511287798))
+    tiles = set()
+    for z in zooms:
+        n = 2 ** z
+        fx = (longitude + 180.0) / 360.0 * n
+        fy = (1.0 - math.asinh(math.tan(lat_rad)) / math.pi) / 2.0 * n
+        for x in _cell_candidates(fx, n):
+            for y in _cell_candidates(fy, n):
+                tiles.add((z, x, y))
+    return tiles
+
+
+def _cell_candidates(value: float, n: int) -> Set[int]:
+    cell = min(int(math.floor(value)), n - 1)
+    candidates = {cell}
+    if value - cell < _EDGE_EPSILON and cell > 0:
+        candidates.add(cell - 1)
+    if cell + 1 - value < _EDGE_EPSILON and cell + 1 < n:
+        candidates.add(cell + 1)
+    return candidates
+
+
+class TileCache:
+    """
+    LRU cache of rendered vector tiles bounded by total size in bytes.
+
+    An optional directory adds a file-backed second tier that survives
+    restarts and is shared by workers on the same host. Invalidation bumps
+    a generation counter so tiles rendered before a write are not cached
+    after it. Invalidation only reaches this process's memory tier.
+    """
+
+    def __init__(self, max_bytes: int, directory: Optional[str] = None):
+        self.max_bytes = max_bytes
+        self.directory = directory
+        self._tiles: "OrderedDict[TileKey, bytes]" = OrderedDict()
+        self._size = 0
+        self._generation = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @property
+    def generation(self) -> int:
+        return self._generation
+
+    def get(self, key: TileKey) -> Optional[bytes]:
+        with self._lock:
+            data = self._tiles.get(key)
+            if data is not None:
+                self._tiles.move_to_end(key)
+                self.hits += 1
+                return data
+
+        data = self._read_file(key)
+        if data is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        self._store(key, data)
+        return data
+
+    def put(self, key: TileKey, data: bytes, generation: int):
+        """
+        Cache a tile rendered while ``generation`` was current.
+        """
+        if generation != self._generation:
+            return
+        self._store(key, data)
+        self._write_file(key, data)
+
+    def invalidate_point(self, longitude: float, latitude: float):
+        """
+        Drop every cached tile, at every zoom level, that covers a point.
+        """
+        keys = tiles_for_point(longitude, latitude, range(MAX_TILE_ZOOM + 1))
+        with self._lock:
+            self._generation += 1
+            for key in keys:
+                data = self._tiles.pop(key, None)
+                if data is not None:
+                    self._size -= len(data)
+        for key in keys:
+            self._remove_file(key)
+
+    def clear(self):
+        """
+        Drop all cached tiles, e.g. after a bulk load.
+        """
+        with self._lock:
+            self._generation += 1
+            self._tiles.clear()
+            self._size = 0
+        if self.directory:
+            for root, _, files in os.walk(self.directory):
+                for name in files:
+                    if name.endswith(".mvt"):
+                        self._unlink(os.path.join(root, name))
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "tiles": len(self._tiles),
+                "bytes": self._size,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+            }
+
+    def _store(self, key: TileKey, data: bytes):
+        if len(data) > self.max_bytes:
+            return
+        with self._lock:
+            previous = self._tiles.pop(key, None)
+            if previous is not None:
+                self._size -= len(previous)
+            self._tiles[key] = data
+            self._size += len(data)
+            while self._size > self.max_bytes:
+                _, evicted = self._tiles.popitem(last=False)
+                self._size -= len(evicted)
+
+    def _path(self, key: TileKey) -> str:
+        z, x, y = key
+        return os.path.join(self.directory, str(z), str(x), f"{y}.mvt")
+
+    def _read_file(self, key: TileKey) -> Optional[bytes]:
+        if not self.directory:
+            return None
+        try:
+            with open(self._path(key), "rb") as f:
+                return f.read()
+        except FileNotFoundError:
+            return None
+        except OSError as e:
+            logger.warning("Failed to read cached tile %s: %s", key, e)
+            return None
+
+    def _write_file(self, key: TileKey, data: bytes):
+        if not self.directory:
+            return
+        path = self._path(key)
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            # Write to a temporary file first so readers never see partial tiles
+            fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+            with os.fdopen(fd, "wb") as f:
+                f.write(data)
+            os.replace(tmp_path, path)
+        except OSError as e:
+            logger.warning("Failed to write cached tile %s: %s", key, e)
+
+    def _remove_file(self, key: TileKey):
+        if self.directory:
+            self._unlink(self._path(key))
+
+    @staticmethod
+    def _unlink(path: str):
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+        except OSError as e:
+            logger.warning("Failed to remove cached tile %s: %s", path, e)
+
+
+tile_cache = TileCache(
+    max_bytes=int(os.getenv("TILE_CACHE_MAX_BYTES", str(64 * 1024 * 1024))),
+    directory=os.getenv("TILE_CACHE_DIR") or None,
+)
@@ -0,0 +1,124 @@
+"""
+Compare request throughput and tail latency of a running API at increasing
+concurrency, e.g. once with DB_ASYNC=true and once with DB_ASYNC=false.
+
+Usage:
+    python -m benchmarks.concurrency --base-url http://localhost:8000 \
+        --concurrency 16 64 256 --duration 20 --label async --output async.json
+    # Markdown table of saved runs side by side, for the README
+    python -m benchmarks.concurrency --table async.json sync.json
+"""
+import argparse
+import asyncio
+import json
+import random
+import time
+from typing import List
+
+import httpx
+
+
+def percentile(samples: List[float], pct: float) -> float:
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    index = min(int(round(pct / 100.0 * (len(ordered) - 1))), len(ordered) - 1)
+    return ordered[index]
+
+
+async def _worker(client: httpx.AsyncClient, paths: List[str], deadline: float, latencies: List[float], errors: List[int]):
+    while time.perf_counter() < deadline:
+        path = random.choice(paths)
+        start = time.perf_counter()
+        try:
+            response = await client.get(path)
+            if response.status_code >= 500:
+                errors.append(response.status_code)
+        except httpx.HTTPError:
+            errors.append(0)
+        latencies.append(time.perf_counter() - start)
+
+
+async def run_level(base_url: str, paths: List[str], concurrency: int, duration: float) -> dict:
+    latencies: List[float] = []
+    errors: List[int] = []
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    async with httpx.AsyncClient(base_url=base_url, limits=limits, timeout=60.0) as client:
+        deadline = time.perf_counter() + duration
+        await asyncio.gather(*(
+            _worker(client, paths, deadline, latencies, errors) for _ in range(concurrency)
+        ))
+    return {
+        "concurrency": concurrency,
+        "requests": len(latencies),
+        "errors": len(errors),
+        "rps": round(len(latencies) / duration, 1),
+        "p50_ms": round(percentile(latencies, 50) * 1000, 2),
+        "p99_ms": round(percentile(latencies, 99) * 1000, 2),
+    }
+
+
+async def _sample_paths(base_url: str, count: int) -> List[str]:
+    async with httpx.AsyncClient(base_url=base_url, timeout=60.0) as client:
+        response = await client.get("/api/v1/companies", params={"limit": count})
+        response.raise_for_status()
+        ids = [company["id"] for company in response.json()]
+    if not ids:
+        raise SystemExit("No companies found; seed the database first")
+    return [f"/api/v1/companies/{company_id}" for company_id in ids]
+
+
+def markdown_table(runs: List[dict]) -> str:
+    """
+    Render saved runs as a Markdown table with one row per concurrency level
+    and rps / p99 columns per run.
+    """
+    header = "| concurrency | " + " | ".join(f"{run['label']} rps | {run['label']} p99 ms" for run in runs) + " |"
+    lines = [header, "|" + "---|" * (1 + 2 * len(runs))]
+    levels = sorted({result["concurrency"] for run in runs for result in run["results"]})
+    for level in levels:
+        cells = []
+        for run in runs:
+            result = next((result for result in run["results"] if result["concurrency"] == level), None)
+            cells += [str(result["rps"]), str(result["p99_ms"])] if result else ["", ""]
+        lines.append(f"| {level} | " + " | ".join(cells) + " |")
+    return "\n".join(lines)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure requests/sec and p99 latency at increasing concurrency.")
+    parser.add_argument("--base-url", default="http://localhost:8000")
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[16, 64, 256])
+    parser.add_argument("--duration", type=float, default=20.0, help="Seconds per concurrency level")
+    parser.add_argument("--ids", type=int, default=1000, help="Number of company IDs to spread GET /companies/{id} over")
+    parser.add_argument("--label", default="", help="Label stored with the results, e.g. async or sync")
+    parser.add_argument("--output", help="Write the results as JSON to this file")
+    parser.add_argument("--table", nargs="+", metavar="RESULTS", help="Print saved results as a Markdown table and exit")
+    args = parser.parse_args()
+
+    if args.table:
+        runs = []
+        for path in args.table:
+            with open(path) as f:
+                runs.append(json.load(f))
+        print(markdown_table(runs))
+        return
+
+    paths = asyncio.run(_sample_paths(args.base_url, args.ids))
+    results = [
+        asyncio.run(run_level(args.base_url, paths, level, args.duration))
+        for level in args.concurrency
+    ]
+
+    print(f"{'concurrency':>11} {'rps':>10} {'p50 ms':>10} {'p99 ms':>10} {'errors':>8}")
+    for result in results:
+        print(f"{result['concurrency']:>11} {result['rps']:>10} {result['p50_ms']:>10} {result['p99_ms']:>10} {result['errors']:>8}")
+    report = {"label": args.label, "results": results}
+    print(json.dumps(report))
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,289 @@
+"""
+Drive a mixed create/read/update/delete workload against a running API and
+write a machine-readable report.
+
+Each worker picks an operation by weight: viewport lists around a seeded
+city, reads of existing IDs, creates, updates of existing IDs and deletes
+of companies the run itself created, so the dataset size stays stable. The
+report holds per-operation and overall throughput, p50/p95/p99 latency and
+error counts, plus the peak RSS of the server process when ``--server-pid``
+is given (Linux only) and of the load driver itself.
+
+Usage:
+    python -m benchmarks.synthetic --rows 1000000 --truncate
+    python -m benchmarks.load --base-url http://localhost:8000 --concurrency 64 \
+        --duration 60 --label main --output main.json
+    python -m benchmarks.load ... --label branch --output branch.json --baseline main.json
+"""
+import argparse
+import asyncio
+import json
+import platform
+import random
+import resource
+import subprocess
+import sys
+import time
+from collections import defaultdict
+from datetime import datetime, timezone
+from typing import Dict, List, Optional
+
+import httpx
+
+from benchmarks.concurrency import percentile
+from benchmarks.synthetic import CITIES, INDUSTRIES
+
+API_PREFIX = "/api/v1"
+
+# Default operation mix, as relative weights
+DEFAULT_MIX = {"list": 40, "get": 40, "create": 10, "update": 7, "delete": 3}
+
+# Half-size of the viewport requested by list operations, in degrees
+VIEWPORT_HALF_SIZE = 0.05
+
+# Seconds between server RSS samples
+RSS_SAMPLE_INTERVAL = 0.5
+
+
+class Workload:
+    """Shared state for one run: known IDs, samples and the operation mix."""
+
+    def __init__(self, ids: List[int], mix: Dict[str, int], page_size: int, seed: int):
+        self.ids = ids
+        self.created: List[int] = []
+        self.operations = list(mix)
+        self.weights = [mix[op] for op in self.operations]
+        self.page_size = page_size
+        self.rng = random.Random(seed)
+        self.latencies: Dict[str, List[float]] = defaultdict(list)
+        self.errors: Dict[str, int] = defaultdict(int)
+
+    def _company(self) -> dict:
+        city, lat, lng, _, spread = self.rng.choice(CITIES)
+        return {
+            "name": f"Bench {self.rng.randrange(10 ** 9)}",
+            "industry": self.rng.choice(INDUSTRIES),
+            "address": f"{self.rng.randint(1, 999)} Bench St, {city}",
+            "latitude": round(self.rng.gauss(lat, spread), 6),
+            "longitude": round(self.rng.gauss(lng, spread), 6),
+        }
+
+    def request(self, op: str) -> Optional[dict]:
+        """Build the request for ``op``, or None when it cannot run yet."""
+        if op == "list":
+            _, lat, lng, _, spread = self.rng.choice(CITIES)
+            lat, lng = self.rng.gauss(lat, spread), self.rng.gauss(lng, spread)
+            bbox = f"{lng - VIEWPORT_HALF_SIZE},{lat - VIEWPORT_HALF_SIZE},{lng + VIEWPORT_HALF_SIZE},{lat + VIEWPORT_HALF_SIZE}"
+            return {"method": "GET", "url": f"{API_PREFIX}/companies", "params": {"bbox": bbox, "limit": self.page_size}}
+        if op == "get":
+            return {"method": "GET", "url": f"{API_PREFIX}/companies/{self.rng.choice(self.ids)}"}
+        if op == "create":
+            return {"method": "POST", "url": f"{API_PREFIX}/companies", "json": self._company()}
+        if op == "update":
+            body = self._company()
+            del body["address"]
+            return {"method": "PUT", "url": f"{API_PREFIX}/companies/{self.rng.choice(self.ids)}", "json": body}
+        if op == "delete":
+            if not self.created:
+                return None
+            company_id = self.created.pop(self.rng.randrange(len(self.created)))
+            return {"method": "DELETE", "url": f"{API_PREFIX}/companies/{company_id}"}
+        raise ValueError(f"Unknown operation: {op}")
+
+
+async def _worker(client: httpx.AsyncClient, workload: Workload, deadline: float):
+    while time.perf_counter() < deadline:
+        op = workload.rng.choices(workload.operations, workload.weights)[0]
+        request = workload.request(op)
+        if request is None:
+            continue
+        start = time.perf_counter()
+        try:
+            response = await client.request(**request)
+            ok = response.status_code < 400
+        except httpx.HTTPError:
+            response, ok = None, False
+        workload.latencies[op].append(time.perf_counter() - start)
+        if not ok:
+            workload.errors[op] += 1
+        elif op == "create":
+            workload.created.append(response.json()["id"])
+
+
+def _read_rss_kb(pid: int) -> Optional[int]:
+    """Current resident set size of ``pid`` in KiB, from /proc."""
+    try:
+        with open(f"/proc/{pid}/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1])
+    except OSError:
+        return None
+    return None
+
+
+async def _sample_rss(pid: int, peak: List[int], stop: asyncio.Event):
+    while not stop.is_set():
+        rss = _read_rss_kb(pid)
+        if rss is not None and rss > peak[0]:
+            peak[0] = rss
+        try:
+            await asyncio.wait_for(stop.wait(), RSS_SAMPLE_INTERVAL)
+        except asyncio.TimeoutError:
+            pass
+
+
+def _summary(latencies: List[float], errors: int, duration: float) -> dict:
+    return {
+        "requests": len(latencies),
+        "errors": errors,
+        "rps": round(len(latencies) / duration, 1),
+        "p50_ms": round(percentile(latencies, 50) * 1000, 2),
+        "p95_ms": round(percentile(latencies, 95) * 1000, 2),
+        "p99_ms": round(percentile(latencies, 99) * 1000, 2),
+    }
+
+
+async def run(base_url: str, ids: List[int], mix: Dict[str, int], concurrency: int, duration: float,
+              page_size: int, seed: int, server_pid: Optional[int] = None) -> dict:
+    """Run the workload for ``duration`` seconds and return the results section of the report."""
+    workload = Workload(ids, mix, page_size, seed)
+    peak_rss = [0]
+    stop = asyncio.Event()
+    sampler = asyncio.ensure_future(_sample_rss(server_pid, peak_rss, stop)) if server_pid else None
+
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    async with httpx.AsyncClient(base_url=base_url, limits=limits, timeout=60.0) as client:
+        start = time.perf_counter()
+        deadline = start + duration
+        await asyncio.gather(*(_worker(client, workload, deadline) for _ in range(concurrency)))
+        elapsed = time.perf_counter() - start
+
+        # Remove what the run created so repeated runs see the same dataset
+        for company_id in workload.created:
+            await client.delete(f"{API_PREFIX}/companies/{company_id}")
+
+    if sampler is not None:
+        stop.set()
+        await sampler
+
+    all_latencies = [sample for samples in workload.latencies.values() for sample in samples]
+    return {
+        "overall": _summary(all_latencies, sum(workload.errors.values()), elapsed),
+        "operations": {
+            op: _summary(workload.latencies[op], workload.errors[op], elapsed)
+            for op in workload.operations
+        },
+        "server_peak_rss_mb": round(peak_rss[0] / 1024, 1) if server_pid else None,
+        # ru_maxrss is KiB on Linux and bytes on macOS
+        "client_peak_rss_mb": round(
+            resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / (1024 * 1024 if sys.platform == "darwin" else 1024), 1
+        ),
+    }
+
+
+async def _sample_ids(base_url: str, count: int) -> List[int]:
+    ids: List[int] = []
+    async with httpx.AsyncClient(base_url=base_url, timeout=60.0) as client:
+        after_id = 0
+        while len(ids) < count:
+            response = await client.get(
+                f"{API_PREFIX}/companies",
+                params={"limit": min(count - len(ids), 1000), "after_id": after_id}
+            )
+            response.raise_for_status()
+            page = [company["id"] for company in response.json()]
+            if not page:
+                break
+            ids.extend(page)
+            after_id = page[-1]
+    if not ids:
+        raise SystemExit("No companies found; seed the database first with benchmarks.synthetic")
+    return ids
+
+
+def _git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def _parse_mix(value: str) -> Dict[str, int]:
+    mix = {}
+    for part in value.split(","):
+        op, _, weight = part.partition("=")
+        if op not in DEFAULT_MIX or not weight.isdigit():
+            raise argparse.ArgumentTypeError(f"expected op=weight with op in {', '.join(DEFAULT_MIX)}, got {part!r}")
+        mix[op] = int(weight)
+    return mix
+
+
+def compare(report: dict, baseline: dict) -> List[str]:
+    """Format per-operation throughput and p99 changes against a baseline report."""
+    lines = [f"{'operation':>10} {'rps':>10} {'Δ rps':>8} {'p99 ms':>10} {'Δ p99':>8}"]
+    sections = {"overall": report["results"]["overall"], **report["results"]["operations"]}
+    base_sections = {"overall": baseline["results"]["overall"], **baseline["results"]["operations"]}
+    for name, current in sections.items():
+        base = base_sections.get(name)
+        if not base:
+            continue
+        rps_delta = (current["rps"] / base["rps"] - 1) * 100 if base["rps"] else 0.0
+        p99_delta = (current["p99_ms"] / base["p99_ms"] - 1) * 100 if base["p99_ms"] else 0.0
+        lines.append(f"{name:>10} {current['rps']:>10} {rps_delta:>+7.1f}% {current['p99_ms']:>10} {p99_delta:>+7.1f}%")
+    return lines
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run a mixed CRUD load test and write a JSON report.")
+    parser.add_argument("--base-url", default="http://localhost:8000")
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--duration", type=float, default=30.0, help="Seconds to run the workload")
+    parser.add_argument("--mix", type=_parse_mix, default=DEFAULT_MIX,
+                        help="Operation weights, e.g. list=40,get=40,create=10,update=7,delete=3")
+    parser.add_argument("--ids", type=int, default=10000, help="Number of existing company IDs to read and update")
+    parser.add_argument("--page-size", type=int, default=100, help="limit for list operations")
+    parser.add_argument("--seed", type=int, default=1, help="Random seed for the request sequence")
+    parser.add_argument("--server-pid", type=int, help="PID of the API process to sample peak RSS from")
+    parser.add_argument("--label", default="", help="Label stored with the report, e.g. a branch name")
+    parser.add_argument("--output", help="Write the JSON report to this file instead of stdout")
+    parser.add_argument("--baseline", help="Earlier report to compare throughput and p99 against")
+    args = parser.parse_args()
+
+    ids = asyncio.run(_sample_ids(args.base_url, args.ids))
+    results = asyncio.run(run(
+        args.base_url, ids, args.mix, args.concurrency, args.duration, args.page_size, args.seed, args.server_pid
+    ))
+    report = {
+        "label": args.label,
+        "timestamp": datetime.now(timezone.utc).isoformat(),
+        "git_commit": _git_commit(),
+        "python": platform.python_version(),
+        "config": {
+            "base_url": args.base_url,
+            "concurrency": args.concurrency,
+            "duration": args.duration,
+            "mix": args.mix,
+            "sampled_ids": len(ids),
+            "page_size": args.page_size,
+            "seed": args.seed,
+        },
+        "results": results,
+    }
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+    else:
+        print(json.dumps(report, indent=2))
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        print("\n".join(compare(report, baseline)), file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,77 @@
+"""
+Compare the per-row Pydantic serialization of the company list with the
+column-tuple + orjson fast path, without a database.
+
+The ORM path mirrors what FastAPI does for ``response_model=List[CompanyOut]``:
+validate every row through ``CompanyOut`` with ``orm_mode``, run
+``jsonable_encoder`` and render with ``json.dumps``.
+
+Usage:
+    python -m benchmarks.serialization --rows 10000 100000
+"""
+import argparse
+import json
+import random
+import time
+
+from fastapi.encoders import jsonable_encoder
+
+from app import models, schemas
+from app.routers.companies import _rows_to_json
+
+KEYS = [column.key for column in models.COMPANY_OUT_COLUMNS]
+
+
+def make_rows(count: int):
+    rng = random.Random(42)
+    return [
+        (
+            f"Company {i}",
+            rng.choice(["Technology", "Finance", "Retail", "Health", "Energy"]),
+            f"{i} Main St" if i % 3 else None,
+            rng.uniform(-60, 60),
+            rng.uniform(-180, 180),
+            i + 1,
+        )
+        for i in range(count)
+    ]
+
+
+def orm_path(objects) -> bytes:
+    validated = [schemas.CompanyOut.from_orm(obj) for obj in objects]
+    content = jsonable_encoder(validated)
+    return json.dumps(content, ensure_ascii=False, allow_nan=False, indent=None, separators=(",", ":")).encode("utf-8")
+
+
+def fast_path(rows) -> bytes:
+    return _rows_to_json(rows, KEYS)
+
+
+def best_of(fn, arg, repeat: int) -> float:
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn(arg)
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark company list serialization paths.")
+    parser.add_argument("--rows", type=int, nargs="+", default=[10000, 100000])
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    print(f"{'rows':>8} {'orm+pydantic ms':>16} {'tuples+orjson ms':>17} {'speedup':>8}")
+    for count in args.rows:
+        rows = make_rows(count)
+        objects = [models.Company(**dict(zip(KEYS, row))) for row in rows]
+        assert json.loads(orm_path(objects)) == json.loads(fast_path(rows))
+
+        slow = best_of(orm_path, objects, args.repeat)
+        fast = best_of(fast_path, rows, args.repeat)
+        print(f"{count:>8} {slow * 1000:>16.1f} {fast * 1000:>17.1f} {slow / fast:>7.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,46 @@
+"""
+Alembic environment: migrates ``DATABASE_URL`` (the primary) with the app's
+models as the autogenerate target.
+"""
+from logging.config import fileConfig
+
+from alembic import context
+from sqlalchemy import create_engine
+from sqlalchemy.pool import NullPool
+
+from app import models  # noqa: F401 - registers the tables on Base.metadata
+from app.database import SQLALCHEMY_DATABASE_URL, Base
+
+config = context.config
+
+if config.config_file_name is not None:
+    fileConfig(config.config_file_name)
+
+target_metadata = Base.metadata
+
+
+def include_name(name, type_, parent_names) -> bool:
+    # Leave PostGIS's own tables (spatial_ref_sys, tiger, topology) alone
+    if type_ == "table":
+        return name in target_metadata.tables
+    return True
+
+
+def run_migrations_online():
+    connectable = create_engine(SQLALCHEMY_DATABASE_URL, poolclass=NullPool)
+    with connectable.connect() as connection:
+        context.configure(
+            connection=connection,
+            target_metadata=target_metadata,
+            include_name=include_name,
+            # CONCURRENTLY index builds step out of the transaction; keep the others short
+            transaction_per_migration=True,
+        )
+        with context.begin_transaction():
+            context.run_migrations()
+
+
+if context.is_offline_mode():
+    # Migrations inspect the database (stats backfill, invalid index rebuilds)
+    raise SystemExit("Offline (--sql) migrations are not supported; run them against the database")
+run_migrations_online()
@@ -0,0 +1,246 @@
+"""Initial schema: tables, small indexes and triggers
+
+Replaces the ``create_all`` the app used to run on every startup. Every step
+is idempotent, so databases created that way upgrade in place.
+
+The trigger SQL is a frozen copy of what the app installed at the time;
+later changes to the triggers ship as new revisions, not edits here.
+
+Revision ID: 0001
+Revises:
+Create Date: 2026-10-17 00:00:00
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from geoalchemy2 import Geometry
+
+# revision identifiers, used by Alembic.
+revision: str = "0001"
+down_revision: Union[str, Sequence[str], None] = None
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# company_stats: net count change per (industry, 1 degree cell) of each statement
+STATS_FUNCTION_SQL = """
+    CREATE OR REPLACE FUNCTION company_stats_apply() RETURNS trigger
+    LANGUAGE plpgsql AS $$
+    BEGIN
+        IF TG_OP = 'INSERT' THEN
+            INSERT INTO company_stats AS s (industry, cell_x, cell_y, count)
+            SELECT industry, cell_x, cell_y, delta FROM (
+                SELECT industry, cell_x, cell_y, sum(delta) AS delta
+                FROM (
+                    SELECT industry, floor(longitude / 1.0)::int AS cell_x, floor(latitude / 1.0)::int AS cell_y, 1 AS delta
+                    FROM new_rows
+                ) AS changes
+                GROUP BY industry, cell_x, cell_y
+                HAVING sum(delta) <> 0
+            ) AS d
+            ORDER BY industry, cell_x, cell_y
+            ON CONFLICT (industry, cell_x, cell_y) DO UPDATE SET count = s.count + EXCLUDED.count;
+        ELSIF TG_OP = 'UPDATE' THEN
+            INSERT INTO company_stats AS s (industry, cell_x, cell_y, count)
+            SELECT industry, cell_x, cell_y, delta FROM (
+                SELECT industry, cell_x, cell_y, sum(delta) AS delta
+                FROM (
+                    SELECT industry, floor(longitude / 1.0)::int AS cell_x, floor(latitude / 1.0)::int AS cell_y, 1 AS delta
+                    FROM new_rows
+                    UNION ALL
+                    SELECT industry, floor(longitude / 1.0)::int AS cell_x, floor(latitude / 1.0)::int AS cell_y, -1 AS delta
+                    FROM old_rows
+                ) AS changes
+                GROUP BY industry, cell_x, cell_y
+                HAVING sum(delta) <> 0
+            ) AS d
+            ORDER BY industry, cell_x, cell_y
+            ON CONFLICT (industry, cell_x, cell_y) DO UPDATE SET count = s.count + EXCLUDED.count;
+
+            DELETE FROM company_stats s
+            USING (
+                SELECT industry, cell_x, cell_y, sum(delta) AS delta
+                FROM (
+                    SELECT industry, floor(longitude / 1.0)::int AS cell_x, floor(latitude / 1.0)::int AS cell_y, 1 AS delta
+                    FROM new_rows
+                    UNION ALL
+                    SELECT industry, floor(longitude / 1.0)::int AS cell_x, floor(latitude / 1.0)::int AS cell_y, -1 AS delta
+                    FROM old_rows
+                ) AS changes
+                GROUP BY industry, cell_x, cell_y
+                HAVING sum(delta) <> 0
+            ) AS d
+            WHERE d.delta < 0
+              AND s.industry = d.industry AND s.cell_x = d.cell_x AND s.cell_y = d.cell_y
+              AND s.count <= 0;
+        ELSIF TG_OP = 'DELETE' THEN
+            INSERT INTO company_stats AS s (industry, cell_x, cell_y, count)
+            SELECT industry, cell_x, cell_y, delta FROM (
+                SELECT industry, cell_x, cell_y, sum(delta) AS delta
+                FROM (
+                    SELECT industry, floor(longitude / 1.0)::int AS cell_x, floor(latitude / 1.0)::int AS cell_y, -1 AS delta
+                    FROM old_rows
+                ) AS changes
+                GROUP BY industry, cell_x, cell_y
+                HAVING sum(delta) <> 0
+            ) AS d
+            ORDER BY industry, cell_x, cell_y
+            ON CONFLICT (industry, cell_x, cell_y) DO UPDATE SET count = s.count + EXCLUDED.count;
+
+            DELETE FROM company_stats s
+            USING (
+                SELECT industry, cell_x, cell_y, sum(delta) AS delta
+                FROM (
+                    SELECT industry, floor(longitude / 1.0)::int AS cell_x, floor(latitude / 1.0)::int AS cell_y, -1 AS delta
+                    FROM old_rows
+                ) AS changes
+                GROUP BY industry, cell_x, cell_y
+                HAVING sum(delta) <> 0
+            ) AS d
+            WHERE d.delta < 0
+              AND s.industry = d.industry AND s.cell_x = d.cell_x AND s.cell_y = d.cell_y
+              AND s.count <= 0;
+        ELSIF TG_OP = 'TRUNCATE' THEN
+            TRUNCATE company_stats;
+        END IF;
+        RETURN NULL;
+    END
+    $$
+"""
+
+# Populates company_stats on databases that had companies before the triggers
+STATS_BACKFILL_SQL = """
+    INSERT INTO company_stats (industry, cell_x, cell_y, count)
+    SELECT industry, floor(longitude / 1.0)::int AS cell_x, floor(latitude / 1.0)::int AS cell_y, count(*) AS count
+    FROM companies
+    GROUP BY 1, 2, 3
+"""
+
+# company_changes: one row per affected company, and a NOTIFY on the company_changes channel
+CHANGES_FUNCTION_SQL = """
+    CREATE OR REPLACE FUNCTION company_changes_log() RETURNS trigger
+    LANGUAGE plpgsql AS $$
+    DECLARE
+        current_txid bigint := pg_current_xact_id()::text::bigint;
+    BEGIN
+        IF TG_OP = 'INSERT' THEN
+            INSERT INTO company_changes (txid, company_id, op, longitude, latitude)
+            SELECT current_txid, id, 'upsert', longitude, latitude FROM new_rows;
+        ELSIF TG_OP = 'UPDATE' THEN
+            INSERT INTO company_changes (txid, company_id, op, longitude, latitude, old_longitude, old_latitude)
+            SELECT current_txid, n.id, 'upsert', n.longitude, n.latitude, o.longitude, o.latitude
+            FROM new_rows n JOIN old_rows o ON o.id = n.id;
+        ELSIF TG_OP = 'DELETE' THEN
+            INSERT INTO company_changes (txid, company_id, op, longitude, latitude)
+            SELECT current_txid, id, 'delete', longitude, latitude FROM old_rows;
+        ELSE
+            INSERT INTO company_changes (txid, op) VALUES (current_txid, 'reset');
+        END IF;
+        IF FOUND THEN
+            PERFORM pg_notify('company_changes', '');
+        END IF;
+        RETURN NULL;
+    END
+    $$
+"""
+
+# (trigger name prefix, function): statement-level triggers reading transition tables
+TRIGGERS = (("company_stats", "company_stats_apply"), ("company_changes", "company_changes_log"))
+
+# event, REFERENCING clause
+TRIGGER_EVENTS = (
+    ("INSERT", "REFERENCING NEW TABLE AS new_rows"),
+    ("UPDATE", "REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows"),
+    ("DELETE", "REFERENCING OLD TABLE AS old_rows"),
+    ("TRUNCATE", ""),
+)
+
+
+def _create_triggers() -> None:
+    for prefix, function in TRIGGERS:
+        for event, referencing in TRIGGER_EVENTS:
+            name = f"{prefix}_{event.lower()}"
+            op.execute(f"DROP TRIGGER IF EXISTS {name} ON companies")
+            op.execute(
+                f"CREATE TRIGGER {name} AFTER {event} ON companies {referencing} "
+                f"FOR EACH STATEMENT EXECUTE FUNCTION {function}()"
+            )
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.execute("CREATE EXTENSION IF NOT EXISTS postgis")
+    # Trigram operator classes used by the company name search index
+    op.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+
+    op.create_table(
+        "companies",
+        sa.Column("id", sa.Integer(), primary_key=True),
+        sa.Column("name", sa.String(), nullable=False),
+        sa.Column("industry", sa.String(), nullable=False),
+        sa.Column("address", sa.String(), nullable=True),
+        sa.Column("latitude", sa.Float(), nullable=False),
+        sa.Column("longitude", sa.Float(), nullable=False),
+        sa.Column("location", Geometry(geometry_type="POINT", srid=4326, spatial_index=False), nullable=True),
+        if_not_exists=True,
+    )
+    op.create_index("ix_companies_id", "companies", ["id"], if_not_exists=True)
+
+    op.create_table(
+        "company_stats",
+        sa.Column("industry", sa.String(), primary_key=True),
+        sa.Column("cell_x", sa.Integer(), primary_key=True),
+        sa.Column("cell_y", sa.Integer(), primary_key=True),
+        sa.Column("count", sa.BigInteger(), nullable=False),
+        if_not_exists=True,
+    )
+
+    op.create_table(
+        "company_changes",
+        sa.Column("id", sa.BigInteger(), primary_key=True),
+        sa.Column("txid", sa.BigInteger(), nullable=False),
+        sa.Column("company_id", sa.Integer(), nullable=True),
+        sa.Column("op", sa.String(), nullable=False),
+        sa.Column("longitude", sa.Float(), nullable=True),
+        sa.Column("latitude", sa.Float(), nullable=True),
+        sa.Column("old_longitude", sa.Float(), nullable=True),
+        sa.Column("old_latitude", sa.Float(), nullable=True),
+        sa.Column("changed_at", sa.DateTime(timezone=True), server_default=sa.func.now(), nullable=False),
+        if_not_exists=True,
+    )
+    op.create_index("ix_company_changes_txid", "company_changes", ["txid"], if_not_exists=True)
+    op.create_index("ix_company_changes_changed_at", "company_changes", ["changed_at"], if_not_exists=True)
+
+    op.create_table(
+        "change_feed_state",
+        sa.Column("id", sa.Integer(), primary_key=True),
+        sa.Column("pruned_before", sa.BigInteger(), nullable=False),
+        if_not_exists=True,
+    )
+
+    # Statement-level triggers maintaining company_stats and company_changes
+    op.execute(STATS_FUNCTION_SQL)
+    op.execute(CHANGES_FUNCTION_SQL)
+    _create_triggers()
+    op.execute("INSERT INTO change_feed_state (id, pruned_before) VALUES (1, 0) ON CONFLICT (id) DO NOTHING")
+
+    # Databases created by create_all had companies but no stats; count them once,
+    # with writers blocked so no trigger delta lands in between
+    connection = op.get_bind()
+    if connection.execute(sa.text(
+        "SELECT NOT EXISTS (SELECT 1 FROM company_stats) AND EXISTS (SELECT 1 FROM companies)"
+    )).scalar():
+        op.execute("LOCK TABLE companies IN SHARE MODE")
+        op.execute(STATS_BACKFILL_SQL)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    # Dropping companies drops its triggers
+    op.drop_table("companies")
+    op.execute("DROP FUNCTION IF EXISTS company_stats_apply()")
+    op.execute("DROP FUNCTION IF EXISTS company_changes_log()")
+    op.drop_table("change_feed_state")
+    op.drop_table("company_changes")
+    op.drop_table("company_stats")
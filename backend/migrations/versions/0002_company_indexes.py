@@ -0,0 +1,68 @@
+"""Spatial, filter and search indexes on companies, built concurrently
+
+``CREATE INDEX CONCURRENTLY`` does not lock out writes while a large table
+is indexed, but cannot run in a transaction, so each build runs in an
+autocommit block. An interrupted build leaves an invalid index behind; it
+is dropped and rebuilt on the next upgrade. The expressions must match
+``app.search`` and ``app.spatial`` for the planner to use the indexes.
+
+Revision ID: 0002
+Revises: 0001
+Create Date: 2026-10-17 00:00:00
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision: str = "0002"
+down_revision: Union[str, Sequence[str], None] = "0001"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+SEARCH_DOCUMENT = (
+    "to_tsvector('simple'::regconfig, "
+    "coalesce(name, '') || ' ' || coalesce(industry, '') || ' ' || coalesce(address, ''))"
+)
+
+# name, columns or expressions, index options
+INDEXES = (
+    # Bounding box (&&) viewport queries
+    ("ix_companies_location", ["location"], {"postgresql_using": "gist"}),
+    # KNN (<->) and ST_DWithin radius queries on the geography cast
+    ("ix_companies_location_geog", [sa.text("CAST(location AS geography(POINT,4326))")], {"postgresql_using": "gist"}),
+    ("ix_companies_industry", ["industry"], {}),
+    # Ranked full-text word and prefix matches
+    ("ix_companies_search", [sa.text(SEARCH_DOCUMENT)], {"postgresql_using": "gin"}),
+    # Typo-tolerant name similarity
+    ("ix_companies_name_trgm", [sa.text("lower(name) gin_trgm_ops")], {"postgresql_using": "gin"}),
+    # Short name prefixes (LIKE 'ab%'), which trigrams cannot serve
+    ("ix_companies_name_prefix", [sa.text("lower(name) text_pattern_ops")], {}),
+)
+
+INVALID_INDEX_SQL = sa.text("""
+    SELECT 1 FROM pg_index i JOIN pg_class c ON c.oid = i.indexrelid
+    WHERE c.relname = :name AND c.relnamespace = current_schema()::regnamespace AND NOT i.indisvalid
+""")
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    connection = op.get_bind()
+    with op.get_context().autocommit_block():
+        for name, columns, options in INDEXES:
+            if connection.execute(INVALID_INDEX_SQL, {"name": name}).first():
+                op.drop_index(name, table_name="companies", postgresql_concurrently=True, if_exists=True)
+            op.create_index(
+                name, "companies", columns,
+                postgresql_concurrently=True, if_not_exists=True, **options
+            )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    with op.get_context().autocommit_block():
+        for name, _, _ in reversed(INDEXES):
+            op.drop_index(name, table_name="companies", postgresql_concurrently=True, if_exists=True)
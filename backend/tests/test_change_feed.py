@@ -0,0 +1,83 @@
+"""
+Change feed catch-up reads and the snapshot's dependence on a running feed.
+"""
+import asyncio
+import time
+
+from app import change_feed as change_feed_module
+from app import snapshot as snapshot_module
+from app.change_feed import ChangeFeed
+from app.snapshot import CompanySnapshot
+
+
+class _Connection:
+    def is_closed(self):
+        return False
+
+    async def close(self):
+        pass
+
+
+def _feed(monkeypatch, poll):
+    monkeypatch.setattr(change_feed_module, "CHANGE_FEED_ENABLED", True)
+    feed = ChangeFeed()
+
+    async def connect():
+        return _Connection()
+
+    monkeypatch.setattr(feed, "_connect", connect)
+    monkeypatch.setattr(feed, "_poll", poll)
+    monkeypatch.setattr(feed, "_prune", lambda: asyncio.sleep(0))
+    return feed
+
+
+def test_catch_up_waits_for_a_read_started_after_the_call(monkeypatch):
+    async def scenario():
+        first_poll_started = asyncio.Event()
+        release_first_poll = asyncio.Event()
+        polls = []
+
+        async def poll():
+            polls.append(len(polls) + 1)
+            if len(polls) == 1:
+                first_poll_started.set()
+                await release_first_poll.wait()
+
+        feed = _feed(monkeypatch, poll)
+        await feed.start()
+        await first_poll_started.wait()
+
+        # The read in progress started before the call, so it must not count
+        catch_up = asyncio.create_task(feed.catch_up(timeout=5))
+        await asyncio.sleep(0)
+        release_first_poll.set()
+        assert await catch_up
+        assert polls == [1, 2]
+        await feed.stop()
+
+    asyncio.run(scenario())
+
+
+def test_catch_up_without_a_running_feed():
+    assert asyncio.run(ChangeFeed().catch_up(timeout=0.1)) is False
+
+
+def test_snapshot_needs_a_running_feed(monkeypatch):
+    async def scenario():
+        async def poll():
+            pass
+
+        feed = _feed(monkeypatch, poll)
+        monkeypatch.setattr(snapshot_module, "SNAPSHOT_ENABLED", True)
+        monkeypatch.setattr(snapshot_module, "change_feed", feed)
+        snapshot = CompanySnapshot()
+        snapshot.version = 1
+        snapshot.synced_at = time.monotonic()
+
+        assert not snapshot.usable()
+        await feed.start()
+        assert snapshot.usable()
+        await feed.stop()
+        assert not snapshot.usable()
+
+    asyncio.run(scenario())
@@ -0,0 +1,113 @@
+"""
+Columnar payload encoding against a golden fixture.
+
+``fixtures/columnar_v1.bin`` is the payload ``_encode()`` produces and
+``fixtures/columnar_v1.json`` what decoding it must give, in the shape of
+the frontend's ``decodeColumnar`` result (dictionary columns as codes and
+values), so the frontend decoder can be checked against the same pair.
+
+A deliberate format change bumps ``COLUMNAR_VERSION``; regenerate both
+files with ``python tests/test_columnar.py``.
+"""
+import json
+import struct
+from pathlib import Path
+
+import numpy as np
+
+from app.columnar import COLUMNAR_MAGIC, ColumnarWriter, join_strings, split_joined
+
+FIXTURES = Path(__file__).resolve().parent / "fixtures"
+GOLDEN_PAYLOAD = FIXTURES / "columnar_v1.bin"
+GOLDEN_TABLE = FIXTURES / "columnar_v1.json"
+
+IDS = [1, 42, 2147483647]
+LATITUDES = [37.7749, -33.8688, 0.0]
+LONGITUDES = [-122.4194, 151.2093, 179.999]
+INDUSTRY_CODES = [1, 0, 1]
+INDUSTRIES = ["Retail", "Technology"]
+NAMES = ["Acme", "Ünïcode ✓ GmbH", ""]
+
+
+def _encode() -> bytes:
+    writer = ColumnarWriter(len(IDS))
+    writer.add_array("id", np.array(IDS), "int32")
+    writer.add_array("latitude", np.array(LATITUDES), "float32")
+    writer.add_array("longitude", np.array(LONGITUDES), "float64")
+    writer.add_dictionary("industry", np.array(INDUSTRY_CODES), INDUSTRIES)
+    writer.add_strings("name", *split_joined(join_strings(NAMES), len(NAMES)))
+    return writer.tobytes()
+
+
+def _expected_table() -> dict:
+    return {
+        "rows": len(IDS),
+        "columns": {
+            "id": IDS,
+            # Exactly the float32 values, as a Float32Array reads them
+            "latitude": np.array(LATITUDES, dtype=np.float32).tolist(),
+            "longitude": LONGITUDES,
+            "industry": {"codes": INDUSTRY_CODES, "values": INDUSTRIES},
+            "name": NAMES,
+        },
+    }
+
+
+def _decode(payload: bytes) -> dict:
+    """
+    Reference decoder following the format description in ``app.columnar``.
+    """
+    assert payload[:4] == COLUMNAR_MAGIC
+    (metadata_length,) = struct.unpack_from("<I", payload, 4)
+    base = 8 + metadata_length
+    assert base % 8 == 0
+    metadata = json.loads(payload[8:base])
+    rows = metadata["rows"]
+
+    def view(dtype, location, count):
+        offset = base + location["offset"]
+        assert offset % 8 == 0
+        return np.frombuffer(payload, dtype=np.dtype(dtype).newbyteorder("<"), count=count, offset=offset).tolist()
+
+    columns = {}
+    for column in metadata["columns"]:
+        if column["type"] == "utf8":
+            offsets = view("uint32", column["offsets"], rows + 1)
+            start = base + column["data"]["offset"]
+            data = payload[start:start + column["data"]["length"]]
+            columns[column["name"]] = [data[offsets[i]:offsets[i + 1]].decode() for i in range(rows)]
+        elif column["type"] == "dictionary":
+            columns[column["name"]] = {"codes": view(column["index"], column, rows), "values": column["values"]}
+        else:
+            columns[column["name"]] = view(column["type"], column, rows)
+    return {"version": metadata["version"], "rows": rows, "columns": columns}
+
+
+def test_encoding_matches_golden_bytes():
+    assert _encode() == GOLDEN_PAYLOAD.read_bytes()
+
+
+def test_golden_payload_decodes_to_golden_table():
+    decoded = _decode(GOLDEN_PAYLOAD.read_bytes())
+
+    assert decoded.pop("version") == 1
+    assert decoded == _expected_table()
+    assert decoded == json.loads(GOLDEN_TABLE.read_text(encoding="utf-8"))
+
+
+def test_payload_is_padded_to_eight_bytes():
+    # The decoder checks that every buffer starts aligned; the last one must be padded too
+    assert len(_encode()) % 8 == 0
+
+
+def test_split_joined_round_trip():
+    offsets, data = split_joined(join_strings(NAMES), len(NAMES))
+
+    assert offsets.tolist() == [0, 4, 4 + len(NAMES[1].encode()), 4 + len(NAMES[1].encode())]
+    assert [data[offsets[i]:offsets[i + 1]].decode() for i in range(len(NAMES))] == NAMES
+
+
+if __name__ == "__main__":
+    FIXTURES.mkdir(exist_ok=True)
+    GOLDEN_PAYLOAD.write_bytes(_encode())
+    GOLDEN_TABLE.write_text(json.dumps(_expected_table(), ensure_ascii=False, indent=2) + "\n", encoding="utf-8")
@@ -0,0 +1,186 @@
+"""
+Round trip of the FlatGeobuf export through GDAL (pyogrio).
+"""
+import asyncio
+import random
+import threading
+
+import numpy as np
+import pytest
+
+from app import database, export
+
+pyogrio = pytest.importorskip("pyogrio")
+
+# (id, name, industry, address, longitude, latitude), as the export query selects them
+ROWS = [
+    (1, "Acme", "Technology", "1 Main St", -122.4194, 37.7749),
+    (2, "Ünïcode ✓ GmbH", "Retail", None, 13.405, 52.52),
+    (3, "", "Food", "", 151.2093, -33.8688),
+    (4, "Antimeridian", "Shipping", None, 179.999, -16.5),
+]
+
+
+def _random_rows(count, seed=7):
+    generator = random.Random(seed)
+    return [
+        (
+            company_id, f"Company {company_id}", generator.choice(["Technology", "Retail", "Food"]),
+            None if company_id % 3 == 0 else f"{company_id} Side St",
+            generator.uniform(-180, 180), generator.uniform(-85, 85),
+        )
+        for company_id in range(len(ROWS) + 1, len(ROWS) + 1 + count)
+    ]
+
+
+class _Result:
+    def __init__(self, batches):
+        self._batches = batches
+
+    def partitions(self):
+        return iter(self._batches)
+
+
+class _Session:
+    """Stands in for the server-side cursor session ``stream_export`` opens."""
+
+    def __init__(self, batches):
+        self._batches = batches
+
+    def execute(self, stmt):
+        return _Result(self._batches)
+
+    def close(self):
+        pass
+
+
+class _AsyncResult:
+    def __init__(self, batches):
+        self._batches = batches
+
+    async def partitions(self):
+        for batch in self._batches:
+            yield batch
+
+
+class _AsyncSession:
+    """Stands in for the streaming session ``stream_export_async`` opens."""
+
+    def __init__(self, batches):
+        self._batches = batches
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        pass
+
+    async def stream(self, stmt):
+        return _AsyncResult(self._batches)
+
+
+def _export(tmp_path, monkeypatch, batches):
+    monkeypatch.setattr(database, "open_session", lambda replica=False: _Session(batches))
+    path = tmp_path / "companies.fgb"
+    path.write_bytes(b"".join(export.stream_export(None, "flatgeobuf")))
+    return path
+
+
+def _read(path, **kwargs):
+    """
+    Features as {id: (name, industry, address, longitude, latitude)}.
+    """
+    meta, _, geometry, fields = pyogrio.raw.read(path, **kwargs)
+    columns = dict(zip(meta["fields"], fields))
+    features = {}
+    for i, company_id in enumerate(columns["id"].tolist()):
+        # Little-endian WKB point: byte order, uint32 type, x, y
+        longitude, latitude = np.frombuffer(geometry[i], dtype="<f8", offset=5)
+        features[company_id] = (
+            columns["name"][i], columns["industry"][i], columns["address"][i], longitude, latitude
+        )
+    return meta, features
+
+
+def test_features_and_properties(tmp_path, monkeypatch):
+    path = _export(tmp_path, monkeypatch, [ROWS[:2], ROWS[2:]])
+
+    meta, features = _read(path)
+
+    assert meta["geometry_type"] == "Point"
+    assert meta["crs"] == "EPSG:4326"
+    assert list(meta["fields"]) == ["id", "name", "industry", "address"]
+    assert sorted(features) == [row[0] for row in ROWS]
+    for company_id, name, industry, address, longitude, latitude in ROWS:
+        assert features[company_id] == (name, industry, address, longitude, latitude)
+
+
+def test_null_addresses(tmp_path, monkeypatch):
+    path = _export(tmp_path, monkeypatch, [ROWS])
+
+    _, features = _read(path)
+
+    assert features[2][2] is None
+    assert features[4][2] is None
+    # An empty string is a value, not NULL
+    assert features[3][2] == ""
+
+
+def test_spatial_index(tmp_path, monkeypatch):
+    rows = ROWS + _random_rows(2000)
+    path = _export(tmp_path, monkeypatch, [rows[i:i + 300] for i in range(0, len(rows), 300)])
+
+    info = pyogrio.read_info(path)
+    assert info["features"] == len(rows)
+    assert info["capabilities"]["fast_spatial_filter"]
+    longitudes, latitudes = [row[4] for row in rows], [row[5] for row in rows]
+    assert info["total_bounds"] == pytest.approx((min(longitudes), min(latitudes), max(longitudes), max(latitudes)))
+
+    for bbox in [(-10.0, -10.0, 30.0, 20.0), (-180.0, -90.0, -170.0, 90.0), (178.0, -20.0, 180.0, -10.0)]:
+        min_x, min_y, max_x, max_y = bbox
+        expected = {
+            row[0] for row in rows
+            if min_x <= row[4] <= max_x and min_y <= row[5] <= max_y
+        }
+        _, features = _read(path, bbox=bbox)
+        assert set(features) == expected
+        assert expected
+
+
+def test_empty_export(tmp_path, monkeypatch):
+    path = _export(tmp_path, monkeypatch, [])
+
+    meta, features = _read(path)
+
+    assert list(meta["fields"]) == ["id", "name", "industry", "address"]
+    assert features == {}
+
+
+def test_async_export_encodes_off_the_event_loop(tmp_path, monkeypatch):
+    batches = [ROWS[:2], ROWS[2:]]
+    monkeypatch.setattr(database, "open_async_session", lambda replica=False: _AsyncSession(batches))
+    encoding_threads = set()
+    write, finish = export.FlatGeobufWriter.write, export.FlatGeobufWriter.finish
+
+    def recording_write(self, rows):
+        encoding_threads.add(threading.get_ident())
+        return write(self, rows)
+
+    def recording_finish(self):
+        for chunk in finish(self):
+            encoding_threads.add(threading.get_ident())
+            yield chunk
+
+    monkeypatch.setattr(export.FlatGeobufWriter, "write", recording_write)
+    monkeypatch.setattr(export.FlatGeobufWriter, "finish", recording_finish)
+
+    async def collect():
+        return threading.get_ident(), [chunk async for chunk in export.stream_export_async(None, "flatgeobuf")]
+
+    loop_thread, chunks = asyncio.run(collect())
+
+    assert encoding_threads and loop_thread not in encoding_threads
+    path = tmp_path / "async.fgb"
+    path.write_bytes(b"".join(chunks))
+    assert sorted(_read(path)[1]) == [row[0] for row in ROWS]
+    assert path.read_bytes() == _export(tmp_path, monkeypatch, batches).read_bytes()
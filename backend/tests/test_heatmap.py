@@ -0,0 +1,35 @@
+"""
+Heatmap extents and the heatmap route's handling of boxes Web Mercator cannot show.
+"""
+import pytest
+from fastapi.testclient import TestClient
+
+from app import heatmap
+from app.main import app
+
+
+def test_extent_projects_latitudes():
+    bounds = heatmap.extent(-10.0, -20.0, 10.0, 20.0)
+
+    assert bounds.west == -10.0 and bounds.east == 10.0
+    assert bounds.south_y == pytest.approx(-bounds.north_y)
+    assert bounds.north_y == pytest.approx(float(heatmap.mercator_y(20.0)))
+
+
+@pytest.mark.parametrize("box", [
+    (-10.0, 86.0, 10.0, 89.0),
+    (-10.0, -90.0, 10.0, -86.0),
+    (5.0, 0.0, 5.0, 10.0),
+])
+def test_extent_rejects_degenerate_boxes(box):
+    with pytest.raises(ValueError):
+        heatmap.extent(*box)
+
+
+@pytest.mark.parametrize("bbox", ["-10,86,10,89", "-10,-90,10,-86"])
+def test_route_rejects_boxes_beyond_mercator(bbox):
+    # Rejected before any database access or rendering
+    response = TestClient(app).get("/api/v1/companies/heatmap", params={"bbox": bbox})
+
+    assert response.status_code == 400
+    assert "Web Mercator" in response.json()["detail"]
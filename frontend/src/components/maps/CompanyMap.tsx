@@ -10,7 +10,7 @@ import {
 } from "react-leaflet";
 import L from "leaflet";
 import "leaflet/dist/leaflet.css";
-import { useCompanies } from "@/lib/queries";
+import { useCompanies, useCompanyChangeFeed } from "@/lib/queries";
 
 // Add prop for map click callback
 interface CompanyMapProps {
@@ -35,6 +35,7 @@ const MapClickHandler = ({
 
 const CompanyMap = ({ onMapClick }: CompanyMapProps) => {
   const { data: companies = [], isLoading: loading, error } = useCompanies();
+  useCompanyChangeFeed();
 
   const defaultIcon = new L.Icon({
     iconUrl: "https://unpkg.com/leaflet@1.7.1/dist/images/marker-icon.png",
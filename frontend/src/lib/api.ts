@@ -25,6 +25,101 @@ export interface UpdateCompanyData {
   address?: string;
 }
 
+export interface CompanyCluster {
+  latitude: number;
+  longitude: number;
+  count: number;
+  industries: Record<string, number>;
+}
+
+export interface CompanyClusters {
+  zoom: number;
+  cell_size: number;
+  clusters: CompanyCluster[];
+  companies: Company[];
+}
+
+export interface CompanySearchResult extends Company {
+  score: number;
+}
+
+export interface CompanyChange {
+  op: "upsert" | "delete";
+  id: number;
+  company: Company | null;
+}
+
+export interface CompanyChanges {
+  // Feed version to pass as `since` next time
+  version: number;
+  // The changes could not be sent as deltas; reload the full list
+  reset: boolean;
+  changes: CompanyChange[];
+}
+
+export interface CompanyListParams {
+  // Viewport as [minLon, minLat, maxLon, maxLat]
+  bbox?: [number, number, number, number];
+  industry?: string;
+  limit?: number;
+}
+
+export const COLUMNAR_MEDIA_TYPE = "application/vnd.geo-company.columnar";
+
+export type NumericColumn = Int32Array | Uint16Array | Uint32Array | Float32Array | Float64Array;
+
+export interface DictionaryColumn {
+  // Index into `values` per row
+  codes: Uint16Array | Uint32Array;
+  values: string[];
+}
+
+export type ColumnarColumn = NumericColumn | DictionaryColumn | string[];
+
+export interface ColumnarTable {
+  rows: number;
+  columns: Record<string, ColumnarColumn>;
+}
+
+export interface CompanyColumns {
+  count: number;
+  ids: Int32Array;
+  latitudes: Float32Array | Float64Array;
+  longitudes: Float32Array | Float64Array;
+  // Index into `industries` per company
+  industryCodes: Uint16Array | Uint32Array;
+  industries: string[];
+  // Cursor for the next page when `limit` was reached
+  nextAfterId?: number;
+  // Fetches the names on first call, aligned with `ids`
+  names(): Promise<string[]>;
+}
+
+interface BufferLocation {
+  offset: number;
+  length: number;
+}
+
+type NumericType = "int32" | "uint16" | "uint32" | "float32" | "float64";
+
+type ColumnarColumnMeta =
+  | ({ name: string; type: NumericType } & BufferLocation)
+  | ({ name: string; type: "dictionary"; index: "uint16" | "uint32"; values: string[] } & BufferLocation)
+  | { name: string; type: "utf8"; offsets: BufferLocation; data: BufferLocation };
+
+function buildSearchParams(params: CompanyListParams = {}): URLSearchParams {
+  const search = new URLSearchParams();
+  if (params.bbox) search.set("bbox", params.bbox.join(","));
+  if (params.industry) search.set("industry", params.industry);
+  if (params.limit) search.set("limit", String(params.limit));
+  return search;
+}
+
+function buildQueryString(params: CompanyListParams = {}): string {
+  const query = buildSearchParams(params).toString();
+  return query ? `?${query}` : "";
+}
+
 class ApiError extends Error {
   constructor(message: string, public status?: number) {
     super(message);
@@ -42,13 +137,182 @@ async function handleResponse<T>(response: Response): Promise<T> {
   return response.json();
 }
 
+function numericView(
+  type: NumericType,
+  buffer: ArrayBuffer,
+  offset: number,
+  length: number
+): NumericColumn {
+  switch (type) {
+    case "int32":
+      return new Int32Array(buffer, offset, length);
+    case "uint16":
+      return new Uint16Array(buffer, offset, length);
+    case "uint32":
+      return new Uint32Array(buffer, offset, length);
+    case "float32":
+      return new Float32Array(buffer, offset, length);
+    case "float64":
+      return new Float64Array(buffer, offset, length);
+  }
+}
+
+// Decode a columnar payload (see backend/app/columnar.py). Numeric columns
+// are views onto the response buffer, not copies; like the server they are
+// little-endian, which every browser platform is. Decoding
+// backend/tests/fixtures/columnar_v1.bin must give columnar_v1.json beside it.
+export function decodeColumnar(buffer: ArrayBuffer): ColumnarTable {
+  const header = new DataView(buffer);
+  const magic = new TextDecoder().decode(new Uint8Array(buffer, 0, 4));
+  if (magic !== "GCOL") {
+    throw new ApiError("Not a columnar company payload");
+  }
+  const metadataLength = header.getUint32(4, true);
+  const metadata = JSON.parse(
+    new TextDecoder().decode(new Uint8Array(buffer, 8, metadataLength))
+  ) as { version: number; rows: number; columns: ColumnarColumnMeta[] };
+  if (metadata.version !== 1) {
+    throw new ApiError(`Unsupported columnar version ${metadata.version}`);
+  }
+  const base = 8 + metadataLength;
+  const rows = metadata.rows;
+
+  const columns: Record<string, ColumnarColumn> = {};
+  for (const column of metadata.columns) {
+    if (column.type === "utf8") {
+      const offsets = new Uint32Array(buffer, base + column.offsets.offset, rows + 1);
+      const data = new Uint8Array(buffer, base + column.data.offset, column.data.length);
+      const decoder = new TextDecoder();
+      const strings = new Array<string>(rows);
+      for (let i = 0; i < rows; i++) {
+        strings[i] = decoder.decode(data.subarray(offsets[i], offsets[i + 1]));
+      }
+      columns[column.name] = strings;
+    } else if (column.type === "dictionary") {
+      columns[column.name] = {
+        codes: numericView(column.index, buffer, base + column.offset, rows) as Uint16Array | Uint32Array,
+        values: column.values,
+      };
+    } else {
+      columns[column.name] = numericView(column.type, buffer, base + column.offset, rows);
+    }
+  }
+  return { rows, columns };
+}
+
+async function fetchColumnar(search: URLSearchParams): Promise<{ table: ColumnarTable; response: Response }> {
+  const response = await fetch(
+    `${API_BASE_URL}/api/v1/companies?${search.toString()}`,
+    { headers: { Accept: COLUMNAR_MEDIA_TYPE } }
+  );
+  if (!response.ok) {
+    throw new ApiError(
+      `API request failed: ${response.statusText}`,
+      response.status
+    );
+  }
+  return { table: decodeColumnar(await response.arrayBuffer()), response };
+}
+
 export const api = {
-  // Get all companies
-  async getCompanies(): Promise<Company[]> {
-    const response = await fetch(`${API_BASE_URL}/api/v1/companies`);
+  // Get all companies, optionally restricted to a viewport
+  async getCompanies(params?: CompanyListParams): Promise<Company[]> {
+    const response = await fetch(
+      `${API_BASE_URL}/api/v1/companies${buildQueryString(params)}`
+    );
     return handleResponse<Company[]>(response);
   },
 
+  // Get companies as typed column arrays, about a tenth the size of the JSON
+  // list; names are fetched separately the first time `names()` is called
+  async getCompanyColumns(
+    params?: CompanyListParams,
+    options: { precision?: 32 | 64 } = {}
+  ): Promise<CompanyColumns> {
+    const search = buildSearchParams(params);
+    if (options.precision) search.set("precision", String(options.precision));
+    const { table, response } = await fetchColumnar(search);
+    const ids = table.columns.id as Int32Array;
+    const industry = table.columns.industry as DictionaryColumn;
+    const nextAfterId = response.headers.get("X-Next-After-Id");
+
+    let namesRequest: Promise<string[]> | undefined;
+    const loadNames = async (): Promise<string[]> => {
+      const nameSearch = buildSearchParams(params);
+      nameSearch.set("columns", "name");
+      const { table: nameTable } = await fetchColumnar(nameSearch);
+      const nameIds = nameTable.columns.id as Int32Array;
+      const values = nameTable.columns.name as string[];
+      if (nameIds.length === ids.length && nameIds.every((id, i) => id === ids[i])) {
+        return values;
+      }
+      // The data changed in between; match by ID
+      const byId = new Map<number, string>();
+      nameIds.forEach((id, i) => byId.set(id, values[i]));
+      return Array.from(ids, (id) => byId.get(id) ?? "");
+    };
+
+    return {
+      count: table.rows,
+      ids,
+      latitudes: table.columns.latitude as Float32Array | Float64Array,
+      longitudes: table.columns.longitude as Float32Array | Float64Array,
+      industryCodes: industry.codes,
+      industries: industry.values,
+      nextAfterId: nextAfterId === null ? undefined : Number(nextAfterId),
+      names() {
+        namesRequest ??= loadNames();
+        return namesRequest;
+      },
+    };
+  },
+
+  // Get server-side clusters for a viewport and zoom level
+  async getCompanyClusters(
+    bbox: [number, number, number, number],
+    zoom: number,
+    industry?: string
+  ): Promise<CompanyClusters> {
+    const search = new URLSearchParams({
+      bbox: bbox.join(","),
+      zoom: String(zoom),
+    });
+    if (industry) search.set("industry", industry);
+    const response = await fetch(
+      `${API_BASE_URL}/api/v1/companies/clusters?${search.toString()}`
+    );
+    return handleResponse<CompanyClusters>(response);
+  },
+
+  // Ranked search over name, industry and address; the last word matches as a prefix
+  async searchCompanies(
+    q: string,
+    options: { bbox?: [number, number, number, number]; limit?: number; signal?: AbortSignal } = {}
+  ): Promise<CompanySearchResult[]> {
+    const search = new URLSearchParams({ q });
+    if (options.bbox) search.set("bbox", options.bbox.join(","));
+    if (options.limit) search.set("limit", String(options.limit));
+    const response = await fetch(
+      `${API_BASE_URL}/api/v1/companies/search?${search.toString()}`,
+      { signal: options.signal }
+    );
+    return handleResponse<CompanySearchResult[]>(response);
+  },
+
+  // Companies changed since a feed version; omit `since` to get the current version
+  async getCompanyChanges(since?: number): Promise<CompanyChanges> {
+    const query = since === undefined ? "" : `?since=${since}`;
+    const response = await fetch(
+      `${API_BASE_URL}/api/v1/companies/changes${query}`
+    );
+    return handleResponse<CompanyChanges>(response);
+  },
+
+  // Server-Sent Events stream of change sets starting at a feed version
+  companyChangesStreamUrl(since: number): string {
+    return `${API_BASE_URL}/api/v1/companies/changes/stream?since=${since}`;
+  },
+
   // Get a single company by ID
   async getCompany(id: number): Promise<Company> {
     const response = await fetch(`${API_BASE_URL}/api/v1/companies/${id}`);
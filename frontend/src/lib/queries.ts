@@ -1,8 +1,10 @@
+import { useEffect } from "react";
 import { useQuery, useMutation, useQueryClient } from "@tanstack/react-query";
 import toast from "react-hot-toast";
 import {
   api,
   type Company,
+  type CompanyChanges,
   type CreateCompanyData,
   type UpdateCompanyData,
 } from "./api";
@@ -14,17 +16,82 @@ export const companyKeys = {
   list: (filters: string) => [...companyKeys.lists(), { filters }] as const,
   details: () => [...companyKeys.all, "detail"] as const,
   detail: (id: number) => [...companyKeys.details(), id] as const,
+  feedVersion: () => [...companyKeys.all, "feed-version"] as const,
 };
 
 // Get all companies
 export function useCompanies() {
+  const queryClient = useQueryClient();
+
   return useQuery({
     queryKey: companyKeys.lists(),
-    queryFn: api.getCompanies,
-    staleTime: 1000 * 60 * 5, // 5 minutes
+    queryFn: async () => {
+      // Take the feed version before loading, so the change feed replays
+      // anything written while the list is downloading
+      const { version } = await api.getCompanyChanges();
+      const companies = await api.getCompanies();
+      queryClient.setQueryData(companyKeys.feedVersion(), version);
+      return companies;
+    },
+    // Kept current by useCompanyChangeFeed instead of refetching
+    staleTime: Infinity,
   });
 }
 
+// Apply a change set from the feed to the cached company list
+function applyCompanyChanges(
+  companies: Company[],
+  { changes }: CompanyChanges
+): Company[] {
+  const byId = new Map(companies.map((company) => [company.id, company]));
+  for (const change of changes) {
+    if (change.op === "delete") {
+      byId.delete(change.id);
+    } else if (change.company) {
+      byId.set(change.id, change.company);
+    }
+  }
+  return Array.from(byId.values());
+}
+
+// Keep the cached company list in sync from the server's change stream
+export function useCompanyChangeFeed() {
+  const queryClient = useQueryClient();
+  const { isSuccess } = useCompanies();
+
+  useEffect(() => {
+    const since = queryClient.getQueryData<number>(companyKeys.feedVersion());
+    if (!isSuccess || since === undefined) return;
+
+    // EventSource reconnects on its own, resuming from the last event ID
+    const source = new EventSource(api.companyChangesStreamUrl(since));
+    source.addEventListener("changes", (event) => {
+      const changeSet: CompanyChanges = JSON.parse(
+        (event as MessageEvent).data
+      );
+      queryClient.setQueryData(companyKeys.feedVersion(), changeSet.version);
+      if (changeSet.reset) {
+        // Too much changed to send as deltas; the stream itself carries on
+        queryClient.invalidateQueries({ queryKey: companyKeys.lists() });
+        return;
+      }
+      queryClient.setQueryData(
+        companyKeys.lists(),
+        (old: Company[] | undefined) =>
+          old ? applyCompanyChanges(old, changeSet) : old
+      );
+      for (const change of changeSet.changes) {
+        if (change.op === "delete") {
+          queryClient.removeQueries({ queryKey: companyKeys.detail(change.id) });
+        } else if (change.company) {
+          queryClient.setQueryData(companyKeys.detail(change.id), change.company);
+        }
+      }
+    });
+    return () => source.close();
+  }, [isSuccess, queryClient]);
+}
+
 // Get single company
 export function useCompany(id: number) {
   return useQuery({
@@ -45,13 +112,13 @@ export function useCreateCompany() {
       queryClient.setQueryData(
         companyKeys.lists(),
         (old: Company[] | undefined) => {
-          return old ? [...old, newCompany] : [newCompany];
+          // The change feed may have delivered the new company already
+          return old
+            ? [...old.filter((company) => company.id !== newCompany.id), newCompany]
+            : [newCompany];
         }
       );
 
-      // Invalidate and refetch to ensure consistency
-      queryClient.invalidateQueries({ queryKey: companyKeys.lists() });
-
       toast.success("Company created successfully!");
     },
     onError: (error) => {
@@ -87,9 +154,6 @@ export function useUpdateCompany() {
         updatedCompany
       );
 
-      // Invalidate and refetch to ensure consistency
-      queryClient.invalidateQueries({ queryKey: companyKeys.lists() });
-
       toast.success("Company updated successfully!");
     },
     onError: (error) => {
@@ -117,9 +181,6 @@ export function useDeleteCompany() {
       // Remove from individual company cache
       queryClient.removeQueries({ queryKey: companyKeys.detail(deletedId) });
 
-      // Invalidate and refetch to ensure consistency
-      queryClient.invalidateQueries({ queryKey: companyKeys.lists() });
-
       toast.success("Company deleted successfully!");
     },
     onError: (error) => {